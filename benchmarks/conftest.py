@@ -0,0 +1,94 @@
+import shutil
+from pathlib import Path
+
+import harness
+import pytest
+
+from threedi_schema.tests.synthetic import generate_schematisation, get_row_counts
+
+results = []
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--benchmarks", action="store_true", help="run the benchmarks (slow)"
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the benchmarks unless --benchmarks is given"""
+    if config.getoption("--benchmarks", default=False):
+        return
+    directory = Path(__file__).parent
+    skip = pytest.mark.skip(reason="the benchmarks run with --benchmarks")
+    for item in items:
+        if directory in Path(item.fspath).parents:
+            item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    for result in results:
+        peak_rss = (
+            f"{result.peak_rss / 1024**2:8.1f} MiB"
+            if result.peak_rss is not None
+            else "unknown"
+        )
+        terminalreporter.write_line(
+            f"{result.name:<32} {result.size:>9} {result.wall_time:10.3f} s "
+            f"{peak_rss}"
+        )
+
+
+@pytest.fixture(scope="session")
+def history():
+    return harness.BenchmarkHistory()
+
+
+@pytest.fixture(scope="session")
+def schematisations(tmp_path_factory):
+    """Synthetic schematisations per (revision, size), generated once per session"""
+    directory = tmp_path_factory.mktemp("schematisations")
+    cache = {}
+
+    def get(revision, size):
+        if (revision, size) not in cache:
+            cache[(revision, size)] = generate_schematisation(
+                directory / f"model_{revision}_{size}.sqlite",
+                revision=revision,
+                row_counts=get_row_counts(size),
+            )
+        return cache[(revision, size)]
+
+    return get
+
+
+@pytest.fixture
+def schematisation(schematisations, tmp_path):
+    """A copy of a synthetic schematisation that a benchmark may modify"""
+
+    def get(revision, size):
+        src = schematisations(revision, size)
+        dst = tmp_path / src.name
+        shutil.copyfile(src, dst)
+        return dst
+
+    return get
+
+
+@pytest.fixture
+def benchmark(history):
+    """Measure a function, fail on a regression and add the result to the history"""
+
+    def run(name, size, func, *args, number=1):
+        result = harness.measure(name, size, func, *args, number=number)
+        results.append(result)
+        regression = history.check(result)
+        history.append(result)
+        if regression is not None:
+            pytest.fail(regression)
+        return result
+
+    return run
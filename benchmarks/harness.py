@@ -0,0 +1,296 @@
+"""Measure, store and compare benchmark results.
+
+Every benchmark runs in a fresh (spawned) process, so that the peak resident set
+size (RSS) of one benchmark does not leak into the next. Results are appended to
+a JSON lines history file. A result is a regression when its wall time exceeds
+the median of the last results of the same benchmark, size and machine by more
+than a threshold factor.
+"""
+
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import traceback
+from datetime import datetime, timezone
+from pathlib import Path
+from queue import Empty
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import event, select
+
+from threedi_schema import __version__, ThreediDatabase
+from threedi_schema.domain.models import DECLARED_MODELS
+from threedi_schema.infrastructure.spatial_index import (
+    ensure_spatial_indexes as _ensure_spatial_indexes,
+)
+
+HISTORY_PATH = Path(
+    os.environ.get("THREEDI_BENCHMARK_HISTORY", Path(__file__).parent / "history.jsonl")
+)
+# a result is a regression when it is slower than THRESHOLD times the baseline
+THRESHOLD = float(os.environ.get("THREEDI_BENCHMARK_THRESHOLD", 2.0))
+# the baseline is the median of this many previous results
+BASELINE_RUNS = 5
+# the sizes (number of connection nodes) of the benchmarked schematisations
+SIZES = [
+    int(size)
+    for size in os.environ.get("THREEDI_BENCHMARK_SIZES", "1000,10000").split(",")
+]
+
+
+class BenchmarkResult(NamedTuple):
+    name: str
+    size: int
+    wall_time: float  # seconds per call
+    peak_rss: Optional[int]  # bytes, None if unavailable on this platform
+
+
+def get_peak_rss() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _run(queue, func, args, number):
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        wall_time = (time.perf_counter() - start) / number
+    except Exception:
+        queue.put((None, traceback.format_exc()))
+    else:
+        queue.put((wall_time, get_peak_rss()))
+
+
+def measure(name: str, size: int, func, *args, number: int = 1) -> BenchmarkResult:
+    """Call func(*args) `number` times in a fresh process.
+
+    Returns the wall time per call and the peak RSS of the process. Raises
+    RuntimeError if func raises.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run, args=(queue, func, args, number))
+    process.start()
+    while True:
+        try:
+            wall_time, peak_rss = queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                raise RuntimeError(
+                    f"Benchmark {name} crashed with exit code {process.exitcode}"
+                )
+        else:
+            break
+    process.join()
+    if wall_time is None:
+        raise RuntimeError(f"Benchmark {name} failed:\n{peak_rss}")
+    return BenchmarkResult(name, size, wall_time, peak_rss)
+
+
+def get_machine() -> str:
+    """Identifies the machine; results are only compared on the same machine"""
+    return f"{platform.node()}-{platform.machine()}-py{platform.python_version()}"
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkHistory:
+    """Results of earlier benchmark runs, stored as JSON lines"""
+
+    def __init__(self, path=HISTORY_PATH, threshold=THRESHOLD):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.machine = get_machine()
+        self.commit = get_commit()
+
+    def records(self, name: str, size: int) -> List[dict]:
+        if not self.path.exists():
+            return []
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return [
+            record
+            for record in records
+            if record["name"] == name
+            and record["size"] == size
+            and record["machine"] == self.machine
+        ]
+
+    def baseline(self, name: str, size: int) -> Optional[float]:
+        """Median wall time of the last BASELINE_RUNS results, if any"""
+        records = self.records(name, size)[-BASELINE_RUNS:]
+        if not records:
+            return None
+        return statistics.median(record["wall_time"] for record in records)
+
+    def check(self, result: BenchmarkResult) -> Optional[str]:
+        """A message describing the regression of result, or None"""
+        baseline = self.baseline(result.name, result.size)
+        if baseline is None or result.wall_time <= self.threshold * baseline:
+            return None
+        return (
+            f"{result.name} (size {result.size}) took {result.wall_time:.3f} s, "
+            f"more than {self.threshold} times the baseline of {baseline:.3f} s"
+        )
+
+    def append(self, result: BenchmarkResult):
+        record = {
+            **result._asdict(),
+            "machine": self.machine,
+            "version": __version__,
+            "commit": self.commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def drop_spatial_indexes(path):
+    """Remove the rtree spatial indexes of a geopackage"""
+    with sqlite3.connect(path) as connection:
+        tables = [
+            table
+            for (table,) in connection.execute(
+                "SELECT table_name FROM gpkg_extensions "
+                "WHERE extension_name = 'gpkg_rtree_index'"
+            )
+        ]
+        for table in tables:
+            triggers = connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND name LIKE ?",
+                (f"rtree_{table}_geom_%",),
+            ).fetchall()
+            for (trigger,) in triggers:
+                connection.execute(f'DROP TRIGGER "{trigger}"')
+            connection.execute(f'DROP TABLE IF EXISTS "rtree_{table}_geom"')
+        connection.execute(
+            "DELETE FROM gpkg_extensions WHERE extension_name = 'gpkg_rtree_index'"
+        )
+
+
+# The benchmarked functions; these run in a spawned process and therefore need
+# to be importable.
+
+
+def upgrade(path, revision):
+    ThreediDatabase(path).schema.upgrade(revision=revision, backup=True)
+
+
+def convert_to_geopackage(path):
+    ThreediDatabase(path).schema.convert_to_geopackage()
+
+
+def ensure_spatial_indexes(path):
+    _ensure_spatial_indexes(ThreediDatabase(path).engine, DECLARED_MODELS)
+
+
+def get_version(path):
+    ThreediDatabase(path).schema.get_version()
+
+
+def epsg_code(path):
+    ThreediDatabase(path).schema.epsg_code
+
+
+def file_transaction(path):
+    with ThreediDatabase(path).file_transaction():
+        pass
+
+
+def select_models(path, repeat=10):
+    """Select all rows of every model `repeat` times.
+
+    Returns the fraction of the statements that came from SQLAlchemy's compiled
+    cache instead of being compiled again.
+    """
+    engine = ThreediDatabase(path).engine
+    cache_hits = []
+
+    def count_cache_hits(conn, cursor, statement, parameters, context, executemany):
+        cache_hits.append(context.cache_hit == context.dialect.CACHE_HIT)
+
+    event.listen(engine, "after_cursor_execute", count_cache_hits)
+    with engine.connect() as connection:
+        for _ in range(repeat):
+            for model in DECLARED_MODELS:
+                connection.execute(select(model.__table__)).fetchall()
+    return sum(cache_hits) / len(cache_hits)
+
+
+# tables and columns that refer to connection nodes, for topology_queries
+TOPOLOGY_COLUMNS = {
+    "channel": ("connection_node_id_start", "connection_node_id_end"),
+    "culvert": ("connection_node_id_start", "connection_node_id_end"),
+    "orifice": ("connection_node_id_start", "connection_node_id_end"),
+    "pipe": ("connection_node_id_start", "connection_node_id_end"),
+    "weir": ("connection_node_id_start", "connection_node_id_end"),
+    "pump": ("connection_node_id",),
+}
+
+
+def topology_queries(path, n_nodes=1000):
+    """Look up the objects that are connected to each of `n_nodes` nodes"""
+    queries = [
+        f"SELECT id FROM {table} WHERE {column} = ?"
+        for table, columns in TOPOLOGY_COLUMNS.items()
+        for column in columns
+    ]
+    with sqlite3.connect(path) as conn:
+        node_ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM connection_node ORDER BY id LIMIT ?", (n_nodes,)
+            )
+        ]
+        for node_id in node_ids:
+            for query in queries:
+                conn.execute(query, (node_id,)).fetchall()
+
+
+def decode_geometries(path, table):
+    """Decode all geometries of a table, and their bounds from the envelopes"""
+    from threedi_schema.domain.gpkg import decode_bounds
+    from threedi_schema.domain.gpkg import decode_geometries as _decode_geometries
+
+    with sqlite3.connect(path) as conn:
+        (geometry_type,) = conn.execute(
+            "SELECT geometry_type_name FROM gpkg_geometry_columns "
+            "WHERE table_name = ?",
+            (table,),
+        ).fetchone()
+        blobs = [row[0] for row in conn.execute(f"SELECT geom FROM {table}")]
+    _decode_geometries(blobs, geometry_type)
+    decode_bounds(blobs)
+
+
+def build_topology(path):
+    """Build the 1D network and compute its connected components"""
+    from threedi_schema.application.topology import build_topology as _build_topology
+
+    with ThreediDatabase(path).engine.connect() as connection:
+        _build_topology(connection).connected_components()
@@ -0,0 +1,90 @@
+"""Benchmarks of the migrations, the geopackage conversion and common queries.
+
+Run with ``pytest benchmarks``, see the README.
+"""
+
+import harness
+import pytest
+
+from threedi_schema.application.schema import get_alembic_config
+from threedi_schema.application.upgrade_utils import get_upgrade_steps
+from threedi_schema.domain import constants
+
+# The oldest revision that is benchmarked; older ones are rarely upgraded
+FIRST_REVISION = "0222"
+UPGRADE_STEPS = get_upgrade_steps(get_alembic_config(), int(FIRST_REVISION))
+LAST_SPTL_REVISION = f"{constants.LAST_SPTL_SCHEMA_VERSION:04d}"
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+@pytest.mark.parametrize(
+    "previous, revision", list(zip([FIRST_REVISION] + UPGRADE_STEPS, UPGRADE_STEPS))
+)
+def test_upgrade(schematisation, benchmark, previous, revision, size):
+    path = schematisation(previous, size)
+    benchmark(f"upgrade_{revision}", size, harness.upgrade, str(path), revision)
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+def test_convert_to_geopackage(schematisation, benchmark, size):
+    path = schematisation(LAST_SPTL_REVISION, size)
+    benchmark("convert_to_geopackage", size, harness.convert_to_geopackage, str(path))
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+def test_ensure_spatial_indexes(schematisation, benchmark, size):
+    path = schematisation("head", size)
+    harness.drop_spatial_indexes(path)
+    benchmark("ensure_spatial_indexes", size, harness.ensure_spatial_indexes, str(path))
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+def test_get_version(schematisation, benchmark, size):
+    path = schematisation("head", size)
+    benchmark("get_version", size, harness.get_version, str(path), number=20)
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+@pytest.mark.parametrize("revision", [FIRST_REVISION, LAST_SPTL_REVISION, "head"])
+def test_epsg_code(schematisation, benchmark, revision, size):
+    path = schematisation(revision, size)
+    benchmark(f"epsg_code_{revision}", size, harness.epsg_code, str(path), number=5)
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+def test_file_transaction(schematisation, benchmark, size):
+    path = schematisation("head", size)
+    benchmark("file_transaction", size, harness.file_transaction, str(path))
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+def test_select_models(schematisation, benchmark, size):
+    path = schematisation("head", size)
+    # every statement is compiled once, the other executions hit the cache
+    assert harness.select_models(str(path)) >= 0.9
+    benchmark("select_models", size, harness.select_models, str(path), number=5)
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+@pytest.mark.parametrize("revision", ["0301", "head"])
+def test_topology_queries(schematisation, benchmark, revision, size):
+    # the topology columns are indexed from revision 0302
+    path = schematisation(revision, size)
+    benchmark(f"topology_queries_{revision}", size, harness.topology_queries, str(path))
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+@pytest.mark.parametrize("table", ["connection_node", "channel", "surface"])
+def test_decode_geometries(schematisation, benchmark, table, size):
+    pytest.importorskip("numpy")
+    path = schematisation("head", size)
+    benchmark(
+        f"decode_geometries_{table}", size, harness.decode_geometries, str(path), table
+    )
+
+
+@pytest.mark.parametrize("size", harness.SIZES)
+def test_build_topology(schematisation, benchmark, size):
+    pytest.importorskip("numpy")
+    path = schematisation("head", size)
+    benchmark("build_topology", size, harness.build_topology, str(path))
@@ -1,5 +1,12 @@
 # the public API of this package
 
-from .errors import UpgradeFailedError  # NOQA
+from .errors import (  # NOQA
+    ChangelogIncompleteError,
+    InsufficientSpaceError,
+    MemoryBudgetExceededError,
+    UpgradeFailedError,
+)
+from .memory import MemoryMonitor  # NOQA
 from .schema import ModelSchema  # NOQA
 from .threedi_database import ThreediDatabase  # NOQA
+from .upgrade_cache import UpgradeCache  # NOQA
@@ -0,0 +1,283 @@
+"""Bulk readers that load whole tables of a schematisation into NumPy arrays,
+and a bulk loader that inserts columnar batches into them.
+
+This module requires numpy, which is an optional dependency: install
+``threedi-schema[numpy]``.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+from sqlalchemy import (
+    Boolean,
+    Connection,
+    event,
+    Float,
+    Integer,
+    select,
+    Text,
+    type_coerce,
+)
+from sqlalchemy.types import TypeDecorator
+
+from ..domain import models
+from ..domain.arrays import CSVParseError, parse_csv_tables
+from ..domain.custom_types import CustomEnum, Geometry
+from ..domain.gpkg import (
+    decode_geometries,
+    decode_geometry_types,
+    GeometryDecodeError,
+    WKB_TYPES,
+)
+from ..infrastructure.spatial_index import create_spatial_index, drop_spatial_index
+
+__all__ = [
+    "BATCH_SIZE",
+    "Timeseries",
+    "TIMESERIES_MODELS",
+    "load_batches",
+    "read_table",
+    "read_timeseries",
+]
+
+# number of rows per batch of read_table
+BATCH_SIZE = 100000
+
+# the WKB type code per geometry type
+WKB_CODES = {name: code for code, name in WKB_TYPES.items()}
+
+TIMESERIES_MODELS = (
+    models.BoundaryCondition1D,
+    models.BoundaryConditions2D,
+    models.Lateral1D,
+    models.Lateral2D,
+)
+
+
+class Timeseries(NamedTuple):
+    """The timeseries of all rows of a table, concatenated.
+
+    The timeseries of the row with id ``ids[i]`` is
+    ``time[offsets[i]:offsets[i + 1]]`` and ``value[offsets[i]:offsets[i + 1]]``.
+    The times are in the ``time_units`` of the row.
+    """
+
+    ids: np.ndarray
+    offsets: np.ndarray
+    time: np.ndarray
+    value: np.ndarray
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.time[start:end], self.value[start:end]
+
+
+def read_timeseries(db, model, validate=True) -> Timeseries:
+    """Read the timeseries of all rows of `model` (ordered by id) in one pass.
+
+    A missing timeseries is read as an empty one. A CSVParseError names the
+    table and the id of a row of which the timeseries cannot be parsed or,
+    with `validate`, of which the times are not increasing.
+    """
+    table = model.__table__
+    # select the raw text, the bulk parser does the cleaning of CSVText
+    query = select(table.c.id, type_coerce(table.c.timeseries, Text)).order_by(
+        table.c.id
+    )
+    ids = []
+
+    def rows(result):
+        for row_id, timeseries in result:
+            ids.append(row_id)
+            yield timeseries
+
+    with db.get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        try:
+            ragged = parse_csv_tables(rows(result), ncols=2)
+        except CSVParseError as e:
+            raise CSVParseError(
+                f"timeseries of {table.name} with id {ids[e.index]}: {e.message}"
+            ) from None
+    ids = np.array(ids, dtype=np.int64)
+    time, value = ragged.values[:, 0], ragged.values[:, 1]
+    if validate:
+        not_increasing = np.diff(time) <= 0
+        # do not compare the last time of a timeseries with the first of the next
+        starts = ragged.offsets[1:-1]
+        not_increasing[starts[(starts > 0) & (starts < len(time))] - 1] = False
+        if not_increasing.any():
+            position = np.flatnonzero(not_increasing)[0] + 1
+            i = np.searchsorted(ragged.offsets, position, side="right") - 1
+            raise CSVParseError(
+                f"timeseries of {table.name} with id {ids[i]}: "
+                f"the times are not increasing"
+            )
+    return Timeseries(ids, ragged.offsets, time, value)
+
+
+def _to_array(values, column):
+    """Convert a column of raw SQLite values to a NumPy array.
+
+    Integer, enum and boolean columns become masked arrays (masked where NULL),
+    float columns float arrays (NaN where NULL) and other columns object arrays.
+    """
+    column_type = column.type
+    if isinstance(column_type, Geometry):
+        return decode_geometries(values, column_type.geometry_type)
+    if isinstance(column_type, TypeDecorator):
+        column_type = column_type.impl
+    if isinstance(column_type, Float):
+        return np.array(values, dtype=np.float64)
+    if isinstance(column_type, (Integer, Boolean)):
+        mask = np.array([value is None for value in values], dtype=bool)
+        data = np.array(
+            [0 if value is None else value for value in values], dtype=np.int64
+        )
+        if isinstance(column_type, Boolean):
+            data = data.astype(bool)
+        return np.ma.MaskedArray(data, mask)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def read_table(db, model, batch_size=BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Read all rows of `model` (ordered by id) in batches of `batch_size` rows.
+
+    Every batch is a dict with a NumPy array per column. The values are read
+    without the ORM and the column types: enum columns contain the raw
+    values (see ``CustomEnum.decode_many``) and geometry columns are decoded
+    from the GeoPackage blobs into a GeometryArray. This requires a
+    schematisation in the current (geopackage) format.
+    """
+    table = model.__table__
+    columns = list(table.columns)
+    names = ", ".join(f'"{column.name}"' for column in columns)
+    query = f'SELECT {names} FROM "{table.name}" ORDER BY "id"'
+    with db.get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True).exec_driver_sql(
+            query
+        )
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield {
+                column.name: _to_array(values, column)
+                for column, values in zip(columns, zip(*rows))
+            }
+
+
+def _check_enum(table, name, values):
+    column_type = table.columns[name].type
+    array = np.array(values, dtype=object)
+    present = np.not_equal(array, None)
+    invalid = np.zeros(len(array), dtype=bool)
+    invalid[present] = ~np.isin(array[present], column_type.enums)
+    if invalid.any():
+        i = np.flatnonzero(invalid)[0]
+        raise ValueError(
+            f"{table.name}.{name}: row {i}: {values[i]!r} is not a valid "
+            f"{column_type.enum_class.__name__}"
+        )
+
+
+def _check_geometries(table, name, values):
+    expected = table.columns[name].type.geometry_type.upper()
+    try:
+        types = decode_geometry_types(values)
+    except GeometryDecodeError as e:
+        raise GeometryDecodeError(f"{table.name}.{name}: {e}") from None
+    invalid = (types != 0) & (types != WKB_CODES[expected])
+    if invalid.any():
+        i = np.flatnonzero(invalid)[0]
+        raise ValueError(
+            f"{table.name}.{name}: row {i}: expected a {expected}, got a "
+            f"{WKB_TYPES.get(types[i], f'WKB type {types[i]}')}"
+        )
+
+
+def _validate(table, columns) -> Tuple[List[str], List[tuple]]:
+    """The column names and the rows of a batch, after checking the enum and
+    geometry columns"""
+    unknown = set(columns) - set(table.columns.keys())
+    if unknown:
+        raise ValueError(f"{table.name} has no columns {', '.join(sorted(unknown))}")
+    values = {}
+    for name, column_values in columns.items():
+        # tolist converts to Python types and masked values to None
+        if isinstance(column_values, np.ndarray):
+            column_values = column_values.tolist()
+        else:
+            column_values = list(column_values)
+        if isinstance(table.columns[name].type, CustomEnum):
+            _check_enum(table, name, column_values)
+        elif isinstance(table.columns[name].type, Geometry):
+            _check_geometries(table, name, column_values)
+        values[name] = column_values
+    if len({len(column_values) for column_values in values.values()}) > 1:
+        raise ValueError(f"the columns of a batch of {table.name} differ in length")
+    return list(values), list(zip(*values.values()))
+
+
+@contextmanager
+def _begin(db) -> Iterator[Connection]:
+    """Begin a transaction that includes DDL, on a dedicated connection.
+
+    This is the SQLAlchemy recipe for transactional DDL with pysqlite: the
+    driver's own transaction handling is switched off and BEGIN is emitted
+    when SQLAlchemy begins the transaction.
+    """
+    with db.get_engine().connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT")
+        event.listen(connection, "begin", lambda conn: conn.exec_driver_sql("BEGIN"))
+        with connection.begin():
+            yield connection
+
+
+def load_batches(db, batches: Iterable[Tuple[Any, Dict[str, Any]]]) -> Dict[str, int]:
+    """Insert batches of rows into the tables of the declared models at once.
+
+    Every batch is a pair of a model and a dict with a sequence (for instance
+    a NumPy array) of values per column. Enum columns contain the raw values,
+    geometry columns GeoPackage blobs. Masked values and None are NULL.
+
+    All batches are inserted in one transaction, which is rolled back if a
+    batch is invalid. The spatial indexes of the loaded tables are dropped on
+    their first batch and created once at the end, so that the R-tree triggers
+    do not fire for every row. Returns the number of inserted rows per table.
+    """
+    counts = {}
+    dropped = []
+    with _begin(db) as connection:
+        for model, columns in batches:
+            if model not in models.DECLARED_MODELS:
+                raise ValueError(f"{model} is not a declared model")
+            table = model.__table__
+            names, rows = _validate(table, columns)
+            if not rows:
+                continue
+            if table.name not in counts:
+                counts[table.name] = 0
+                for column in table.columns:
+                    if isinstance(column.type, Geometry) and drop_spatial_index(
+                        connection, column
+                    ):
+                        dropped.append(column)
+            connection.exec_driver_sql(
+                f'INSERT INTO "{table.name}" ('
+                + ", ".join(f'"{name}"' for name in names)
+                + ") VALUES ("
+                + ", ".join("?" * len(names))
+                + ")",
+                rows,
+            )
+            counts[table.name] += len(rows)
+        for column in dropped:
+            create_spatial_index(connection, column)
+    return counts
@@ -0,0 +1,216 @@
+from typing import Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+from .errors import ChangelogIncompleteError
+
+__all__ = [
+    "Change",
+    "compact_changelog",
+    "get_changes",
+    "get_last_sequence",
+    "install_changelog",
+    "remove_changelog",
+]
+
+# the log of changed rows and the tables of which the changes are logged
+CHANGELOG_TABLE = "threedi_changelog"
+CHANGELOG_TABLES_TABLE = "threedi_changelog_tables"
+
+# the operations, in the order of their code in the log
+OPERATIONS = ("insert", "update", "delete")
+INSERT, UPDATE, DELETE = range(len(OPERATIONS))
+
+
+class Change(NamedTuple):
+    sequence: int
+    table_name: str
+    row_id: int
+    operation: str
+
+
+def _trigger_name(table_name, operation):
+    # does not start with 'rtree_' like the geopackage triggers; the cleanup in
+    # migration 0229 does not drop these, because it matches triggers on v2_
+    # tables and they are installed only on the current tables
+    return f"threedi_changelog_{table_name}_{operation}"
+
+
+def _get_names(connection, type):
+    return {
+        row[0]
+        for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = :type"), {"type": type}
+        )
+    }
+
+
+def _log(table_id, row_id, operation):
+    return (
+        f"INSERT INTO {CHANGELOG_TABLE} (table_id, row_id, operation) "
+        f"VALUES ({table_id}, {row_id}, {operation});"
+    )
+
+
+def install_changelog(connection, table_names: Iterable[str]):
+    """Log the inserted, updated and deleted rows of tables with triggers.
+
+    Every change appends (sequence, table, rowid, operation) to the log. An
+    update that changes the rowid is logged as a delete and an insert.
+    Installing again adds tables and keeps the logged changes.
+    """
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {CHANGELOG_TABLES_TABLE} ("
+            "id INTEGER PRIMARY KEY, table_name TEXT NOT NULL UNIQUE)"
+        )
+    )
+    # AUTOINCREMENT, so that sequence numbers are not reused after compacting
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {CHANGELOG_TABLE} ("
+            "sequence INTEGER PRIMARY KEY AUTOINCREMENT, table_id INTEGER NOT NULL, "
+            "row_id INTEGER NOT NULL, operation INTEGER NOT NULL)"
+        )
+    )
+    existing = _get_names(connection, "table")
+    for table_name in table_names:
+        if table_name not in existing:
+            continue
+        connection.execute(
+            text(
+                f"INSERT OR IGNORE INTO {CHANGELOG_TABLES_TABLE} (table_name) "
+                "VALUES (:table)"
+            ),
+            {"table": table_name},
+        )
+        table_id = connection.execute(
+            text(f"SELECT id FROM {CHANGELOG_TABLES_TABLE} WHERE table_name = :table"),
+            {"table": table_name},
+        ).scalar()
+        bodies = {
+            "insert": _log(table_id, "NEW.rowid", INSERT),
+            "update": (
+                f"INSERT INTO {CHANGELOG_TABLE} (table_id, row_id, operation) "
+                f"SELECT {table_id}, OLD.rowid, {DELETE} WHERE OLD.rowid != NEW.rowid; "
+                + _log(
+                    table_id,
+                    "NEW.rowid",
+                    f"CASE WHEN OLD.rowid = NEW.rowid THEN {UPDATE} ELSE {INSERT} END",
+                )
+            ),
+            "delete": _log(table_id, "OLD.rowid", DELETE),
+        }
+        for operation, body in bodies.items():
+            connection.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS "
+                    f"{_trigger_name(table_name, operation)} "
+                    f'AFTER {operation.upper()} ON "{table_name}" BEGIN {body} END'
+                )
+            )
+
+
+def remove_changelog(connection):
+    """Remove the changelog triggers and tables"""
+    for name in _get_names(connection, "trigger"):
+        if name.startswith("threedi_changelog_"):
+            connection.execute(text(f"DROP TRIGGER {name}"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {CHANGELOG_TABLE}"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {CHANGELOG_TABLES_TABLE}"))
+
+
+def _check_changelog(connection):
+    if CHANGELOG_TABLE not in _get_names(connection, "table"):
+        raise ChangelogIncompleteError("no changelog is installed")
+    triggers = _get_names(connection, "trigger")
+    for (table_name,) in connection.execute(
+        text(f"SELECT table_name FROM {CHANGELOG_TABLES_TABLE}")
+    ):
+        if not all(
+            _trigger_name(table_name, operation) in triggers for operation in OPERATIONS
+        ):
+            raise ChangelogIncompleteError(
+                f"the changes of {table_name} are not logged anymore (the table "
+                f"was probably recreated by a migration); read the whole table "
+                f"and install the changelog again"
+            )
+
+
+def get_last_sequence(connection) -> int:
+    """The sequence number of the last logged change, 0 if there is none"""
+    _check_changelog(connection)
+    sequence = connection.execute(
+        text("SELECT seq FROM sqlite_sequence WHERE name = :table"),
+        {"table": CHANGELOG_TABLE},
+    ).scalar()
+    return sequence or 0
+
+
+def get_changes(
+    connection, since: int = 0, table_names: Optional[Iterable[str]] = None
+) -> List[Change]:
+    """The changes with a sequence number larger than `since`, in order.
+
+    Store the sequence number of the last change (or get_last_sequence) and
+    pass it as `since` on the next run. Raises ChangelogIncompleteError when
+    changes were possibly missed, because the triggers of a table are gone.
+    """
+    _check_changelog(connection)
+    query = (
+        f"SELECT log.sequence, tables.table_name, log.row_id, log.operation "
+        f"FROM {CHANGELOG_TABLE} log "
+        f"JOIN {CHANGELOG_TABLES_TABLE} tables ON tables.id = log.table_id "
+        f"WHERE log.sequence > :since"
+    )
+    params = {"since": since}
+    if table_names is not None:
+        table_names = list(table_names)
+        placeholders = ", ".join(f":table_{i}" for i in range(len(table_names)))
+        query += f" AND tables.table_name IN ({placeholders})"
+        params.update({f"table_{i}": name for i, name in enumerate(table_names)})
+    return [
+        Change(sequence, table_name, row_id, OPERATIONS[operation])
+        for sequence, table_name, row_id, operation in connection.execute(
+            text(query + " ORDER BY log.sequence"), params
+        )
+    ]
+
+
+def compact_changelog(connection, until: Optional[int] = None):
+    """Remove the changes up to and including `until` (that are processed) and
+    keep only the last change of every other row.
+
+    The last change of a row gets the net operation: 'delete' when the row
+    was deleted, 'insert' when it did not exist before the first kept change,
+    'update' otherwise. A reader that already read some of the merged changes
+    therefore has to handle an 'insert' of a row that it knows.
+    """
+    _check_changelog(connection)
+    if until is not None:
+        connection.execute(
+            text(f"DELETE FROM {CHANGELOG_TABLE} WHERE sequence <= :until"),
+            {"until": until},
+        )
+    # the first and last change per row in one pass: min and max of the
+    # sequence number with the operation code in the lowest 2 bits
+    connection.execute(
+        text(
+            "CREATE TEMP TABLE threedi_changelog_compacted AS "
+            "SELECT table_id, row_id, "
+            "min(sequence * 4 + operation) AS first, "
+            "max(sequence * 4 + operation) AS last "
+            f"FROM {CHANGELOG_TABLE} GROUP BY table_id, row_id"
+        )
+    )
+    connection.execute(text(f"DELETE FROM {CHANGELOG_TABLE}"))
+    connection.execute(
+        text(
+            f"INSERT INTO {CHANGELOG_TABLE} (sequence, table_id, row_id, operation) "
+            "SELECT last / 4, table_id, row_id, "
+            f"CASE WHEN last % 4 = {DELETE} THEN {DELETE} "
+            f"WHEN first % 4 = {INSERT} THEN {INSERT} ELSE {UPDATE} END "
+            "FROM threedi_changelog_compacted ORDER BY last"
+        )
+    )
+    connection.execute(text("DROP TABLE threedi_changelog_compacted"))
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence
+
+from .upgrade_utils import STEP_COSTS
+
+__all__ = ["UpgradeCheckpoints"]
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path) -> str:
+    """Hash a file in chunks so that large files are never fully loaded into memory"""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def durable_copy(src, dst):
+    """Copy src to dst such that dst is either absent or complete after a crash"""
+    dst = Path(dst)
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    shutil.copyfile(src, tmp)
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, dst)
+
+
+def get_checkpoint_revisions(steps: Sequence[str]) -> List[str]:
+    """
+    Select the revisions after which a checkpoint is saved.
+
+    These are the expensive revisions (see upgrade_utils.STEP_COSTS) and the
+    last revision in `steps`.
+    """
+    revisions = [
+        step
+        for step in steps[:-1]
+        if step in STEP_COSTS and STEP_COSTS[step].seconds_per_row > 0
+    ]
+    return revisions + list(steps[-1:])
+
+
+class Checkpoint(NamedTuple):
+    path: Path
+    revision: str
+
+
+class UpgradeCheckpoints:
+    """Durable snapshots of a work database during an upgrade.
+
+    Checkpoints are stored in `directory` and belong to the source file with
+    checksum `source_sha256` and to the upgrade `options` (such as the
+    PRAGMAs), so a checkpoint is never used to resume the upgrade of a
+    different (or modified) file, or an upgrade with other options. Only the
+    latest checkpoint is kept.
+    """
+
+    def __init__(self, directory, source_sha256: str, options: Optional[dict] = None):
+        self.directory = Path(directory)
+        self.source_sha256 = source_sha256
+        self.options = options or {}
+        key = {"source_sha256": source_sha256, "options": self.options}
+        self.key = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def for_file(cls, directory, source_path, options: Optional[dict] = None):
+        return cls(directory, file_sha256(source_path), options)
+
+    def _metadata_path(self) -> Path:
+        return self.directory / f"{self.key}.json"
+
+    def _checkpoint_path(self, revision: str) -> Path:
+        return self.directory / f"{self.key}-{revision}.checkpoint"
+
+    def _read_metadata(self) -> Optional[dict]:
+        try:
+            with open(self._metadata_path()) as f:
+                metadata = json.load(f)
+            metadata["revision"], metadata["sha256"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return metadata
+
+    def latest(self) -> Optional[Checkpoint]:
+        """The latest checkpoint, or None if there is no valid checkpoint"""
+        metadata = self._read_metadata()
+        if metadata is None:
+            return None
+        path = self._checkpoint_path(metadata["revision"])
+        if not path.exists() or file_sha256(path) != metadata["sha256"]:
+            return None
+        return Checkpoint(path, metadata["revision"])
+
+    def save(self, work_file, revision: str) -> Checkpoint:
+        """Store a copy of work_file as checkpoint for revision"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        previous = self._read_metadata()
+        path = self._checkpoint_path(revision)
+        durable_copy(work_file, path)
+        metadata = {
+            "source_sha256": self.source_sha256,
+            "revision": revision,
+            "sha256": file_sha256(path),
+        }
+        tmp = self._metadata_path().with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(metadata, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._metadata_path())
+        if previous is not None and previous["revision"] != revision:
+            self._checkpoint_path(previous["revision"]).unlink(missing_ok=True)
+        return Checkpoint(path, revision)
+
+    def clear(self):
+        """Remove all checkpoints of the source file and options"""
+        self._metadata_path().unlink(missing_ok=True)
+        for path in self.directory.glob(f"{self.key}-*.checkpoint"):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,307 @@
+"""Row-level differences between two schematisations of the same revision.
+
+The second database is attached to a connection of the first, so that the
+rows are compared by SQLite with joins on id, and only the rows that differ
+are read into Python. Geometries that differ byte for byte are decoded and
+compared with a tolerance. The differences can be written to a patch file
+(gzipped JSON lines) that turns the first database into the second.
+
+This module requires numpy, which is an optional dependency: install
+``threedi-schema[numpy]``.
+"""
+
+import base64
+import contextlib
+import gzip
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from ..domain import models
+from ..domain.custom_types import Geometry
+from ..domain.gpkg import decode_geometries, geometries_equal
+from .schema import ModelSchema
+
+__all__ = ["TableDiff", "apply_patch", "diff_databases"]
+
+# number of rows that are read at once
+BATCH_SIZE = 10000
+
+# the schema name of the second database
+ATTACHED = "other"
+
+PATCH_FORMAT = 1
+
+
+class TableDiff(NamedTuple):
+    """The differences of a table, from the first to the second database.
+
+    `added` are the ids of the rows that only exist in the second database,
+    `removed` the ids of the rows that only exist in the first. `modified` maps
+    the id of every other row that differs to ``{column: (old, new)}``.
+    """
+
+    table_name: str
+    added: List[int]
+    removed: List[int]
+    modified: Dict[int, Dict[str, Tuple[Any, Any]]]
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {"$base64": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"cannot write {type(value)} to a patch")
+
+
+def _decode(obj):
+    if obj.keys() == {"$base64"}:
+        return base64.b64decode(obj["$base64"])
+    return obj
+
+
+class _PatchWriter:
+    def __init__(self, path, version: int):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.write(format=PATCH_FORMAT, version=version)
+
+    def write(self, **entry):
+        self.file.write(json.dumps(entry, default=_encode) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def _get_columns(connection, schema: str, table_name: str) -> List[str]:
+    return [
+        row[1]
+        for row in connection.exec_driver_sql(
+            f'PRAGMA {schema}.table_info("{table_name}")'
+        )
+    ]
+
+
+def _batches(connection, query, batch_size):
+    result = connection.execution_options(stream_results=True).exec_driver_sql(query)
+    # closed by contextlib.closing when the caller stops early, so that the
+    # attached database is not locked by an unfinished statement
+    try:
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        result.close()
+
+
+def _only_in(connection, schema, other_schema, table_name, columns, batch_size):
+    """The rows of a table that only exist in `schema`, as lists of values"""
+    names = ", ".join(f'a."{column}"' for column in columns)
+    query = (
+        f'SELECT {names} FROM {schema}."{table_name}" a '
+        f'LEFT JOIN {other_schema}."{table_name}" b ON a.id = b.id '
+        f"WHERE b.id IS NULL ORDER BY a.id"
+    )
+    return _batches(connection, query, batch_size)
+
+
+def _diff_rows(rows, columns, geometry_types, tolerance):
+    """{id: {column: (old, new)}} of rows of (id, old values..., new values...)"""
+    n = len(columns)
+    modified = {}
+    for row in rows:
+        changes = {
+            column: (old, new)
+            for column, old, new in zip(columns, row[1 : n + 1], row[n + 1 :])
+            if old != new
+        }
+        if changes:
+            modified[row[0]] = changes
+    for column, geometry_type in geometry_types.items():
+        ids = [row_id for row_id, changes in modified.items() if column in changes]
+        if not ids:
+            continue
+        old, new = zip(*(modified[row_id][column] for row_id in ids))
+        equal = geometries_equal(
+            decode_geometries(old, geometry_type),
+            decode_geometries(new, geometry_type),
+            tolerance,
+        )
+        for row_id in (row_id for row_id, same in zip(ids, equal) if same):
+            del modified[row_id][column]
+            if not modified[row_id]:
+                del modified[row_id]
+    return modified
+
+
+def _diff_table(connection, table, tolerance, batch_size, writer):
+    name = table.name
+    columns = _get_columns(connection, "main", name)
+    # the columns are selected by name, so their order does not matter
+    other_columns = _get_columns(connection, ATTACHED, name)
+    if "id" not in columns or set(other_columns) != set(columns):
+        raise ValueError(f"the columns of {name} differ")
+    columns.remove("id")
+    geometry_types = {
+        column.name: column.type.geometry_type
+        for column in table.columns
+        if isinstance(column.type, Geometry) and column.name in columns
+    }
+    with contextlib.closing(
+        _only_in(connection, "main", ATTACHED, name, ["id"], batch_size)
+    ) as batches:
+        removed = [row[0] for rows in batches for row in rows]
+    if writer and removed:
+        writer.write(table=name, removed=removed)
+    added = []
+    with contextlib.closing(
+        _only_in(connection, ATTACHED, "main", name, ["id"] + columns, batch_size)
+    ) as batches:
+        for rows in batches:
+            added.extend(row[0] for row in rows)
+            if writer:
+                writer.write(
+                    table=name,
+                    added={
+                        "columns": ["id"] + columns,
+                        "rows": [list(row) for row in rows],
+                    },
+                )
+    modified = {}
+    if columns:
+        query = (
+            "SELECT a.id, "
+            + ", ".join(f'a."{column}"' for column in columns)
+            + ", "
+            + ", ".join(f'b."{column}"' for column in columns)
+            + f' FROM main."{name}" a JOIN {ATTACHED}."{name}" b ON a.id = b.id WHERE '
+            + " OR ".join(f'a."{column}" IS NOT b."{column}"' for column in columns)
+            + " ORDER BY a.id"
+        )
+        with contextlib.closing(_batches(connection, query, batch_size)) as batches:
+            for rows in batches:
+                batch = _diff_rows(rows, columns, geometry_types, tolerance)
+                if writer and batch:
+                    writer.write(
+                        table=name,
+                        modified=[
+                            [
+                                row_id,
+                                {column: new for column, (_, new) in changes.items()},
+                            ]
+                            for row_id, changes in batch.items()
+                        ],
+                    )
+                modified.update(batch)
+    return TableDiff(name, added, removed, modified)
+
+
+def diff_databases(
+    db, other, tolerance: float = 0.0, patch_path=None, batch_size=BATCH_SIZE
+) -> List[TableDiff]:
+    """The differences between the tables of the declared models of `db` and
+    `other` (both ThreediDatabase), for the tables that differ.
+
+    Geometries are equal when all their coordinates are within `tolerance`.
+    With `patch_path`, a patch file is written that apply_patch can apply to
+    (a copy of) `db`. This requires two schematisations of the same revision
+    in the current (geopackage) format.
+    """
+    version = ModelSchema(db).get_version()
+    other_version = ModelSchema(other).get_version()
+    if version != other_version:
+        raise ValueError(
+            f"cannot compare schematisations of different revisions "
+            f"({version} and {other_version})"
+        )
+    writer = _PatchWriter(patch_path, version) if patch_path else None
+    diffs = []
+    try:
+        with db.get_engine().connect() as connection:
+            connection.exec_driver_sql(
+                f"ATTACH DATABASE ? AS {ATTACHED}", (str(Path(other.path).absolute()),)
+            )
+            try:
+                for model in models.DECLARED_MODELS:
+                    if not (
+                        db.has_table(model.__tablename__)
+                        and other.has_table(model.__tablename__)
+                    ):
+                        continue
+                    diff = _diff_table(
+                        connection, model.__table__, tolerance, batch_size, writer
+                    )
+                    if diff.added or diff.removed or diff.modified:
+                        diffs.append(diff)
+            except BaseException:
+                # a failing DETACH must not hide the original error
+                with contextlib.suppress(Exception):
+                    connection.exec_driver_sql(f"DETACH DATABASE {ATTACHED}")
+                raise
+            connection.exec_driver_sql(f"DETACH DATABASE {ATTACHED}")
+    finally:
+        if writer:
+            writer.close()
+    return diffs
+
+
+def apply_patch(db, patch_path):
+    """Apply a patch written by diff_databases to `db` in one transaction.
+
+    Raises a ValueError when the patch is for another revision or does not
+    apply, for instance because a removed or modified row does not exist.
+    """
+    with gzip.open(patch_path, "rt", encoding="utf-8") as f:
+        header = json.loads(next(f))
+        if header.get("format") != PATCH_FORMAT:
+            raise ValueError(f"unknown patch format {header.get('format')}")
+        version = ModelSchema(db).get_version()
+        if header["version"] != version:
+            raise ValueError(
+                f"cannot apply a patch of revision {header['version']} "
+                f"to a schematisation of revision {version}"
+            )
+        table_names = {model.__tablename__ for model in models.DECLARED_MODELS}
+        with db.get_engine().begin() as connection:
+            for line in f:
+                entry = json.loads(line, object_hook=_decode)
+                name = entry["table"]
+                if name not in table_names:
+                    raise ValueError(f"the patch contains an unknown table {name}")
+                columns = set(_get_columns(connection, "main", name))
+                if "removed" in entry:
+                    ids = entry["removed"]
+                    result = connection.exec_driver_sql(
+                        f'DELETE FROM "{name}" WHERE id = ?', [(i,) for i in ids]
+                    )
+                    if result.rowcount != len(ids):
+                        raise ValueError(f"removed rows of {name} do not exist")
+                if "added" in entry:
+                    names = entry["added"]["columns"]
+                    if not columns.issuperset(names):
+                        raise ValueError(
+                            f"the patch contains unknown columns of {name}"
+                        )
+                    connection.exec_driver_sql(
+                        f'INSERT INTO "{name}" ('
+                        + ", ".join(f'"{column}"' for column in names)
+                        + ") VALUES ("
+                        + ", ".join("?" * len(names))
+                        + ")",
+                        [tuple(row) for row in entry["added"]["rows"]],
+                    )
+                for row_id, values in entry.get("modified", []):
+                    if not columns.issuperset(values):
+                        raise ValueError(
+                            f"the patch contains unknown columns of {name}"
+                        )
+                    result = connection.exec_driver_sql(
+                        f'UPDATE "{name}" SET '
+                        + ", ".join(f'"{column}" = ?' for column in values)
+                        + " WHERE id = ?",
+                        (*values.values(), row_id),
+                    )
+                    if result.rowcount != 1:
+                        raise ValueError(
+                            f"modified row {row_id} of {name} does not exist"
+                        )
@@ -8,6 +8,18 @@ class UpgradeFailedError(Exception):
     """Raised when an upgrade() fails"""
 
 
+class MemoryBudgetExceededError(UpgradeFailedError):
+    """Raised when an upgrade() exceeds the memory budget of its MemoryMonitor"""
+
+
+class InsufficientSpaceError(Exception):
+    """Raised when the work directory of a file_transaction has too little free space"""
+
+
+class ChangelogIncompleteError(Exception):
+    """Raised when changes of a schematisation may be missing from its changelog"""
+
+
 class InvalidSRIDException(Exception):
     def __init__(self, epsg_code, issue=None):
         msg = f"Cannot migrate schematisation with model_settings.epsg_code={epsg_code}"
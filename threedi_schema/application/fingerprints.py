@@ -0,0 +1,223 @@
+import hashlib
+from typing import Dict, Iterable, Mapping, Optional
+
+from sqlalchemy import text
+
+__all__ = ["get_fingerprints", "install_change_counters", "remove_change_counters"]
+
+# the table with the change counters and the last computed fingerprints
+CHANGES_TABLE = "threedi_table_changes"
+
+# the last computed fingerprints of some of the columns of a table
+COLUMN_FINGERPRINTS_TABLE = "threedi_column_fingerprints"
+
+# number of rows that are hashed at once
+BATCH_SIZE = 10000
+
+OPERATIONS = ("insert", "update", "delete")
+
+
+def _trigger_name(table_name, operation):
+    return f"threedi_changes_{table_name}_{operation}"
+
+
+def _get_table_names(connection):
+    return {
+        row[0]
+        for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table'")
+        )
+    }
+
+
+def _get_trigger_names(connection):
+    return {
+        row[0]
+        for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        )
+    }
+
+
+def compute_fingerprint(
+    connection, table_name, batch_size=BATCH_SIZE, columns: Optional[Iterable] = None
+) -> str:
+    """The SHA-256 hash of the column names and all rows (ordered by id) of a table.
+
+    The rows are streamed in batches, so that the table is never loaded into
+    memory at once. The columns are hashed in alphabetical order, so that the
+    fingerprint does not depend on the order of the columns in the table. With
+    `columns`, only those columns are hashed.
+    """
+    if columns is None:
+        columns = (
+            row[1]
+            for row in connection.execute(text(f"PRAGMA table_info('{table_name}')"))
+        )
+    columns = sorted(columns)
+    names = ", ".join(f'"{column}"' for column in columns)
+    digest = hashlib.sha256(repr(columns).encode())
+    result = connection.execution_options(stream_results=True).exec_driver_sql(
+        f'SELECT {names} FROM "{table_name}" ORDER BY "id"'
+    )
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            break
+        digest.update("\n".join(repr(tuple(row)) for row in rows).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def install_change_counters(connection, table_names: Iterable[str]):
+    """Count the changes of tables with triggers, so that the fingerprints
+    of unchanged tables are not computed again"""
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} ("
+            "table_name TEXT PRIMARY KEY, changes INTEGER NOT NULL DEFAULT 0, "
+            "row_count INTEGER, max_rowid INTEGER, fingerprint TEXT, "
+            "fingerprint_changes INTEGER)"
+        )
+    )
+    existing = _get_table_names(connection)
+    for table_name in table_names:
+        if table_name not in existing:
+            continue
+        connection.execute(
+            text(f"INSERT OR IGNORE INTO {CHANGES_TABLE} (table_name) VALUES (:table)"),
+            {"table": table_name},
+        )
+        for operation in OPERATIONS:
+            connection.execute(
+                text(
+                    f"CREATE TRIGGER IF NOT EXISTS "
+                    f"{_trigger_name(table_name, operation)} "
+                    f'AFTER {operation.upper()} ON "{table_name}" BEGIN '
+                    f"UPDATE {CHANGES_TABLE} SET changes = changes + 1 "
+                    f"WHERE table_name = '{table_name}'; END"
+                )
+            )
+
+
+def remove_change_counters(connection):
+    """Remove the change counter triggers and table"""
+    for name in _get_trigger_names(connection):
+        if name.startswith("threedi_changes_"):
+            connection.execute(text(f"DROP TRIGGER {name}"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {CHANGES_TABLE}"))
+    connection.execute(text(f"DROP TABLE IF EXISTS {COLUMN_FINGERPRINTS_TABLE}"))
+
+
+def _get_column_fingerprint(connection, table_name, columns, counter):
+    """The fingerprint of some columns of a table. With the row of the change
+    counter of the table, it is stored in COLUMN_FINGERPRINTS_TABLE and only
+    computed again when the table changed."""
+    if counter is None:
+        return compute_fingerprint(connection, table_name, columns=columns)
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {COLUMN_FINGERPRINTS_TABLE} ("
+            "table_name TEXT NOT NULL, columns TEXT NOT NULL, fingerprint TEXT, "
+            "fingerprint_changes INTEGER, row_count INTEGER, max_rowid INTEGER, "
+            "PRIMARY KEY (table_name, columns))"
+        )
+    )
+    row_count, max_rowid = connection.execute(
+        text(f'SELECT count(*), max(rowid) FROM "{table_name}"')
+    ).one()
+    params = {
+        "table": table_name,
+        "columns": ",".join(sorted(columns)),
+        "changes": counter.changes,
+        "row_count": row_count,
+        "max_rowid": max_rowid,
+    }
+    fingerprint = connection.execute(
+        text(
+            f"SELECT fingerprint FROM {COLUMN_FINGERPRINTS_TABLE} "
+            "WHERE table_name = :table AND columns = :columns "
+            "AND fingerprint_changes = :changes AND row_count = :row_count "
+            "AND max_rowid IS :max_rowid"
+        ),
+        params,
+    ).scalar()
+    if fingerprint is not None:
+        return fingerprint
+    fingerprint = compute_fingerprint(connection, table_name, columns=columns)
+    connection.execute(
+        text(
+            f"INSERT OR REPLACE INTO {COLUMN_FINGERPRINTS_TABLE} VALUES (:table, "
+            ":columns, :fingerprint, :changes, :row_count, :max_rowid)"
+        ),
+        {**params, "fingerprint": fingerprint},
+    )
+    return fingerprint
+
+
+def get_fingerprints(
+    connection,
+    table_names: Iterable[str],
+    columns: Optional[Mapping[str, Iterable[str]]] = None,
+) -> Dict[str, str]:
+    """The fingerprints of the tables that exist, see compute_fingerprint.
+
+    With `columns` ({table name: column names}), only the given columns of
+    those tables are hashed.
+
+    With change counters installed, the fingerprint of a table is stored and
+    only computed again when the table changed: when its change counter, row
+    count or maximum rowid differs, or when its triggers are gone (for instance
+    because a migration recreated the table).
+    """
+    columns = columns or {}
+    existing = _get_table_names(connection)
+    stored = {}
+    if CHANGES_TABLE in existing:
+        triggers = _get_trigger_names(connection)
+        stored = {
+            row.table_name: row
+            for row in connection.execute(text(f"SELECT * FROM {CHANGES_TABLE}"))
+            if all(
+                _trigger_name(row.table_name, operation) in triggers
+                for operation in OPERATIONS
+            )
+        }
+    fingerprints = {}
+    for table_name in table_names:
+        if table_name not in existing:
+            continue
+        if table_name in columns:
+            fingerprints[table_name] = _get_column_fingerprint(
+                connection, table_name, columns[table_name], stored.get(table_name)
+            )
+            continue
+        if table_name not in stored:
+            fingerprints[table_name] = compute_fingerprint(connection, table_name)
+            continue
+        row_count, max_rowid = connection.execute(
+            text(f'SELECT count(*), max(rowid) FROM "{table_name}"')
+        ).one()
+        row = stored[table_name]
+        if (row.fingerprint_changes, row.row_count, row.max_rowid) == (
+            row.changes,
+            row_count,
+            max_rowid,
+        ):
+            fingerprints[table_name] = row.fingerprint
+            continue
+        fingerprints[table_name] = compute_fingerprint(connection, table_name)
+        connection.execute(
+            text(
+                f"UPDATE {CHANGES_TABLE} SET fingerprint = :fingerprint, "
+                "fingerprint_changes = changes, row_count = :row_count, "
+                "max_rowid = :max_rowid WHERE table_name = :table"
+            ),
+            {
+                "fingerprint": fingerprints[table_name],
+                "row_count": row_count,
+                "max_rowid": max_rowid,
+                "table": table_name,
+            },
+        )
+    return fingerprints
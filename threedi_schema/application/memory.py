@@ -0,0 +1,171 @@
+import ctypes
+import os
+import tracemalloc
+import warnings
+from typing import List, NamedTuple, Optional
+
+from .errors import MemoryBudgetExceededError
+
+__all__ = ["MemoryMonitor", "MemoryUsage"]
+
+# number of SQLite virtual machine instructions between memory checks
+CHECK_INTERVAL = 100000
+
+
+def _get_sqlite_functions():
+    """The sqlite3_memory_used and sqlite3_memory_highwater functions, if available
+
+    These are looked up in the sqlite library that the sqlite3 module uses; a
+    different copy of the library would have its own (irrelevant) statistics.
+    """
+    try:
+        import _sqlite3
+
+        library = ctypes.CDLL(_sqlite3.__file__)
+        memory_used = library.sqlite3_memory_used
+        memory_highwater = library.sqlite3_memory_highwater
+    except (ImportError, OSError, AttributeError):
+        return None, None
+    memory_used.restype = ctypes.c_int64
+    memory_used.argtypes = []
+    memory_highwater.restype = ctypes.c_int64
+    memory_highwater.argtypes = [ctypes.c_int]
+    return memory_used, memory_highwater
+
+
+_sqlite_memory_used, _sqlite_memory_highwater = _get_sqlite_functions()
+
+
+def get_rss() -> Optional[int]:
+    """The current resident set size of this process in bytes (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def get_sqlite_memory_used() -> Optional[int]:
+    return _sqlite_memory_used() if _sqlite_memory_used is not None else None
+
+
+def _get_dbapi_connection(connection):
+    fairy = connection.connection
+    # SQLAlchemy < 1.4.24 has no dbapi_connection
+    return getattr(fairy, "dbapi_connection", None) or fairy.connection
+
+
+class MemoryUsage(NamedTuple):
+    revision: str
+    python_peak: Optional[int]  # bytes allocated by Python, if traced
+    sqlite_peak: Optional[int]  # bytes allocated by SQLite
+    rss: Optional[int]  # resident set size after the migration
+
+
+class MemoryMonitor:
+    """Records the peak memory usage per migration and enforces a memory budget.
+
+    Pass an instance as `memory_monitor` to ModelSchema.upgrade. After the
+    upgrade, `usage` contains a MemoryUsage for every applied revision. Peak
+    Python memory is only recorded with `trace_python`, because tracemalloc
+    slows down the migrations considerably.
+
+    With a `budget` (in bytes), the memory in use is checked during SQLite
+    statements and after every migration. When it exceeds the budget, the
+    upgrade fails with a MemoryBudgetExceededError instead of being killed by
+    the operating system. The memory in use is the resident set size where
+    available (Linux), else the traced Python memory plus SQLite memory.
+    """
+
+    def __init__(
+        self,
+        budget: Optional[int] = None,
+        trace_python: bool = False,
+        check_interval: int = CHECK_INTERVAL,
+    ):
+        self.budget = budget
+        self.trace_python = trace_python
+        self.check_interval = check_interval
+        self.usage: List[MemoryUsage] = []
+        self.revision = None
+        self.exceeded = None  # the memory in use when the budget was exceeded
+        self._started_tracing = False
+
+    def get_memory_in_use(self) -> Optional[int]:
+        rss = get_rss()
+        if rss is not None:
+            return rss
+        parts = [get_sqlite_memory_used()]
+        if tracemalloc.is_tracing():
+            parts.append(tracemalloc.get_traced_memory()[0])
+        parts = [part for part in parts if part is not None]
+        return sum(parts) if parts else None
+
+    def start(self, revision=None):
+        """Start monitoring an upgrade from `revision`"""
+        self.revision = None if revision is None else f"{revision:04d}"
+        self.exceeded = None
+        if self.budget is not None and self.get_memory_in_use() is None:
+            warnings.warn("The memory budget cannot be enforced on this platform")
+        if self.trace_python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        if _sqlite_memory_highwater is not None:
+            _sqlite_memory_highwater(1)
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def check(self) -> bool:
+        """Check whether the memory in use is within budget"""
+        if self.budget is None or self.exceeded is not None:
+            return self.exceeded is None
+        in_use = self.get_memory_in_use()
+        if in_use is not None and in_use > self.budget:
+            self.exceeded = in_use
+        return self.exceeded is None
+
+    def get_error(self) -> MemoryBudgetExceededError:
+        mib = 1024**2
+        source = f"revision {self.revision}" if self.revision else "an empty database"
+        return MemoryBudgetExceededError(
+            f"The upgrade used {self.exceeded / mib:.0f} MiB while upgrading from "
+            f"{source}, which exceeds the memory budget of {self.budget / mib:.0f} MiB"
+        )
+
+    def _progress_handler(self):
+        # a non-zero return value interrupts the running SQLite statement
+        return 0 if self.check() else 1
+
+    def attach(self, connection):
+        """Check the budget during the statements of a SQLAlchemy connection"""
+        if self.budget is None:
+            return
+        _get_dbapi_connection(connection).set_progress_handler(
+            self._progress_handler, self.check_interval
+        )
+
+    def detach(self, connection):
+        if self.budget is None:
+            return
+        _get_dbapi_connection(connection).set_progress_handler(None, 0)
+
+    def on_version_apply(self, ctx, step, heads, run_args):
+        """Record the memory usage of a migration; an alembic callback"""
+        python_peak = None
+        if tracemalloc.is_tracing():
+            python_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        sqlite_peak = None
+        if _sqlite_memory_highwater is not None:
+            sqlite_peak = _sqlite_memory_highwater(1)
+        self.usage.append(
+            MemoryUsage(step.up_revision_id, python_peak, sqlite_peak, get_rss())
+        )
+        if not self.check():
+            raise self.get_error()
+        self.revision = step.up_revision_id
@@ -1,7 +1,8 @@
 import errno
+import shutil
 import warnings
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 # This import is needed for alembic to recognize the geopackage dialect
 import geoalchemy2.alembic_helpers  # noqa: F401
@@ -17,22 +18,57 @@ from osgeo import gdal, ogr, osr
 from sqlalchemy import Column, Integer, MetaData, Table, text
 
 from ..domain import constants, models
+from ..infrastructure.indexes import ensure_indexes
 from ..infrastructure.spatial_index import ensure_spatial_indexes
-from .errors import InvalidSRIDException, MigrationMissingError, UpgradeFailedError
-from .upgrade_utils import get_upgrade_steps_count, setup_logging
+from .changelog import Change, compact_changelog, get_changes, install_changelog
+from .checkpoints import get_checkpoint_revisions, UpgradeCheckpoints
+from .errors import (
+    InvalidSRIDException,
+    MemoryBudgetExceededError,
+    MigrationMissingError,
+    UpgradeFailedError,
+)
+from .fingerprints import get_fingerprints, install_change_counters
+from .upgrade_utils import (
+    CONVERT_TO_GEOPACKAGE_STEP,
+    get_step_tables,
+    get_table_row_counts,
+    get_upgrade_plan,
+    get_upgrade_step_weights,
+    get_upgrade_steps,
+    IN_MEMORY_MAX_SIZE,
+    report_progress,
+    report_upgrade_step,
+    setup_logging,
+    teardown_logging,
+    UNSAFE_PRAGMAS,
+    UpgradePlan,
+)
 
 gdal.UseExceptions()
 
 __all__ = ["ModelSchema"]
 
 
-def get_alembic_config(engine=None, unsafe=False):
+def _warn_unsafe(unsafe):
+    if unsafe is not None:
+        warnings.warn(
+            "The unsafe argument is deprecated and ignored; the PRAGMAs of the "
+            "work copy are set with the pragmas argument of ModelSchema.upgrade",
+            DeprecationWarning,
+            stacklevel=3,
+        )
+
+
+def get_alembic_config(engine=None, unsafe=None, memory_monitor=None):
+    _warn_unsafe(unsafe)
     alembic_cfg = Config()
     alembic_cfg.set_main_option("script_location", "threedi_schema:migrations")
     alembic_cfg.set_main_option("version_table", constants.VERSION_TABLE_NAME)
     if engine is not None:
         alembic_cfg.attributes["engine"] = engine
-    alembic_cfg.attributes["unsafe"] = unsafe
+    if memory_monitor is not None:
+        alembic_cfg.attributes["memory_monitor"] = memory_monitor
     return alembic_cfg
 
 
@@ -44,11 +80,36 @@ def get_schema_version():
         return int(env.get_head_revision())
 
 
-def _upgrade_database(db, revision="head", unsafe=True):
+def _upgrade_database(db, revision="head", unsafe=None, memory_monitor=None):
     """Upgrade ThreediDatabase instance"""
+    _warn_unsafe(unsafe)
     engine = db.engine
-    config = get_alembic_config(engine, unsafe=unsafe)
-    alembic_command.upgrade(config, revision)
+    config = get_alembic_config(engine, memory_monitor=memory_monitor)
+    if memory_monitor is None:
+        alembic_command.upgrade(config, revision)
+        return
+    memory_monitor.start(db.schema.get_version())
+    try:
+        alembic_command.upgrade(config, revision)
+    except MemoryBudgetExceededError:
+        raise
+    except Exception as e:
+        # SQLite statements that exceed the budget are interrupted
+        if memory_monitor.exceeded is not None:
+            raise memory_monitor.get_error() from e
+        raise
+    finally:
+        memory_monitor.stop()
+
+
+def _get_revision_number(revision):
+    """Convert a revision ('head' or numeric) to an integer"""
+    try:
+        return get_schema_version() if revision == "head" else int(revision)
+    except ValueError:
+        raise ValueError(
+            f"Incorrect version format: {revision}. Expected 'head' or a numeric value."
+        )
 
 
 class GdalErrorHandler:
@@ -213,6 +274,11 @@ class ModelSchema:
         progress_func=None,
         epsg_code_override=None,
         keep_spatialite=False,
+        checkpoint_dir=None,
+        cache=None,
+        pragmas=UNSAFE_PRAGMAS,
+        memory_monitor=None,
+        in_memory=False,
     ):
         """Upgrade the database to the latest version.
 
@@ -231,13 +297,33 @@ class ModelSchema:
 
         Specify a `epsg_code_override` to set the model epsg_code before migration.
         This can be used for testing and for setting the DEM epsg_code when self.epsg_code is None.
+
+        Specify a `checkpoint_dir` to save a snapshot of the work database after each
+        expensive migration. When an upgrade of the same file is retried after a crash,
+        it resumes from the latest valid checkpoint. Requires `backup`.
+
+        Specify an UpgradeCache as `cache` to reuse the result of an earlier upgrade
+        of an identical file with the same options, instead of running the
+        migrations again. The cache is not used with `keep_spatialite`.
+
+        With `backup`, the migrations run on a copy of the database with the given
+        `pragmas`, which default to UNSAFE_PRAGMAS for speed.
+
+        Specify a MemoryMonitor as `memory_monitor` to record the peak memory usage
+        of every migration, or to fail with a MemoryBudgetExceededError when the
+        upgrade exceeds its memory budget.
+
+        Specify `in_memory` to run the migrations on a copy of the database in
+        memory instead of on disk, if the database is at most IN_MEMORY_MAX_SIZE
+        bytes. Requires `backup` and cannot be combined with `checkpoint_dir`.
         """
-        try:
-            rev_nr = get_schema_version() if revision == "head" else int(revision)
-        except ValueError:
+        if checkpoint_dir is not None and not backup:
+            raise ValueError("Upgrading with a checkpoint_dir requires backup=True")
+        if in_memory and (checkpoint_dir is not None or not backup):
             raise ValueError(
-                f"Incorrect version format: {revision}. Expected 'head' or a numeric value."
+                "Upgrading in_memory requires backup=True and no checkpoint_dir"
             )
+        rev_nr = _get_revision_number(revision)
         v = self.get_version()
 
         if v is not None and v < constants.LATEST_SOUTH_MIGRATION_ID:
@@ -263,19 +349,128 @@ class ModelSchema:
                 f"Cannot upgrade from {revision=} because {self.db.path} is not a geopackage"
             )
 
+        # the cache only holds the final result, not the spatialite that
+        # keep_spatialite keeps next to it
+        if keep_spatialite:
+            cache = None
+        if cache is not None:
+            cache_key = cache.get_key(self.db.path, rev_nr, epsg_code_override, pragmas)
+            cached_path = cache.get(cache_key)
+            if cached_path is not None:
+                self._use_cached_upgrade(cached_path)
+                if progress_func is not None:
+                    progress_func(100, "Using cached upgrade result")
+                return
+
+        progress_handler = None
         if progress_func is not None:
-            config = get_alembic_config(self.db.engine, unsafe=backup)
-            n_steps = get_upgrade_steps_count(
-                config, self.db.schema.get_version(), revision
+            progress_handler = self._setup_progress(progress_func, v, revision, rev_nr)
+        try:
+            self._upgrade(
+                revision,
+                rev_nr,
+                backup,
+                epsg_code_override,
+                keep_spatialite,
+                checkpoint_dir,
+                pragmas,
+                memory_monitor,
+                in_memory=in_memory,
+            )
+        finally:
+            if progress_handler is not None:
+                teardown_logging(progress_handler)
+        if cache is not None:
+            cache.put(cache_key, self.db.path)
+
+    def _use_cached_upgrade(self, cached_path):
+        """Replace the database by a cached upgrade result"""
+        path = Path(self.db.path)
+        new_path = path.with_suffix(cached_path.suffix)
+        shutil.copyfile(cached_path, new_path)
+        if new_path != path:
+            # the cached result is a geopackage
+            self.db.path = new_path
+            self.db._engine = None
+            self._delete_spatialite()
+
+    def _get_upgrade_steps(self, current_revision, revision, rev_nr):
+        """List all upgrade steps, including the conversion to geopackage"""
+        config = get_alembic_config(self.db.engine)
+        steps = get_upgrade_steps(config, current_revision, revision)
+        if rev_nr > constants.LAST_SPTL_SCHEMA_VERSION and (
+            current_revision is None
+            or current_revision <= constants.LAST_SPTL_SCHEMA_VERSION
+        ):
+            n_sptl_steps = sum(
+                int(step) <= constants.LAST_SPTL_SCHEMA_VERSION for step in steps
             )
-            setup_logging(progress_func, n_steps)
+            steps.insert(n_sptl_steps, CONVERT_TO_GEOPACKAGE_STEP)
+        return steps
+
+    def _setup_progress(self, progress_func, current_revision, revision, rev_nr):
+        """Set up progress reporting weighted by the estimated cost of each step"""
+        steps = self._get_upgrade_steps(current_revision, revision, rev_nr)
+        row_counts = get_table_row_counts(self.db.engine, get_step_tables())
+        weights = get_upgrade_step_weights(steps, row_counts)
+        return setup_logging(progress_func, len(steps), weights=weights)
+
+    def plan_upgrade(self, revision="head", backup=True) -> UpgradePlan:
+        """Estimate the duration and temporary disk space of an upgrade.
 
+        The database is not modified. The estimates are based on the row counts of
+        the tables that each migration touches and are only a rough indication.
+
+        Returns an UpgradePlan.
+        """
+        rev_nr = _get_revision_number(revision)
+        v = self.get_version()
+        steps = self._get_upgrade_steps(v, revision, rev_nr)
+        row_counts = get_table_row_counts(self.db.engine, get_step_tables())
+        path = Path(self.db.path)
+        return get_upgrade_plan(
+            steps,
+            row_counts,
+            file_size=path.stat().st_size if path.is_file() else 0,
+            current_revision=v,
+            target_revision=rev_nr,
+            backup=backup,
+        )
+
+    def _upgrade(
+        self,
+        revision,
+        rev_nr,
+        backup,
+        epsg_code_override,
+        keep_spatialite,
+        checkpoint_dir,
+        pragmas,
+        memory_monitor=None,
+        in_memory=False,
+    ):
         def run_upgrade(_revision):
-            if backup:
-                with self.db.file_transaction() as work_db:
-                    _upgrade_database(work_db, revision=_revision, unsafe=True)
+            if checkpoint_dir is not None:
+                self._run_checkpointed_upgrade(
+                    _revision, checkpoint_dir, pragmas, memory_monitor
+                )
+            elif backup:
+                if in_memory and self._fits_in_memory():
+                    transaction = self.db.memory_transaction(pragmas=pragmas)
+                else:
+                    transaction = self.db.file_transaction(pragmas=pragmas)
+                with transaction as work_db:
+                    _upgrade_database(
+                        work_db,
+                        revision=_revision,
+                        memory_monitor=memory_monitor,
+                    )
             else:
-                _upgrade_database(self.db, revision=_revision, unsafe=False)
+                _upgrade_database(
+                    self.db,
+                    revision=_revision,
+                    memory_monitor=memory_monitor,
+                )
 
         if epsg_code_override is not None:
             if self.get_version() is not None and self.get_version() > 229:
@@ -304,6 +499,39 @@ class ModelSchema:
             self.convert_to_geopackage(delete_spatialite=not keep_spatialite)
             run_upgrade(revision)
 
+    def _fits_in_memory(self):
+        # checked before each run, because the geopackage differs in size
+        return Path(self.db.path).stat().st_size <= IN_MEMORY_MAX_SIZE
+
+    def _run_checkpointed_upgrade(
+        self,
+        revision,
+        checkpoint_dir,
+        pragmas=None,
+        memory_monitor=None,
+    ):
+        """Upgrade a copy of the database, resuming from and saving checkpoints"""
+        checkpoints = UpgradeCheckpoints.for_file(
+            checkpoint_dir, self.db.path, {"pragmas": pragmas}
+        )
+        with self.db.file_transaction(pragmas=pragmas) as work_db:
+            checkpoint = checkpoints.latest()
+            if checkpoint is not None and (
+                revision == "head" or int(checkpoint.revision) <= int(revision)
+            ):
+                shutil.copyfile(checkpoint.path, work_db.path)
+            config = get_alembic_config(work_db.engine)
+            steps = get_upgrade_steps(config, work_db.schema.get_version(), revision)
+            for checkpoint_revision in get_checkpoint_revisions(steps):
+                _upgrade_database(
+                    work_db,
+                    revision=checkpoint_revision,
+                    memory_monitor=memory_monitor,
+                )
+                checkpoints.save(work_db.path, checkpoint_revision)
+        # the original file now contains the results
+        checkpoints.clear()
+
     def _set_custom_epsg_code(self, custom_epsg_code: int):
         """Temporarily set epsg code in model settings for migration 230"""
         if (
@@ -374,6 +602,62 @@ class ModelSchema:
 
         ensure_spatial_indexes(self.db.engine, models.DECLARED_MODELS)
 
+    def set_indexes(self):
+        """(Re)create the indexes on the columns that refer to other objects
+        (such as connection_node_id) according to the latest definitions."""
+        version = self.get_version()
+        schema_version = get_schema_version()
+        if version != schema_version:
+            raise MigrationMissingError(
+                f"Setting indexes requires schema version "
+                f"{schema_version}. Current version: {version}."
+            )
+
+        ensure_indexes(self.db.engine, models.DECLARED_MODELS)
+
+    def get_fingerprints(self) -> Dict[str, str]:
+        """A hash of the contents of every table of the declared models.
+
+        A fingerprint only changes when the rows of a table change, not when
+        the file is vacuumed. The tables are read in a streaming fashion. After
+        install_change_counters, the fingerprints of unchanged tables are not
+        computed again.
+        """
+        with self.db.engine.begin() as connection:
+            return get_fingerprints(
+                connection, [model.__tablename__ for model in self.declared_models]
+            )
+
+    def install_change_counters(self):
+        """Install triggers that count the changes per table of the declared
+        models, which makes get_fingerprints incremental."""
+        with self.db.engine.begin() as connection:
+            install_change_counters(
+                connection, [model.__tablename__ for model in self.declared_models]
+            )
+
+    def install_changelog(self):
+        """Log the inserted, updated and deleted rows of the tables of the
+        declared models, see get_changes."""
+        with self.db.engine.begin() as connection:
+            install_changelog(
+                connection, [model.__tablename__ for model in self.declared_models]
+            )
+
+    def get_changes(self, since: int = 0) -> List[Change]:
+        """The logged changes with a sequence number larger than `since`.
+
+        Raises ChangelogIncompleteError if no changelog is installed or if a
+        migration recreated a table (which removes its triggers).
+        """
+        with self.db.engine.connect() as connection:
+            return get_changes(connection, since=since)
+
+    def compact_changelog(self, until: Optional[int] = None):
+        """Remove the changes up to `until` and merge the changes per row"""
+        with self.db.engine.begin() as connection:
+            compact_changelog(connection, until=until)
+
     def convert_to_geopackage(self, delete_spatialite=True):
         """
         Convert spatialite to geopackage using gdal.VectorTranslate.
@@ -402,6 +686,9 @@ class ModelSchema:
             UpgradeFailedError(
                 f"Cannot convert schema version {revision} to geopackage"
             )
+        report_upgrade_step(
+            CONVERT_TO_GEOPACKAGE_STEP, "Converting spatialite to geopackage"
+        )
         # Make necessary modifications for conversion on temporary database
         with self.db.file_transaction(start_empty=False, copy_results=False) as work_db:
             # remove spatialite specific tables that break conversion
@@ -449,7 +736,12 @@ class ModelSchema:
                         options=["-preserve_fid"],
                     )
                 )
-            for conversion_options in conversion_list:
+            layer_names = ["geometry tables"] + non_geometry_tablenames
+            for i, conversion_options in enumerate(conversion_list):
+                report_progress(
+                    i / len(conversion_list),
+                    f"Converting {layer_names[i]} to geopackage",
+                )
                 try:
                     ds = gdal.VectorTranslate(
                         destNameOrDestDS=outfile,
@@ -1,7 +1,10 @@
+import os
 import shutil
+import sqlite3
 import tempfile
+import time
 import uuid
-from contextlib import contextmanager
+from contextlib import closing, contextmanager
 from pathlib import Path
 
 from sqlalchemy import create_engine, event, inspect, text
@@ -10,10 +13,21 @@ from sqlalchemy.event import listen
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
+from .errors import InsufficientSpaceError
 from .schema import ModelSchema
 
 __all__ = ["ThreediDatabase"]
 
+# Environment variable with the directory for the work copies of file_transaction,
+# for instance a scratch disk. Defaults to the system temporary directory.
+WORK_DIR_ENV = "THREEDI_SCHEMA_WORK_DIR"
+# Free space that a work copy needs, relative to the database size: the copy
+# itself and room for the tables that migrations rebuild in it
+WORK_SPACE_FACTOR = 2
+# Work copies that were not modified for this long (in seconds) are left behind
+# by crashed processes
+STALE_WORK_FILE_AGE = 24 * 3600
+
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
@@ -35,6 +49,22 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor.close()
 
 
+def set_pragmas(pragmas):
+    """Connect listener that executes the given PRAGMAs
+
+    The PRAGMAs are executed when the connection is opened, so before any
+    transaction is started; journal_mode cannot be changed inside a transaction.
+    """
+
+    def listener(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return listener
+
+
 def load_spatialite(con, connection_record):
     """Load spatialite extension as described in
     https://geoalchemy-2.readthedocs.io/en/latest/spatialite_tutorial.html"""
@@ -69,10 +99,54 @@ def load_spatialite(con, connection_record):
     con.enable_load_extension(False)
 
 
+def _get_dbapi_connection(engine):
+    """The sqlite3 connection of an in-memory engine; it stays open in its pool"""
+    fairy = engine.raw_connection()
+    try:
+        # SQLAlchemy < 1.4.24 has no dbapi_connection
+        return getattr(fairy, "dbapi_connection", None) or fairy.connection
+    finally:
+        fairy.close()
+
+
+def get_work_dir(work_dir=None) -> Path:
+    """The directory for work copies, see WORK_DIR_ENV"""
+    if work_dir is None:
+        work_dir = os.environ.get(WORK_DIR_ENV) or tempfile.gettempdir()
+    return Path(work_dir)
+
+
+def remove_stale_work_files(work_dir, max_age=STALE_WORK_FILE_AGE):
+    """Remove work copies, and their journals, left behind by crashed processes"""
+    now = time.time()
+    for path in Path(work_dir).glob("work-*.sqlite*"):
+        try:
+            if now - path.stat().st_mtime > max_age:
+                path.unlink()
+        except OSError:
+            pass  # removed by another process, or in use (Windows)
+
+
+def check_free_space(work_dir, required):
+    """Raise InsufficientSpaceError if work_dir has less than `required` bytes free"""
+    free = shutil.disk_usage(work_dir).free
+    if free < required:
+        mib = 1024**2
+        raise InsufficientSpaceError(
+            f"The work directory {work_dir} has {free / mib:.0f} MiB free, but "
+            f"{required / mib:.0f} MiB is needed. Pass another work_dir or set the "
+            f"{WORK_DIR_ENV} environment variable."
+        )
+
+
 class ThreediDatabase:
-    def __init__(self, path, echo=False):
+    def __init__(self, path, echo=False, pragmas=None, work_dir=None):
         self.path = path
         self.echo = echo
+        # additional PRAGMAs that are set on each connection
+        self.pragmas = pragmas
+        # directory for the work copies of file_transaction, see WORK_DIR_ENV
+        self.work_dir = work_dir
         self._engine = None
         self._base_metadata = None
 
@@ -102,6 +176,8 @@ class ThreediDatabase:
                 "sqlite:///{0}".format(self.path), echo=self.echo, poolclass=poolclass
             )
             listen(engine, "connect", load_spatialite)
+            if self.pragmas:
+                listen(engine, "connect", set_pragmas(self.pragmas))
             if get_seperate_engine:
                 return engine
             else:
@@ -133,25 +209,83 @@ class ThreediDatabase:
             session.close()
 
     @contextmanager
-    def file_transaction(self, start_empty=False, copy_results=True):
-        """Copy the complete database into a tmpdir and work on that one.
+    def file_transaction(
+        self, start_empty=False, copy_results=True, pragmas=None, work_dir=None
+    ):
+        """Copy the complete database into a work directory and work on that one.
 
         On contextmanager exit, the database is copied back and the real
-        database is overwritten. On error, nothing happens.
+        database is overwritten. On error, nothing happens. The copy is removed
+        in both cases.
+
+        Optionally, specify `pragmas` for all connections to the copy, see
+        upgrade_utils.UNSAFE_PRAGMAS.
+
+        The copy is made in `work_dir`, which defaults to the work_dir of this
+        database, then to the directory in the THREEDI_SCHEMA_WORK_DIR environment
+        variable and then to the system temporary directory. An
+        InsufficientSpaceError is raised if it has too little free space. Work
+        copies left behind by crashed processes are removed.
         """
-        with tempfile.TemporaryDirectory() as tempdir:
-            work_file = Path(tempdir) / f"work-{uuid.uuid4()}.sqlite"
-            # copy the database to the temporary directory
+        work_dir = get_work_dir(work_dir or self.work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        remove_stale_work_files(work_dir)
+        if not start_empty:
+            check_free_space(
+                work_dir, WORK_SPACE_FACTOR * Path(self.path).stat().st_size
+            )
+        work_file = work_dir / f"work-{uuid.uuid4()}.sqlite"
+        work_db = self.__class__(str(work_file), pragmas=pragmas, work_dir=work_dir)
+        try:
+            # copy the database to the work directory
             if not start_empty:
                 shutil.copy(self.path, str(work_file))
             # yield a new ThreediDatabase refering to the backup
-            try:
-                yield self.__class__(str(work_file))
-            except Exception as e:
-                raise e
-            else:
-                if copy_results:
-                    shutil.copy(str(work_file), self.path)
+            yield work_db
+            if copy_results:
+                shutil.copy(str(work_file), self.path)
+        finally:
+            if work_db._engine is not None:
+                work_db._engine.dispose()
+            for path in work_dir.glob(f"{work_file.name}*"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass  # removed later by remove_stale_work_files
+
+    @contextmanager
+    def memory_transaction(self, copy_results=True, pragmas=None):
+        """Load the complete database into memory and work on that one.
+
+        This is like file_transaction, but faster for databases that fit in
+        memory. The database is loaded and, on contextmanager exit, written back
+        to the real database with the SQLite backup API. On error, nothing
+        happens.
+
+        Optionally, specify `pragmas` for the in-memory database, see
+        upgrade_utils.UNSAFE_PRAGMAS.
+        """
+        work_db = self.__class__("", pragmas=pragmas)
+        engine = work_db.get_engine()
+        try:
+            with closing(sqlite3.connect(self.path)) as source:
+                source.backup(_get_dbapi_connection(engine))
+            yield work_db
+            if copy_results:
+                with closing(sqlite3.connect(self.path)) as target:
+                    _get_dbapi_connection(engine).backup(target)
+        finally:
+            engine.dispose()
+
+    def bulk_load(self, batches):
+        """Insert columnar batches of rows into the tables of the declared models,
+        with the spatial indexes created once at the end.
+
+        See ``threedi_schema.application.bulk.load_batches``, which requires numpy.
+        """
+        from .bulk import load_batches
+
+        return load_batches(self, batches)
 
     def check_connection(self):
         """Check if there a connection can be started with the database
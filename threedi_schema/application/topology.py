@@ -0,0 +1,215 @@
+"""The 1D network of a schematisation as compressed sparse row (CSR) arrays.
+
+This module requires numpy, which is an optional dependency: install
+``threedi-schema[numpy]``.
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from .fingerprints import get_fingerprints, install_change_counters
+
+__all__ = ["EDGE_TYPES", "Topology", "build_topology", "get_topology"]
+
+# the edge types, in the order of their code in Topology.edge_type
+EDGE_TYPES = ("channel", "pipe", "culvert", "weir", "orifice", "pump")
+
+# a pump is connected to its end node through pump_map
+EDGE_QUERIES = [
+    f"SELECT {code}, id, connection_node_id_start, connection_node_id_end "
+    f"FROM {table} WHERE connection_node_id_start IS NOT NULL "
+    f"AND connection_node_id_end IS NOT NULL"
+    for code, table in enumerate(EDGE_TYPES[:-1])
+] + [
+    f"SELECT {EDGE_TYPES.index('pump')}, pump.id, pump.connection_node_id, "
+    "pump_map.connection_node_id_end FROM pump "
+    "JOIN pump_map ON pump_map.pump_id = pump.id "
+    "WHERE pump.connection_node_id IS NOT NULL "
+    "AND pump_map.connection_node_id_end IS NOT NULL"
+]
+
+# the columns of the tables that the topology is built from, of which the
+# fingerprints are the key of the cache of get_topology
+TOPOLOGY_COLUMNS = {
+    "connection_node": ("id",),
+    "channel": ("id", "connection_node_id_start", "connection_node_id_end"),
+    "pipe": ("id", "connection_node_id_start", "connection_node_id_end"),
+    "culvert": ("id", "connection_node_id_start", "connection_node_id_end"),
+    "weir": ("id", "connection_node_id_start", "connection_node_id_end"),
+    "orifice": ("id", "connection_node_id_start", "connection_node_id_end"),
+    "pump": ("id", "connection_node_id"),
+    "pump_map": ("id", "pump_id", "connection_node_id_end"),
+}
+
+# number of topologies kept in memory by get_topology
+CACHE_SIZE = 4
+
+_cache: "OrderedDict[str, Topology]" = OrderedDict()
+
+
+class Topology:
+    """The connection nodes and the structures that connect them.
+
+    Nodes are numbered by their position in `node_ids` (sorted connection node
+    ids). Every edge is stored in both directions: the neighbours of node
+    index `i` are ``neighbour[indptr[i]:indptr[i + 1]]``, connected through
+    the edges with ``edge_type`` (an index into EDGE_TYPES) and ``edge_id``
+    at the same positions. Structures with a missing or unknown connection
+    node are left out.
+    """
+
+    ARRAYS = ("node_ids", "indptr", "neighbour", "edge_type", "edge_id")
+
+    def __init__(self, node_ids, indptr, neighbour, edge_type, edge_id):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.neighbour = neighbour
+        self.edge_type = edge_type
+        self.edge_id = edge_id
+
+    @classmethod
+    def from_edges(cls, node_ids, edges) -> "Topology":
+        """Build the CSR arrays from an (n, 4) array of
+        (edge type, edge id, start node id, end node id)"""
+        node_ids = np.sort(np.asarray(node_ids, dtype=np.int64))
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 4)
+        start = np.searchsorted(node_ids, edges[:, 2])
+        end = np.searchsorted(node_ids, edges[:, 3])
+        valid = (start < len(node_ids)) & (end < len(node_ids))
+        valid[valid] = (node_ids[start[valid]] == edges[valid, 2]) & (
+            node_ids[end[valid]] == edges[valid, 3]
+        )
+        edges, start, end = edges[valid], start[valid], end[valid]
+        source = np.concatenate([start, end])
+        order = np.argsort(source, kind="stable")
+        counts = np.bincount(source, minlength=len(node_ids))
+        return cls(
+            node_ids=node_ids,
+            indptr=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            neighbour=np.concatenate([end, start])[order],
+            edge_type=np.tile(edges[:, 0], 2)[order].astype(np.int8),
+            edge_id=np.tile(edges[:, 1], 2)[order],
+        )
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.neighbour) // 2
+
+    def node_index(self, node_id) -> int:
+        i = np.searchsorted(self.node_ids, node_id)
+        if i >= len(self.node_ids) or self.node_ids[i] != node_id:
+            raise KeyError(f"connection node {node_id} does not exist")
+        return int(i)
+
+    def neighbours(self, node_id) -> np.ndarray:
+        """The ids of the connection nodes that are connected to a node"""
+        i = self.node_index(node_id)
+        return self.node_ids[self.neighbour[self.indptr[i] : self.indptr[i + 1]]]
+
+    def edges(self, node_id):
+        """The (edge type, edge id) of the structures connected to a node"""
+        i = self.node_index(node_id)
+        part = slice(self.indptr[i], self.indptr[i + 1])
+        return [
+            (EDGE_TYPES[edge_type], int(edge_id))
+            for edge_type, edge_id in zip(self.edge_type[part], self.edge_id[part])
+        ]
+
+    def degree(self) -> np.ndarray:
+        """The number of connected structures per node index"""
+        return np.diff(self.indptr)
+
+    def dangling_ends(self) -> np.ndarray:
+        """The ids of the nodes that are connected to exactly one structure"""
+        return self.node_ids[self.degree() == 1]
+
+    def isolated_nodes(self) -> np.ndarray:
+        """The ids of the nodes that are not connected to any structure"""
+        return self.node_ids[self.degree() == 0]
+
+    def connected_components(self) -> np.ndarray:
+        """The component number (0, 1, ...) per node index"""
+        source = np.repeat(np.arange(self.n_nodes), self.degree())
+        target = self.neighbour
+        # hook the root of every edge end to the lowest root, then shortcut
+        # all nodes to their root; this takes O(log n) iterations
+        parent = np.arange(self.n_nodes)
+        while True:
+            root_source, root_target = parent[source], parent[target]
+            changed = root_source != root_target
+            if not changed.any():
+                break
+            np.minimum.at(
+                parent,
+                np.maximum(root_source, root_target)[changed],
+                np.minimum(root_source, root_target)[changed],
+            )
+            while True:
+                grandparent = parent[parent]
+                if (grandparent == parent).all():
+                    break
+                parent = grandparent
+        return np.unique(parent, return_inverse=True)[1].reshape(-1)
+
+    def save(self, path):
+        np.savez(path, **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path) -> "Topology":
+        with np.load(path) as arrays:
+            return cls(**{name: arrays[name] for name in cls.ARRAYS})
+
+
+def build_topology(connection) -> Topology:
+    """Build the Topology with one query over all structure tables"""
+    node_ids = connection.execute(
+        text("SELECT id FROM connection_node ORDER BY id")
+    ).scalars()
+    edges = connection.execute(text(" UNION ALL ".join(EDGE_QUERIES))).fetchall()
+    return Topology.from_edges(list(node_ids), [tuple(row) for row in edges])
+
+
+def _get_key(connection) -> str:
+    """A hash of the fingerprints of the columns that the topology is built from"""
+    fingerprints = get_fingerprints(connection, TOPOLOGY_COLUMNS, TOPOLOGY_COLUMNS)
+    return hashlib.sha256(json.dumps(fingerprints, sort_keys=True).encode()).hexdigest()
+
+
+def get_topology(db, cache_dir: Optional[Path] = None) -> Topology:
+    """The Topology of a schematisation, cached on the fingerprints of its tables.
+
+    The last CACHE_SIZE topologies are kept in memory. With `cache_dir`, they
+    are also stored there (as .npz files), so that they outlive the process.
+
+    This installs change counters (see ModelSchema.install_change_counters) on
+    the tables of the network, so that their fingerprints are stored in the
+    database and only computed again when a table changed.
+    """
+    with db.get_engine().begin() as connection:
+        install_change_counters(connection, TOPOLOGY_COLUMNS)
+        key = _get_key(connection)
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+        path = Path(cache_dir) / f"topology-{key}.npz" if cache_dir else None
+        if path is not None and path.exists():
+            topology = Topology.load(path)
+        else:
+            topology = build_topology(connection)
+            if path is not None:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                topology.save(path)
+    _cache[key] = topology
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return topology
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from .checkpoints import durable_copy, file_sha256
+
+__all__ = ["UpgradeCache"]
+
+
+class UpgradeCache:
+    """Content-addressed cache of upgraded schematisation files.
+
+    Entries are keyed by the checksum of the input file, the target revision,
+    the upgrade options (epsg_code_override and the PRAGMAs) and the
+    threedi-schema version. When the total size of the entries in `directory`
+    exceeds `max_size` bytes, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_size: int = 10 * 1024**3):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    def get_key(
+        self, path, revision: int, epsg_code_override=None, pragmas=None
+    ) -> str:
+        from threedi_schema import __version__
+
+        key = {
+            "sha256": file_sha256(path),
+            "revision": revision,
+            "epsg_code_override": epsg_code_override,
+            "pragmas": pragmas,
+            "version": __version__,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def _entries(self):
+        if not self.directory.exists():
+            return []
+        return [
+            path
+            for path in self.directory.iterdir()
+            if path.is_file() and not path.name.startswith(".")
+        ]
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached result for key, or None"""
+        for path in self._entries():
+            if path.stem == key:
+                # mark as recently used
+                os.utime(path)
+                return path
+        return None
+
+    def put(self, key: str, path) -> Path:
+        """Store the file at path as result for key; the suffix of path is kept"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.directory / f"{key}{Path(path).suffix}"
+        durable_copy(path, entry)
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size"""
+        entries = sorted(self._entries(), key=lambda path: path.stat().st_mtime)
+        total_size = sum(path.stat().st_size for path in entries)
+        for path in entries:
+            if total_size <= self.max_size:
+                break
+            total_size -= path.stat().st_size
+            path.unlink(missing_ok=True)
@@ -1,8 +1,11 @@
 import logging
-from typing import Callable, TYPE_CHECKING
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, TYPE_CHECKING
 
 from alembic.config import Config
 from alembic.script import ScriptDirectory
+from sqlalchemy import text
+
+from ..domain import models
 
 if TYPE_CHECKING:
     from .schema import ModelSchema
@@ -10,32 +13,233 @@ else:
     ModelSchema = None
 
 
+# Logger used to report progress that is not reported by alembic itself:
+# sub-steps within a migration and upgrade steps outside of alembic
+PROGRESS_LOGGER_NAME = "threedi_schema.progress"
+
+# Name of the upgrade step that converts the spatialite to a geopackage
+CONVERT_TO_GEOPACKAGE_STEP = "convert_to_geopackage"
+
+# PRAGMAs for the work copy of an upgrade, which is thrown away in case of errors:
+# journalling in memory and not syncing to disk speeds up migrations a lot,
+# but the database will likely go corrupt in case of a crash.
+UNSAFE_PRAGMAS = {
+    "journal_mode": "MEMORY",
+    "synchronous": "OFF",
+    "cache_size": -262144,  # in KiB, so 256 MiB
+    "temp_store": "MEMORY",
+    "mmap_size": 1073741824,  # 1 GiB
+}
+
+# Databases up to this size (in bytes) are upgraded in memory with
+# ModelSchema.upgrade(in_memory=True); larger ones on a copy on disk.
+IN_MEMORY_MAX_SIZE = 1024**3  # 1 GiB
+
+
+class StepCost(NamedTuple):
+    """Estimated cost of an upgrade step.
+
+    The run time of a step is estimated as `base_seconds` plus `seconds_per_row`
+    for every row in `tables`.
+    """
+
+    tables: Sequence[str] = ()
+    seconds_per_row: float = 0.0
+    base_seconds: float = 0.05
+
+
+# Rough estimates of the cost of upgrade steps that process many rows.
+# Revisions that are not listed here only make small schema changes.
+STEP_COSTS = {
+    "0213": StepCost(("v2_connected_pnt",), seconds_per_row=1e-3),
+    "0223": StepCost(
+        (
+            "v2_impervious_surface",
+            "v2_impervious_surface_map",
+            "v2_surface",
+            "v2_surface_map",
+        ),
+        seconds_per_row=5e-5,
+    ),
+    "0224": StepCost(
+        ("v2_control_measure_map", "v2_control_memory", "v2_control_table"),
+        seconds_per_row=2e-5,
+    ),
+    "0225": StepCost(
+        (
+            "lateral_1d",
+            "lateral_2d",
+            "boundary_condition_1d",
+            "boundary_condition_2d",
+        ),
+        seconds_per_row=2e-5,
+    ),
+    "0226": StepCost(
+        (
+            "dem_average_area",
+            "exchange_line",
+            "grid_refinement_line",
+            "grid_refinement_area",
+            "obstacle",
+            "potential_breach",
+        ),
+        seconds_per_row=1e-5,
+    ),
+    "0228": StepCost(
+        (
+            "channel",
+            "windshielding_1d",
+            "cross_section_location",
+            "pipe",
+            "culvert",
+            "weir",
+            "orifice",
+            "pump",
+            "connection_node",
+            "v2_cross_section_definition",
+            "v2_manhole",
+        ),
+        seconds_per_row=3e-5,
+    ),
+    "0230": StepCost(
+        (
+            "boundary_condition_1d",
+            "boundary_condition_2d",
+            "channel",
+            "connection_node",
+            "measure_location",
+            "measure_map",
+            "memory_control",
+            "table_control",
+            "cross_section_location",
+            "culvert",
+            "dem_average_area",
+            "dry_weather_flow",
+            "dry_weather_flow_map",
+            "exchange_line",
+            "grid_refinement_line",
+            "grid_refinement_area",
+            "lateral_1d",
+            "lateral_2d",
+            "obstacle",
+            "orifice",
+            "pipe",
+            "potential_breach",
+            "pump",
+            "pump_map",
+            "surface",
+            "surface_map",
+            "weir",
+            "windshielding_1d",
+        ),
+        seconds_per_row=4e-5,
+    ),
+    "0302": StepCost(
+        (
+            "boundary_condition_1d",
+            "channel",
+            "cross_section_location",
+            "culvert",
+            "dry_weather_flow_map",
+            "exchange_line",
+            "lateral_1d",
+            "measure_location",
+            "measure_map",
+            "orifice",
+            "pipe",
+            "potential_breach",
+            "pump",
+            "pump_map",
+            "surface",
+            "surface_map",
+            "weir",
+            "windshielding_1d",
+        ),
+        seconds_per_row=2e-6,
+    ),
+    CONVERT_TO_GEOPACKAGE_STEP: StepCost(
+        tuple(model.__tablename__ for model in models.DECLARED_MODELS),
+        seconds_per_row=2e-5,
+        base_seconds=1.0,
+    ),
+}
+
+# Name of tables before they were renamed or recreated in migrations 0222 - 0228,
+# used to estimate the size of tables that do not exist yet
+LEGACY_TABLE_NAMES = {
+    "boundary_condition_1d": "v2_1d_boundary_conditions",
+    "boundary_condition_2d": "v2_2d_boundary_conditions",
+    "channel": "v2_channel",
+    "connection_node": "v2_connection_nodes",
+    "cross_section_location": "v2_cross_section_location",
+    "culvert": "v2_culvert",
+    "dem_average_area": "v2_dem_average_area",
+    "dry_weather_flow": "v2_impervious_surface",
+    "dry_weather_flow_map": "v2_impervious_surface_map",
+    "exchange_line": "v2_exchange_line",
+    "grid_refinement_area": "v2_grid_refinement_area",
+    "grid_refinement_line": "v2_grid_refinement",
+    "lateral_1d": "v2_1d_lateral",
+    "lateral_2d": "v2_2d_lateral",
+    "measure_map": "v2_control_measure_map",
+    "memory_control": "v2_control_memory",
+    "obstacle": "v2_obstacle",
+    "orifice": "v2_orifice",
+    "pipe": "v2_pipe",
+    "potential_breach": "v2_potential_breach",
+    "pump": "v2_pumpstation",
+    "pump_map": "v2_pumpstation",
+    "surface": "v2_impervious_surface",
+    "surface_map": "v2_impervious_surface_map",
+    "table_control": "v2_control_table",
+    "weir": "v2_weir",
+    "windshielding_1d": "v2_windshielding",
+}
+
+
 class ProgressHandler(logging.Handler):
-    def __init__(self, progress_func, total_steps):
+    def __init__(self, progress_func, total_steps, weights=None):
         super().__init__()
         self.progress_func = progress_func
         self.total_steps = total_steps
+        self.weights = weights
         self.current_step = 0
+        self.last_progress = None
+
+    def get_progress(self, step: int, fraction: float = 0.0) -> float:
+        """Progress in percent at `fraction` of upgrade step `step`"""
+        weights = self.weights if self.weights is not None else [1] * self.total_steps
+        total = sum(weights)
+        if total <= 0:
+            return 100  # Assume 100% if total steps are zero
+        done = sum(weights[:step])
+        if step < len(weights):
+            done += min(max(fraction, 0.0), 1.0) * weights[step]
+        return min(100 * done / total, 100)
 
     def emit(self, record):
         msg = record.getMessage()
-        if msg.startswith("Running upgrade"):
-            if self.total_steps > 0:
-                self.progress_func(100 * self.current_step / self.total_steps, msg)
-            else:
-                self.progress_func(100, msg)  # Assume 100% if total steps are zero
+        if msg.startswith("Running upgrade") or hasattr(record, "upgrade_step"):
+            self.last_progress = self.get_progress(self.current_step)
+            self.progress_func(self.last_progress, msg)
             self.current_step += 1
+        elif hasattr(record, "substep_progress") and self.current_step > 0:
+            progress = self.get_progress(self.current_step - 1, record.substep_progress)
+            # only report sub-step progress that moves the progress bar forward
+            if self.last_progress is None or progress > self.last_progress:
+                self.last_progress = progress
+                self.progress_func(progress, msg)
 
 
-def get_upgrade_steps_count(
-    config: Config, current_revision: int, target_revision: str = "head"
-) -> int:
+def get_upgrade_steps(
+    config: Config, current_revision: Optional[int], target_revision: str = "head"
+) -> List[str]:
     """
-    Count number of upgrade steps for a schematisation upgrade.
+    List the revisions of a schematisation upgrade in the order they are applied.
 
     Args:
         config: Config parameter containing the configuration information
-        current_revision: current revision as integer
+        current_revision: current revision as integer, None for an empty database
         target_revision: target revision as zero-padded 4 digit string or "head"
     """
     if target_revision != "head":
@@ -43,37 +247,205 @@ def get_upgrade_steps_count(
             int(target_revision)
         except TypeError:
             # this should lead to issues in the upgrade pipeline, lets not take over that error handling here
-            return 0
-    # walk_revisions also includes the revision from current_revision to previous
-    # reduce the number of steps with 1
-    offset = -1
+            return []
+    # walk_revisions also includes the revision from current_revision to previous,
+    # which is skipped unless it still has to be applied.
     # The first defined revision is 200; revision numbers < 200 will cause walk_revisions to fail
-    if current_revision < 200:
+    include_current = current_revision is None or current_revision < 200
+    if include_current:
         current_revision = 200
-        # set offset to 0 because previous to current is not included in walk_revisions
-        offset = 0
     if target_revision != "head" and int(target_revision) < current_revision:
         # assume that this will be correctly handled by alembic
-        return 0
+        return []
     current_revision_str = f"{current_revision:04d}"
     script = ScriptDirectory.from_config(config)
-    # Determine upgrade steps
-    revisions = script.walk_revisions(current_revision_str, target_revision)
-    return len(list(revisions)) + offset
+    # walk_revisions returns the revisions from target to current
+    revisions = [
+        revision.revision
+        for revision in script.walk_revisions(current_revision_str, target_revision)
+    ][::-1]
+    return revisions if include_current else revisions[1:]
+
+
+def get_upgrade_steps_count(
+    config: Config, current_revision: int, target_revision: str = "head"
+) -> int:
+    """
+    Count number of upgrade steps for a schematisation upgrade.
+
+    Args:
+        config: Config parameter containing the configuration information
+        current_revision: current revision as integer
+        target_revision: target revision as zero-padded 4 digit string or "head"
+    """
+    return len(get_upgrade_steps(config, current_revision, target_revision))
+
 
+def get_table_row_counts(engine, tables: Sequence[str]) -> Dict[str, int]:
+    """Count the rows of the given tables; tables that do not exist are skipped."""
+    with engine.connect() as connection:
+        existing = set(
+            connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type='table'")
+            ).scalars()
+        )
+        return {
+            table: connection.execute(text(f"SELECT COUNT(*) FROM '{table}'")).scalar()
+            for table in tables
+            if table in existing
+        }
 
-def setup_logging(progress_func: Callable[[float, str], None], n_steps: int):
+
+def get_step_tables(step_costs: Dict[str, StepCost] = STEP_COSTS) -> List[str]:
+    """All tables, including their legacy names, that are needed to weigh upgrade steps"""
+    tables = {table for cost in step_costs.values() for table in cost.tables}
+    tables |= {
+        LEGACY_TABLE_NAMES[table] for table in tables if table in LEGACY_TABLE_NAMES
+    }
+    return sorted(tables)
+
+
+def estimate_step_seconds(
+    step: str, row_counts: Dict[str, int], step_costs: Dict[str, StepCost] = STEP_COSTS
+) -> float:
+    """
+    Estimate the run time of a single upgrade step.
+
+    Args:
+        step: revision as zero-padded 4 digit string or CONVERT_TO_GEOPACKAGE_STEP
+        row_counts: row count per table, as returned by get_table_row_counts
+        step_costs: cost estimates per step, defaults to STEP_COSTS
+    """
+    cost = step_costs.get(step, StepCost())
+    n_rows = estimate_step_rows(step, row_counts, step_costs)
+    return cost.base_seconds + cost.seconds_per_row * n_rows
+
+
+def get_upgrade_step_weights(
+    steps: Sequence[str],
+    row_counts: Dict[str, int],
+    step_costs: Dict[str, StepCost] = STEP_COSTS,
+) -> List[float]:
+    """Weigh upgrade steps by their estimated run time"""
+    return [estimate_step_seconds(step, row_counts, step_costs) for step in steps]
+
+
+class UpgradePlan(NamedTuple):
+    """Estimated cost of a schematisation upgrade, see ModelSchema.plan_upgrade"""
+
+    current_revision: Optional[int]
+    target_revision: int
+    steps: List[str]
+    estimated_seconds: float
+    # peak disk space needed on top of the original file
+    temp_space_bytes: int
+    converts_to_geopackage: bool
+    reprojects: bool
+
+
+def estimate_step_rows(
+    step: str, row_counts: Dict[str, int], step_costs: Dict[str, StepCost] = STEP_COSTS
+) -> int:
+    """Number of rows processed in an upgrade step"""
+    cost = step_costs.get(step, StepCost())
+    return sum(
+        row_counts.get(table, row_counts.get(LEGACY_TABLE_NAMES.get(table), 0))
+        for table in cost.tables
+    )
+
+
+def get_upgrade_plan(
+    steps: Sequence[str],
+    row_counts: Dict[str, int],
+    file_size: int,
+    current_revision: Optional[int],
+    target_revision: int,
+    backup: bool = True,
+    step_costs: Dict[str, StepCost] = STEP_COSTS,
+) -> UpgradePlan:
+    """
+    Estimate the run time and disk space of a schematisation upgrade.
+
+    Tables that are rebuilt in a step temporarily need space for a copy of their
+    rows, which is estimated from the average size of a row in the file. With
+    `backup`, each call to alembic works on a copy of the complete file. The
+    conversion to geopackage always works on a copy and writes a new file.
+
+    Args:
+        steps: upgrade steps, as returned by get_upgrade_steps
+        row_counts: row count per table, as returned by get_table_row_counts
+        file_size: size of the schematisation file in bytes
+        current_revision: current revision as integer, None for an empty database
+        target_revision: target revision as integer
+        backup: whether the upgrade will be done on a copy of the file
+        step_costs: cost estimates per step, defaults to STEP_COSTS
+    """
+    bytes_per_row = file_size / max(sum(row_counts.values()), 1)
+    temp_space = 0
+    for step in steps:
+        step_space = bytes_per_row * estimate_step_rows(step, row_counts, step_costs)
+        if step == CONVERT_TO_GEOPACKAGE_STEP:
+            # work copy of the spatialite and the new geopackage
+            step_space = 2 * file_size
+        elif backup:
+            step_space += file_size
+        temp_space = max(temp_space, step_space)
+    return UpgradePlan(
+        current_revision=current_revision,
+        target_revision=target_revision,
+        steps=list(steps),
+        estimated_seconds=sum(get_upgrade_step_weights(steps, row_counts, step_costs)),
+        temp_space_bytes=int(temp_space),
+        converts_to_geopackage=CONVERT_TO_GEOPACKAGE_STEP in steps,
+        reprojects="0230" in steps,
+    )
+
+
+def report_progress(fraction: float, message: str):
+    """
+    Report progress within the upgrade step that is currently running.
+
+    Args:
+        fraction: fraction of the current step that is finished, between 0 and 1
+        message: string describing the sub-step
+    """
+    logging.getLogger(PROGRESS_LOGGER_NAME).info(
+        message, extra={"substep_progress": fraction}
+    )
+
+
+def report_upgrade_step(name: str, message: str):
+    """Report the start of an upgrade step that is not an alembic revision"""
+    logging.getLogger(PROGRESS_LOGGER_NAME).info(message, extra={"upgrade_step": name})
+
+
+def setup_logging(
+    progress_func: Callable[[float, str], None],
+    n_steps: int,
+    weights: Optional[Sequence[float]] = None,
+):
     """
     Set up logging for schematisation upgrade
 
     Args:
-        schema: ModelSchema object representing the current schema of the application
-        target_revision: A str specifying the target revision for migration
-        config: Config object containing configuration settings
         progress_func: A Callable with a single argument of type float, used to track progress during migration
+        n_steps: number of upgrade steps
+        weights: optional relative weight of each upgrade step, e.g. from get_upgrade_step_weights
     """
-    logger = logging.getLogger("alembic.runtime.migration")
-    logger.setLevel(logging.INFO)
-    handler = ProgressHandler(progress_func, total_steps=n_steps)
-    logger.addHandler(handler)
+    handler = ProgressHandler(progress_func, total_steps=n_steps, weights=weights)
+    # restored by teardown_logging
+    handler.previous_levels = {}
+    for name in ("alembic.runtime.migration", PROGRESS_LOGGER_NAME):
+        logger = logging.getLogger(name)
+        handler.previous_levels[name] = logger.level
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
     return handler
+
+
+def teardown_logging(handler: ProgressHandler):
+    """Remove a handler that was added by setup_logging and restore the log levels"""
+    for name, level in handler.previous_levels.items():
+        logger = logging.getLogger(name)
+        logger.removeHandler(handler)
+        logger.setLevel(level)
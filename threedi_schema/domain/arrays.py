@@ -0,0 +1,157 @@
+"""NumPy representations of the CSV columns (``CSVText`` and ``CSVTable``).
+
+This module requires numpy, which is an optional dependency: install
+``threedi-schema[numpy]``.
+"""
+
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+__all__ = [
+    "CSVParseError",
+    "RaggedArray",
+    "parse_csv_string",
+    "parse_csv_strings",
+    "parse_csv_table",
+    "parse_csv_tables",
+]
+
+# number of distinct values of which the parsed arrays are memoised
+CACHE_SIZE = 4096
+
+
+class CSVParseError(ValueError):
+    """A CSV value could not be parsed; `index` is its position in the column"""
+
+    def __init__(self, message, index=None):
+        super().__init__(message if index is None else f"row {index}: {message}")
+        self.message = message
+        self.index = index
+
+
+class RaggedArray(NamedTuple):
+    """The arrays of a column of CSV values, concatenated.
+
+    The array of value `i` is ``values[offsets[i]:offsets[i + 1]]``. A 1D
+    array for ``CSVText`` columns, a 2D array (with the same number of columns
+    for each value) for ``CSVTable`` columns. A missing (NULL) or empty value
+    gives an empty array.
+    """
+
+    values: np.ndarray
+    offsets: np.ndarray
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.values[self.offsets[i] : self.offsets[i + 1]]
+
+
+def _to_floats(fields) -> np.ndarray:
+    try:
+        return np.array(fields, dtype=np.float64)
+    except ValueError as e:
+        raise CSVParseError(str(e)) from None
+
+
+def _split_lines(value: str):
+    return value.replace("\r\n", "\n").strip().split("\n")
+
+
+def _check_ncols(lines, ncols):
+    if any(line.count(",") != ncols - 1 for line in lines):
+        raise CSVParseError(f"expected {ncols} values on every line")
+
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    # memoised arrays are shared between callers
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_csv_string(value: str) -> np.ndarray:
+    """Parse a comma separated string ("1,2,3") into a read-only 1D float array"""
+    value = value.strip()
+    if not value:
+        return _readonly(np.empty(0))
+    return _readonly(_to_floats(value.split(",")))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_csv_table(value: str) -> np.ndarray:
+    """Parse a CSV table ("0,1\\n2,3") into a read-only 2D float array"""
+    if not value.strip():
+        return _readonly(np.empty((0, 0)))
+    lines = _split_lines(value)
+    ncols = lines[0].count(",") + 1
+    _check_ncols(lines, ncols)
+    return _readonly(_to_floats(",".join(lines).split(",")).reshape(-1, ncols))
+
+
+def _find_error(values, parse):
+    """Raise a CSVParseError for the first value that does not parse"""
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            parse(value)
+        except CSVParseError as e:
+            raise CSVParseError(e.message, index=i) from None
+
+
+def parse_csv_strings(values: Iterable[Optional[str]]) -> RaggedArray:
+    """Parse a column of comma separated strings at once"""
+    values = list(values)
+    counts = np.zeros(len(values), dtype=np.int64)
+    parts = []
+    for i, value in enumerate(values):
+        if value is None or not value.strip():
+            continue
+        value = value.strip()
+        counts[i] = value.count(",") + 1
+        parts.append(value)
+    try:
+        array = _to_floats(",".join(parts).split(",")) if parts else np.empty(0)
+    except CSVParseError:
+        _find_error(values, parse_csv_string)
+        raise
+    return RaggedArray(array, np.concatenate([[0], np.cumsum(counts)]))
+
+
+def parse_csv_tables(
+    values: Iterable[Optional[str]], ncols: Optional[int] = None
+) -> RaggedArray:
+    """Parse a column of CSV tables at once, into one (n, ncols) array.
+
+    The number of values per line is taken from the first table, unless
+    `ncols` is given. A CSVParseError points to the first table that does not
+    parse or has a different number of values per line.
+    """
+    values = list(values)
+    counts = np.zeros(len(values), dtype=np.int64)
+    parts = []
+    for i, value in enumerate(values):
+        if value is None or not value.strip():
+            continue
+        lines = _split_lines(value)
+        if ncols is None:
+            ncols = lines[0].count(",") + 1
+        try:
+            _check_ncols(lines, ncols)
+        except CSVParseError as e:
+            raise CSVParseError(e.message, index=i) from None
+        counts[i] = len(lines)
+        parts.append(",".join(lines))
+    if not parts:
+        array = np.empty((0, ncols or 0))
+    else:
+        try:
+            array = _to_floats(",".join(parts).split(",")).reshape(-1, ncols)
+        except CSVParseError:
+            _find_error(values, parse_csv_table)
+            raise
+    return RaggedArray(array, np.concatenate([[0], np.cumsum(counts)]))
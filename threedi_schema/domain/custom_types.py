@@ -6,7 +6,10 @@ from sqlalchemy.types import Integer, Text, TypeDecorator, VARCHAR
 
 
 class Geometry(geoalchemy2.types.Geometry):
-    cache_ok = False
+    # SQLAlchemy builds the cache key from the arguments of __init__, which are
+    # stored in attributes of the same name (strings, so hashable). The other
+    # arguments of geoalchemy2.types.Geometry are constant.
+    cache_ok = True
 
     def __init__(self, geometry_type, from_text="GeomFromEWKT"):
         kwargs = {
@@ -38,7 +41,9 @@ class CustomEnum(TypeDecorator):
         """
         super().__init__()
         self.enum_class = enum_class
-        self.enums = [e.value for e in enum_class]
+        # value -> member, so that decoding a value is a single dict lookup
+        self.members = {e.value: e for e in enum_class}
+        self.enums = list(self.members)
 
     def process_bind_param(self, value, dialect):
         if isinstance(value, self.enum_class):
@@ -47,10 +52,39 @@ class CustomEnum(TypeDecorator):
             return value
 
     def process_result_value(self, value, dialect):
-        if value in self.enums:
-            return self.enum_class(value)
-        else:
-            return value
+        return self.members.get(value, value)
+
+    def bind_processor(self, dialect):
+        enum_class = self.enum_class
+        impl_processor = self.impl.bind_processor(dialect)
+
+        def process(value):
+            if isinstance(value, enum_class):
+                value = value.value
+            return impl_processor(value) if impl_processor else value
+
+        return process
+
+    def result_processor(self, dialect, coltype):
+        get_member = self.members.get
+        impl_processor = self.impl.result_processor(dialect, coltype)
+        if impl_processor is None:
+            return lambda value: get_member(value, value)
+
+        def process(value):
+            value = impl_processor(value)
+            return get_member(value, value)
+
+        return process
+
+    def decode_many(self, values):
+        """Decode a whole column of raw values at once.
+
+        Use this with columns that are selected without conversion, for instance
+        with ``type_coerce(column, Integer)``, to load large tables quickly.
+        """
+        get_member = self.members.get
+        return [get_member(value, value) for value in values]
 
 
 class IntegerEnum(CustomEnum):
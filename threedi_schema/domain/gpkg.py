@@ -0,0 +1,379 @@
+"""Decoding of GeoPackage geometry blobs into NumPy coordinate arrays.
+
+A GeoPackage blob is a header (magic, version, flags, srs_id and an optional
+envelope) followed by ISO WKB. Only the x and y coordinates are decoded.
+
+A batch of blobs is decoded at once by joining them into one byte array and
+reading the headers, counts and coordinates of all blobs with NumPy indexing.
+Batches with big-endian, 3D or multi-ring geometries are decoded blob by blob.
+
+This module requires numpy, which is an optional dependency: install
+``threedi-schema[numpy]``.
+"""
+
+import struct
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+__all__ = [
+    "GeometryArray",
+    "GeometryDecodeError",
+    "decode_bounds",
+    "decode_geometries",
+    "decode_geometry_types",
+    "geometries_equal",
+]
+
+# size of the envelope in bytes per envelope indicator of the header flags
+ENVELOPE_SIZES = (0, 32, 48, 48, 64)
+
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_TYPES = {WKB_POINT: "POINT", WKB_LINESTRING: "LINESTRING", WKB_POLYGON: "POLYGON"}
+
+
+class GeometryDecodeError(ValueError):
+    pass
+
+
+class GeometryArray(NamedTuple):
+    """The geometries of a column, as coordinate arrays with offsets.
+
+    For points, ``x[i]`` and ``y[i]`` are the coordinates of geometry `i`
+    (NaN if missing) and `offsets` is empty. For linestrings, `offsets` is
+    ``(coords,)`` and geometry `i` has the coordinates
+    ``coords[i]:coords[i + 1]``. For polygons, `offsets` is ``(rings, coords)``:
+    geometry `i` has the rings ``rings[i]:rings[i + 1]`` and ring `j` the
+    coordinates ``coords[j]:coords[j + 1]``. A missing geometry has no
+    coordinates.
+    """
+
+    geometry_type: str
+    x: np.ndarray
+    y: np.ndarray
+    offsets: Tuple[np.ndarray, ...]
+
+    def __len__(self):
+        return len(self.offsets[0]) - 1 if self.offsets else len(self.x)
+
+
+def _wkb_start(blob: bytes) -> int:
+    """The position of the WKB in a GeoPackage blob"""
+    if blob[:2] != b"GP":
+        raise GeometryDecodeError("not a GeoPackage geometry blob")
+    envelope = (blob[3] >> 1) & 0b111
+    if envelope >= len(ENVELOPE_SIZES):
+        raise GeometryDecodeError(f"invalid envelope indicator {envelope}")
+    return 8 + ENVELOPE_SIZES[envelope]
+
+
+class _WKBReader:
+    """Reads the coordinates of WKB geometries into a list of 2D float arrays"""
+
+    def __init__(self):
+        self.coords = []
+
+    def read(self, blob: bytes, pos: int, expected: int) -> int:
+        """Read the header of the WKB at `pos`; return the position after it"""
+        byte_order = "<" if blob[pos] == 1 else ">"
+        (wkb_type,) = struct.unpack_from(byte_order + "I", blob, pos + 1)
+        if wkb_type % 1000 != expected:
+            raise GeometryDecodeError(
+                f"expected WKB geometry type {expected}, got {wkb_type}"
+            )
+        self.byte_order = byte_order
+        self.ndims = (2, 3, 3, 4)[wkb_type // 1000]
+        return pos + 5
+
+    def read_count(self, blob: bytes, pos: int) -> Tuple[int, int]:
+        (count,) = struct.unpack_from(self.byte_order + "I", blob, pos)
+        return count, pos + 4
+
+    def read_coords(self, blob: bytes, pos: int, count: int) -> int:
+        end = pos + 8 * self.ndims * count
+        if end > len(blob):
+            raise GeometryDecodeError("the WKB is truncated")
+        coords = np.frombuffer(blob, self.byte_order + "f8", self.ndims * count, pos)
+        self.coords.append(coords.reshape(count, self.ndims)[:, :2])
+        return end
+
+    def to_xy(self) -> Tuple[np.ndarray, np.ndarray]:
+        coords = np.concatenate(self.coords) if self.coords else np.empty((0, 2))
+        return coords[:, 0].astype(np.float64), coords[:, 1].astype(np.float64)
+
+
+def _decode_points(blobs):
+    x = np.full(len(blobs), np.nan)
+    y = np.full(len(blobs), np.nan)
+    reader = _WKBReader()
+    for i, blob in enumerate(blobs):
+        if blob is None:
+            continue
+        pos = reader.read(blob, _wkb_start(blob), WKB_POINT)
+        reader.read_coords(blob, pos, 1)
+        x[i], y[i] = reader.coords.pop()[0]
+    return x, y, ()
+
+
+def _decode_linestrings(blobs):
+    counts = np.zeros(len(blobs), dtype=np.int64)
+    reader = _WKBReader()
+    for i, blob in enumerate(blobs):
+        if blob is None:
+            continue
+        pos = reader.read(blob, _wkb_start(blob), WKB_LINESTRING)
+        counts[i], pos = reader.read_count(blob, pos)
+        reader.read_coords(blob, pos, counts[i])
+    return (*reader.to_xy(), (np.concatenate([[0], np.cumsum(counts)]),))
+
+
+def _decode_polygons(blobs):
+    ring_counts = np.zeros(len(blobs), dtype=np.int64)
+    coord_counts = []
+    reader = _WKBReader()
+    for i, blob in enumerate(blobs):
+        if blob is None:
+            continue
+        pos = reader.read(blob, _wkb_start(blob), WKB_POLYGON)
+        ring_counts[i], pos = reader.read_count(blob, pos)
+        for _ in range(ring_counts[i]):
+            count, pos = reader.read_count(blob, pos)
+            pos = reader.read_coords(blob, pos, count)
+            coord_counts.append(count)
+    offsets = (
+        np.concatenate([[0], np.cumsum(ring_counts)]),
+        np.concatenate([[0], np.cumsum(coord_counts, dtype=np.int64)]),
+    )
+    return (*reader.to_xy(), offsets)
+
+
+class _Batch:
+    """The blobs of a batch that are not NULL, joined into one byte array"""
+
+    def __init__(self, blobs):
+        self.present = np.array([blob is not None for blob in blobs], dtype=bool)
+        blobs = [blob for blob in blobs if blob is not None]
+        lengths = np.array([len(blob) for blob in blobs], dtype=np.int64)
+        self.ends = np.cumsum(lengths)
+        self.starts = self.ends - lengths
+        self.buf = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+
+    def read(self, pos, count, dtype):
+        """Read `count` values of `dtype` at each of the positions `pos`"""
+        size = np.dtype(dtype).itemsize * count
+        index = pos[:, np.newaxis] + np.arange(size)
+        return self.buf[index].view(dtype).reshape(len(pos), count)
+
+    def wkb_starts(self):
+        """The positions of the WKB, or None if a header is invalid"""
+        if (self.ends - self.starts < 8).any():
+            return None
+        magic = self.read(self.starts, 1, "<u2")[:, 0]
+        envelope = (self.buf[self.starts + 3] >> 1) & 0b111
+        if (magic != 0x5047).any() or (envelope >= len(ENVELOPE_SIZES)).any():
+            return None
+        return self.starts + 8 + np.array(ENVELOPE_SIZES)[envelope]
+
+
+def _decode_batch(batch: _Batch, wkb_type: int):
+    """The number of coordinates and the x and y coordinates of the geometries
+    of a batch, or None if it cannot be decoded at once.
+
+    This handles 2D little-endian WKB, with exactly one ring for polygons.
+    """
+    wkb = batch.wkb_starts()
+    n_counts = {WKB_POINT: 0, WKB_LINESTRING: 1, WKB_POLYGON: 2}[wkb_type]
+    if wkb is None or (wkb + 5 + 4 * n_counts > batch.ends).any():
+        return None
+    if (batch.buf[wkb] != 1).any():
+        return None
+    counts = batch.read(wkb + 1, 1 + n_counts, "<u4").astype(np.int64)
+    if (counts[:, 0] != wkb_type).any():
+        return None
+    if wkb_type == WKB_POLYGON and (counts[:, 1] != 1).any():
+        return None
+    count = counts[:, -1] if n_counts else np.ones(len(wkb), dtype=np.int64)
+    coord_starts = wkb + 5 + 4 * n_counts
+    if (coord_starts + 16 * count != batch.ends).any():
+        return None
+    # the coordinates take the rest of each blob: mask out the headers
+    header = np.zeros(len(batch.buf) + 1, dtype=np.int8)
+    header[batch.starts] = 1
+    header[coord_starts] -= 1
+    mask = np.cumsum(header[:-1]) == 0
+    coords = batch.buf[mask].view("<f8").reshape(-1, 2)
+    return count, coords[:, 0].copy(), coords[:, 1].copy()
+
+
+def _to_offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def _decode_points_batch(blobs):
+    batch = _Batch(blobs)
+    decoded = _decode_batch(batch, WKB_POINT)
+    if decoded is None:
+        return _decode_points(blobs)
+    _, x_present, y_present = decoded
+    x = np.full(len(blobs), np.nan)
+    y = np.full(len(blobs), np.nan)
+    x[batch.present], y[batch.present] = x_present, y_present
+    return x, y, ()
+
+
+def _decode_linestrings_batch(blobs):
+    batch = _Batch(blobs)
+    decoded = _decode_batch(batch, WKB_LINESTRING)
+    if decoded is None:
+        return _decode_linestrings(blobs)
+    count, x, y = decoded
+    counts = np.zeros(len(blobs), dtype=np.int64)
+    counts[batch.present] = count
+    return x, y, (_to_offsets(counts),)
+
+
+def _decode_polygons_batch(blobs):
+    batch = _Batch(blobs)
+    decoded = _decode_batch(batch, WKB_POLYGON)
+    if decoded is None:
+        return _decode_polygons(blobs)
+    count, x, y = decoded
+    return x, y, (_to_offsets(batch.present), _to_offsets(count))
+
+
+DECODERS = {
+    "POINT": _decode_points_batch,
+    "LINESTRING": _decode_linestrings_batch,
+    "POLYGON": _decode_polygons_batch,
+}
+
+
+def decode_geometries(
+    blobs: Sequence[Optional[bytes]], geometry_type: str
+) -> GeometryArray:
+    """Decode GeoPackage blobs (or None) of one geometry type into a GeometryArray"""
+    try:
+        decoder = DECODERS[geometry_type.upper()]
+    except KeyError:
+        raise GeometryDecodeError(f"unsupported geometry type {geometry_type}")
+    try:
+        x, y, offsets = decoder(blobs)
+    except (IndexError, struct.error):
+        raise GeometryDecodeError("the WKB is truncated") from None
+    return GeometryArray(geometry_type.upper(), x, y, offsets)
+
+
+def decode_geometry_types(blobs: Sequence[Optional[bytes]]) -> np.ndarray:
+    """The WKB geometry type codes (modulo 1000, so 2 for a LINESTRING Z) of
+    GeoPackage blobs (or None), without decoding the coordinates.
+
+    A missing geometry has type 0. See WKB_TYPES for the supported types.
+    """
+    types = np.zeros(len(blobs), dtype=np.int64)
+    batch = _Batch(blobs)
+    wkb = batch.wkb_starts()
+    if wkb is None:
+        for blob in blobs:
+            if blob is not None:
+                _wkb_start(blob)
+        raise GeometryDecodeError("the header is truncated")
+    if (wkb + 5 > batch.ends).any():
+        raise GeometryDecodeError("the WKB is truncated")
+    little_endian = batch.buf[wkb] == 1
+    present_types = np.where(
+        little_endian,
+        batch.read(wkb + 1, 1, "<u4")[:, 0],
+        batch.read(wkb + 1, 1, ">u4")[:, 0],
+    )
+    types[batch.present] = present_types % 1000
+    return types
+
+
+def _bounds_from_coordinates(blob: bytes) -> Tuple[float, float, float, float]:
+    pos = _wkb_start(blob)
+    if pos + 5 > len(blob):
+        raise GeometryDecodeError("the WKB is truncated")
+    (wkb_type,) = struct.unpack_from("<I" if blob[pos] == 1 else ">I", blob, pos + 1)
+    try:
+        geometry_type = WKB_TYPES[wkb_type % 1000]
+    except KeyError:
+        raise GeometryDecodeError(f"unsupported WKB geometry type {wkb_type}")
+    geometry = decode_geometries([blob], geometry_type)
+    if not len(geometry.x):
+        return (np.nan,) * 4
+    return geometry.x.min(), geometry.y.min(), geometry.x.max(), geometry.y.max()
+
+
+def decode_bounds(blobs: Sequence[Optional[bytes]]) -> np.ndarray:
+    """The bounding boxes (minx, miny, maxx, maxy) of GeoPackage blobs (or None).
+
+    The bounding boxes are read from the envelopes in the headers, without
+    decoding the coordinates. Only blobs without an envelope (typically points)
+    are decoded. A missing geometry has a NaN bounding box.
+    """
+    bounds = np.full((len(blobs), 4), np.nan)
+    batch = _Batch(blobs)
+    if batch.wkb_starts() is None:
+        # decode blob by blob to report the invalid one
+        for blob in blobs:
+            if blob is not None:
+                _wkb_start(blob)
+        raise GeometryDecodeError("the header is truncated")
+    flags = batch.buf[batch.starts + 3]
+    has_envelope = ((flags >> 1) & 0b111) > 0
+    little_endian = (flags & 1) == 1
+    envelopes = np.empty((len(batch.starts), 4))
+    for byte_order, selected in (("<f8", little_endian), (">f8", ~little_endian)):
+        selected = selected & has_envelope
+        if selected.any():
+            envelopes[selected] = batch.read(batch.starts[selected] + 8, 4, byte_order)
+    # GeoPackage envelopes are (minx, maxx, miny, maxy)
+    envelopes = envelopes[:, [0, 2, 1, 3]]
+    present = np.flatnonzero(batch.present)
+    bounds[present[has_envelope]] = envelopes[has_envelope]
+    for i in present[~has_envelope]:
+        bounds[i] = _bounds_from_coordinates(blobs[i])
+    return bounds
+
+
+def _get_parts(geometries: GeometryArray, i: int):
+    """The number of coordinates per part and the (n, 2) coordinates of geometry i"""
+    if len(geometries.offsets) == 1:
+        bounds = geometries.offsets[0][i : i + 2]
+    else:
+        rings, coords = geometries.offsets
+        bounds = coords[rings[i] : rings[i + 1] + 1]
+    start, end = bounds[0], bounds[-1]
+    return (
+        tuple(np.diff(bounds)),
+        np.stack([geometries.x[start:end], geometries.y[start:end]], axis=1),
+    )
+
+
+def geometries_equal(
+    a: GeometryArray, b: GeometryArray, tolerance: float = 0.0
+) -> np.ndarray:
+    """Compare two GeometryArrays of the same length geometry by geometry.
+
+    Geometries are equal if they have the same number of rings and coordinates
+    and no coordinate differs more than `tolerance` in x or y. Two missing
+    geometries are equal.
+    """
+    if len(a) != len(b):
+        raise ValueError("the GeometryArrays have different lengths")
+    if a.geometry_type != b.geometry_type:
+        return np.zeros(len(a), dtype=bool)
+    if not a.offsets:
+        missing_a, missing_b = np.isnan(a.x), np.isnan(b.x)
+        close = (np.abs(a.x - b.x) <= tolerance) & (np.abs(a.y - b.y) <= tolerance)
+        return (missing_a & missing_b) | (~missing_a & ~missing_b & close)
+    result = np.empty(len(a), dtype=bool)
+    for i in range(len(a)):
+        counts_a, coords_a = _get_parts(a, i)
+        counts_b, coords_b = _get_parts(b, i)
+        result[i] = counts_a == counts_b and bool(
+            (np.abs(coords_a - coords_b) <= tolerance).all()
+        )
+    return result
@@ -38,7 +38,7 @@ class BoundaryConditions2D(Base):
 class MeasureLocation(Base):
     __tablename__ = "measure_location"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    connection_node_id = Column(Integer)
+    connection_node_id = Column(Integer, index=True)
     measure_variable = Column(VarcharEnum(constants.MeasureVariables))
     display_name = Column(Text)
     code = Column(Text)
@@ -49,7 +49,7 @@ class MeasureLocation(Base):
 class MeasureMap(Base):
     __tablename__ = "measure_map"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    measure_location_id = Column(Integer)
+    measure_location_id = Column(Integer, index=True)
     control_type = Column(VarcharEnum(constants.ControlType), nullable=False)
     control_id = Column(Integer)
     weight = Column(Float)
@@ -140,7 +140,7 @@ class Surface(Base):
     code = Column(String(100))
     display_name = Column(String(255))
     area = Column(Float)
-    surface_parameters_id = Column(Integer)
+    surface_parameters_id = Column(Integer, index=True)
     geom = Column(
         Geometry("POLYGON"),
         nullable=True,
@@ -167,7 +167,7 @@ class DryWeatherFlow(Base):
 class DryWeatherFlowMap(Base):
     __tablename__ = "dry_weather_flow_map"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    connection_node_id = Column(Integer)
+    connection_node_id = Column(Integer, index=True)
     dry_weather_flow_id = Column(Integer)
     display_name = Column(String(255))
     code = Column(String(100))
@@ -282,7 +282,7 @@ class Lateral1D(Base):
     tags = Column(CSVText)
     geom = Column(Geometry("POINT"), nullable=False)
 
-    connection_node_id = Column(Integer)
+    connection_node_id = Column(Integer, index=True)
 
 
 class NumericalSettings(Base):
@@ -440,14 +440,14 @@ class BoundaryCondition1D(Base):
     tags = Column(CSVText)
     geom = Column(Geometry("POINT"), nullable=False)
 
-    connection_node_id = Column(Integer)
+    connection_node_id = Column(Integer, index=True)
 
 
 class SurfaceMap(Base):
     __tablename__ = "surface_map"
     id = Column(Integer, primary_key=True, autoincrement=True)
     surface_id = Column(Integer, nullable=False)
-    connection_node_id = Column(Integer)
+    connection_node_id = Column(Integer, index=True)
     percentage = Column(Float)
     geom = Column(Geometry("LINESTRING"), nullable=False)
     tags = Column(CSVText)
@@ -464,8 +464,8 @@ class Channel(Base):
     exchange_type = Column(IntegerEnum(constants.CalculationType))
     calculation_point_distance = Column(Float)
     geom = Column(Geometry("LINESTRING"), nullable=False)
-    connection_node_id_start = Column(Integer)
-    connection_node_id_end = Column(Integer)
+    connection_node_id_start = Column(Integer, index=True)
+    connection_node_id_end = Column(Integer, index=True)
     exchange_thickness = Column(Float)
     hydraulic_conductivity_in = Column(Float)
     hydraulic_conductivity_out = Column(Float)
@@ -483,7 +483,7 @@ class Windshielding1D(Base):
     west = Column(Float)
     northwest = Column(Float)
     geom = Column(Geometry("POINT"), nullable=False)
-    channel_id = Column(Integer)
+    channel_id = Column(Integer, index=True)
     tags = Column(CSVText)
     code = Column(String(100))
     display_name = Column(String(255))
@@ -509,7 +509,7 @@ class CrossSectionLocation(Base):
     vegetation_height = Column(Float)
     vegetation_drag_coefficient = Column(Float)
     geom = Column(Geometry("POINT"), nullable=False)
-    channel_id = Column(Integer)
+    channel_id = Column(Integer, index=True)
     display_name = Column(String(255))
 
 
@@ -528,8 +528,8 @@ class Pipe(Base):
     friction_type = Column(IntegerEnum(constants.FrictionType))
     calculation_point_distance = Column(Float)
     material_id = Column(Integer)
-    connection_node_id_start = Column(Integer)
-    connection_node_id_end = Column(Integer)
+    connection_node_id_start = Column(Integer, index=True)
+    connection_node_id_end = Column(Integer, index=True)
     cross_section_shape = Column(IntegerEnum(constants.CrossSectionShape))
     cross_section_width = Column(Float)
     cross_section_height = Column(Float)
@@ -555,8 +555,8 @@ class Culvert(Base):
     invert_level_end = Column(Float)
     geom = Column(Geometry("LINESTRING"), nullable=False)
     material_id = Column(Integer)
-    connection_node_id_start = Column(Integer)
-    connection_node_id_end = Column(Integer)
+    connection_node_id_start = Column(Integer, index=True)
+    connection_node_id_end = Column(Integer, index=True)
     cross_section_shape = Column(IntegerEnum(constants.CrossSectionShape))
     cross_section_width = Column(Float)
     cross_section_height = Column(Float)
@@ -588,8 +588,8 @@ class Weir(Base):
     material_id = Column(Integer)
     sewerage = Column(Boolean)
     external = Column(Boolean)
-    connection_node_id_start = Column(Integer)
-    connection_node_id_end = Column(Integer)
+    connection_node_id_start = Column(Integer, index=True)
+    connection_node_id_end = Column(Integer, index=True)
     cross_section_shape = Column(IntegerEnum(constants.CrossSectionShape))
     cross_section_width = Column(Float)
     cross_section_height = Column(Float)
@@ -612,8 +612,8 @@ class Orifice(Base):
     discharge_coefficient_positive = Column(Float)
     discharge_coefficient_negative = Column(Float)
     sewerage = Column(Boolean)
-    connection_node_id_start = Column(Integer)
-    connection_node_id_end = Column(Integer)
+    connection_node_id_start = Column(Integer, index=True)
+    connection_node_id_end = Column(Integer, index=True)
     cross_section_shape = Column(IntegerEnum(constants.CrossSectionShape))
     cross_section_width = Column(Float)
     cross_section_height = Column(Float)
@@ -633,7 +633,7 @@ class Pump(Base):
         IntegerEnum(constants.PumpType), name="type", key="type_"
     )  # type: ignore[call-overload]
     sewerage = Column(Boolean)
-    connection_node_id = Column(Integer)
+    connection_node_id = Column(Integer, index=True)
     geom = Column(Geometry("POINT"), nullable=False)
     tags = Column(CSVText)
 
@@ -641,8 +641,8 @@ class Pump(Base):
 class PumpMap(Base):
     __tablename__ = "pump_map"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    pump_id = Column(Integer)
-    connection_node_id_end = Column(Integer)
+    pump_id = Column(Integer, index=True)
+    connection_node_id_end = Column(Integer, index=True)
     geom = Column(Geometry("LINESTRING"), nullable=False)
     tags = Column(CSVText)
     code = Column(String(100))
@@ -672,14 +672,14 @@ class PotentialBreach(Base):
     final_exchange_level = Column(Float)
     levee_material = Column(IntegerEnum(constants.Material))
     geom = Column(Geometry("LINESTRING"), nullable=False)
-    channel_id = Column(Integer)
+    channel_id = Column(Integer, index=True)
 
 
 class ExchangeLine(Base):
     __tablename__ = "exchange_line"
     id = Column(Integer, primary_key=True, autoincrement=True)
     geom = Column(Geometry("LINESTRING"), nullable=False)
-    channel_id = Column(Integer)
+    channel_id = Column(Integer, index=True)
     exchange_level = Column(Float)
     display_name = Column(Text)
     code = Column(Text)
@@ -1,2 +1,3 @@
+from .indexes import *  # NOQA
 from .spatial_index import *  # NOQA
 from .views import *  # NOQA
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect
+
+__all__ = ["ensure_indexes"]
+
+
+def get_missing_indexes(engine, models):
+    """Collect the indexes of the models that do not exist in the database"""
+    inspector = inspect(engine)
+    table_names = inspector.get_table_names()
+    missing = []
+    for model in models:
+        table = model.__table__
+        if not table.indexes or table.name not in table_names:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(
+            index
+            for index in sorted(table.indexes, key=lambda index: index.name)
+            if index.name not in existing
+        )
+    return missing
+
+
+def ensure_indexes(engine, models):
+    """Ensure presence of the (non-spatial) indexes of the models"""
+    missing_indexes = get_missing_indexes(engine, models)
+    with engine.connect() as connection:
+        with connection.begin():
+            for index in missing_indexes:
+                index.create(connection)
@@ -18,6 +18,47 @@ def create_spatial_index(connection, column):
     return True
 
 
+def has_spatial_index(connection, column):
+    """
+    Whether the rtree table of the spatial index of given column exists.
+    """
+    return bool(
+        connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": f"rtree_{column.table.name}_{column.name}"},
+        ).scalar()
+    )
+
+
+def drop_spatial_index(connection, column):
+    """
+    Drop the spatial index (rtree table and triggers) of given column.
+    Returns False if there is no spatial index.
+    """
+    if not has_spatial_index(connection, column):
+        return False
+    table_name, column_name = column.table.name, column.name
+    rtree_name = f"rtree_{table_name}_{column_name}"
+    triggers = connection.execute(
+        text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = :table AND substr(name, 1, length(:prefix)) = :prefix"
+        ),
+        {"table": table_name, "prefix": f"{rtree_name}_"},
+    ).scalars()
+    for trigger in list(triggers):
+        connection.execute(text(f'DROP TRIGGER "{trigger}"'))
+    connection.execute(text(f'DROP TABLE "{rtree_name}"'))
+    connection.execute(
+        text(
+            "DELETE FROM gpkg_extensions WHERE table_name = :table "
+            "AND column_name = :column AND extension_name = 'gpkg_rtree_index'"
+        ),
+        {"table": table_name, "column": column_name},
+    )
+    return True
+
+
 def get_missing_spatial_indexes(engine, models):
     """
     Collect all rtree tables that should exist
@@ -1,7 +1,6 @@
 import os
 
 from alembic import context
-from sqlalchemy import text
 
 import threedi_schema.domain.models  # NOQA needed for autogenerate
 from threedi_schema import ThreediDatabase
@@ -27,31 +26,35 @@ def run_migrations_online():
     Note: SQLite does not (completely) support transactions, so, backup the
     SQLite before running migrations.
     """
-    unsafe = config.attributes.get("unsafe")
-    
     engine = config.attributes.get("engine")
     if engine is None:
         engine = ThreediDatabase(get_url()).engine
-    
 
-    with engine.connect() as connection:
-        # the following 5 lines have been commented out because for some reason the
-        # spatialite schema_version doesn't get updated when journal_mode is set to MEMORY
-        # TODO: make this work again.
-        # if unsafe:
-        #     # Speed up by journalling in memory; in case of a crash the database
-        #     # will likely go corrupt.
-        #     # NB: This setting is scoped to this connection.
-        #     connection.execute(text("PRAGMA journal_mode = MEMORY"))
+    # see threedi_schema.application.memory.MemoryMonitor
+    memory_monitor = config.attributes.get("memory_monitor")
+    kwargs = {}
+    if memory_monitor is not None:
+        kwargs["on_version_apply"] = memory_monitor.on_version_apply
 
+    with engine.connect() as connection:
+        if memory_monitor is not None:
+            memory_monitor.attach(connection)
+        # PRAGMAs that speed up migrations (like journal_mode = MEMORY) are not
+        # set here: journal_mode cannot be changed inside a transaction. Instead,
+        # they are set on connect, see ThreediDatabase.file_transaction.
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             version_table=constants.VERSION_TABLE_NAME,
+            **kwargs,
         )
 
-        with context.begin_transaction():
-            context.run_migrations()
+        try:
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            if memory_monitor is not None:
+                memory_monitor.detach(connection)
 
 
 if context.is_offline_mode():
@@ -1,5 +1,7 @@
+import re
 import sqlite3
-from typing import List
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
 
 import sqlalchemy as sa
 
@@ -52,3 +54,215 @@ def get_crs_info(srid):
     return unit, is_projected
 
 
+# SQLite versions with native ALTER TABLE ... RENAME COLUMN and DROP COLUMN
+SQLITE_RENAME_COLUMN_VERSION = (3, 25, 0)
+SQLITE_DROP_COLUMN_VERSION = (3, 35, 0)
+
+
+def get_sqlite_version(connection) -> Tuple[int, ...]:
+    """Version of the SQLite library of connection; (0,) for other databases"""
+    if connection.dialect.name != "sqlite":
+        return (0,)
+    version = connection.execute(sa.text("SELECT sqlite_version()")).scalar()
+    return tuple(int(part) for part in version.split("."))
+
+
+def get_geometry_columns(connection, table_name: str) -> Set[str]:
+    """Names (lowercase) of the spatialite or geopackage geometry columns of a table"""
+    tables = {
+        item[0]
+        for item in connection.execute(
+            sa.text("SELECT name FROM sqlite_master WHERE type='table';")
+        ).fetchall()
+    }
+    if "gpkg_geometry_columns" in tables:
+        query = "SELECT column_name FROM gpkg_geometry_columns WHERE lower(table_name) = lower(:table)"
+    elif "geometry_columns" in tables:
+        query = "SELECT f_geometry_column FROM geometry_columns WHERE lower(f_table_name) = lower(:table)"
+    else:
+        return set()
+    return {
+        item[0].lower()
+        for item in connection.execute(sa.text(query), {"table": table_name}).fetchall()
+    }
+
+
+def is_used_in_views_or_triggers(connection, table_name: str, column: str) -> bool:
+    """
+    Whether a view or trigger possibly refers to a column of a table
+
+    With legacy_alter_table=ON (see threedi_database.set_sqlite_pragma) SQLite
+    does not check views and triggers when it drops a column in place, so they
+    would silently break. This compares names only and may give false positives.
+    """
+    table_pattern = re.compile(rf"\b{re.escape(table_name)}\b", re.IGNORECASE)
+    column_pattern = re.compile(rf"\b{re.escape(column)}\b", re.IGNORECASE)
+    return any(
+        table_pattern.search(sql) and column_pattern.search(sql)
+        for (sql,) in connection.execute(
+            sa.text(
+                "SELECT sql FROM sqlite_master "
+                "WHERE type IN ('view', 'trigger') AND sql IS NOT NULL"
+            )
+        )
+    )
+
+
+def _alter_in_place(op, statement: str) -> bool:
+    """
+    Try a native ALTER TABLE statement.
+
+    SQLite refuses to drop a column that is indexed or part of a key or
+    constraint; a failing statement has no effect, so the caller falls back to
+    a batch operation.
+    """
+    try:
+        op.execute(sa.text(statement))
+    except sa.exc.OperationalError:
+        return False
+    return True
+
+
+def rename_table_columns(op, table_name: str, columns: List[Tuple[str, str]]):
+    """
+    Rename columns, in place if possible
+
+    SQLite >= 3.25 renames columns without copying the table. Geometry columns,
+    and databases with an older SQLite, fall back to op.batch_alter_table.
+
+    Parameters:
+    op: The alembic operation context
+    table_name: The table containing the columns
+    columns: (old name, new name) pairs
+    """
+    connection = op.get_bind()
+    remaining = list(columns)
+    if get_sqlite_version(connection) >= SQLITE_RENAME_COLUMN_VERSION:
+        geometry_columns = get_geometry_columns(connection, table_name)
+        remaining = [
+            (src_name, dst_name)
+            for src_name, dst_name in columns
+            if src_name.lower() in geometry_columns
+            or not _alter_in_place(
+                op, f'ALTER TABLE "{table_name}" RENAME COLUMN "{src_name}" TO "{dst_name}"'
+            )
+        ]
+    if remaining:
+        with op.batch_alter_table(table_name) as batch_op:
+            for src_name, dst_name in remaining:
+                batch_op.alter_column(src_name, new_column_name=dst_name)
+
+
+def drop_table_columns(op, table_name: str, columns: List[str]):
+    """
+    Drop columns, in place if possible
+
+    SQLite >= 3.35 drops columns without copying the table. Geometry columns,
+    columns that views or triggers refer to, columns that SQLite cannot drop
+    (see _alter_in_place) and databases with an older SQLite fall back to
+    op.batch_alter_table.
+
+    Parameters:
+    op: The alembic operation context
+    table_name: The table containing the columns
+    columns: The names of the columns to drop
+    """
+    connection = op.get_bind()
+    remaining = list(columns)
+    if get_sqlite_version(connection) >= SQLITE_DROP_COLUMN_VERSION:
+        geometry_columns = get_geometry_columns(connection, table_name)
+        remaining = [
+            column
+            for column in columns
+            if column.lower() in geometry_columns
+            or is_used_in_views_or_triggers(connection, table_name, column)
+            or not _alter_in_place(op, f'ALTER TABLE "{table_name}" DROP COLUMN "{column}"')
+        ]
+    if remaining:
+        with op.batch_alter_table(table_name) as batch_op:
+            for column in remaining:
+                batch_op.drop_column(column)
+
+
+def rebuild_table(
+    op,
+    table_name: str,
+    new_table_name: Optional[str] = None,
+    rename_columns: Optional[Dict[str, str]] = None,
+    remove_columns: Optional[List[str]] = None,
+    retype_columns: Optional[Dict[str, str]] = None,
+    add_columns: Optional[List[sa.Column]] = None,
+    geometry: Optional[Tuple[str, str, Optional[str]]] = None,
+):
+    """
+    Apply all column changes of a table in a single CREATE-INSERT-SELECT pass
+
+    Every batch operation copies the whole table, so a migration that renames,
+    removes, retypes and adds columns with separate batch operations copies a
+    table many times. This function copies it once. The copied columns keep
+    their type (unless retyped), but become nullable and lose their default
+    value, like in the copies that the migrations made before. The `id` column
+    is the INTEGER PRIMARY KEY. Added columns are appended with their full
+    definition and are empty, or hold their server default.
+
+    With `new_table_name`, the data is copied into a new table and the original
+    table is kept, so that later steps can still read from it; the caller drops
+    it. Otherwise the copy replaces the original table. Geometry columns are not
+    registered in the copy: the caller uses RecoverGeometryColumn afterwards.
+
+    Parameters:
+    op: The alembic operation context
+    table_name: The table to copy
+    new_table_name: The name of the copy; defaults to table_name
+    rename_columns: {old name: new name}
+    remove_columns: The names of the columns that are not copied
+    retype_columns: {old name: new type}
+    add_columns: New columns, appended after the copied columns
+    geometry: (old name, new name, type) of a geometry column that is moved
+        behind the other copied columns and made NOT NULL. The type defaults
+        to the type of the old column.
+    """
+    connection = op.get_bind()
+    rename_columns = rename_columns or {}
+    skip_columns = {"id"} | set(remove_columns or [])
+    retype_columns = retype_columns or {}
+    if geometry is not None:
+        skip_columns.add(geometry[0])
+    # (old name, new name, definition) of all copied columns
+    columns = [("id", "id", "INTEGER PRIMARY KEY NOT NULL")]
+    geometry_column = None
+    for _, name, type_, _, _, _ in connection.execute(
+        sa.text(f"PRAGMA table_info('{table_name}')")
+    ).fetchall():
+        if geometry is not None and name == geometry[0]:
+            geometry_column = (name, geometry[1], f"{geometry[2] or type_} NOT NULL")
+        if name in skip_columns:
+            continue
+        columns.append(
+            (name, rename_columns.get(name, name), retype_columns.get(name, type_))
+        )
+    if geometry_column is not None:
+        columns.append(geometry_column)
+    definitions = [f'"{new_name}" {definition}' for _, new_name, definition in columns]
+    for column in add_columns or []:
+        definitions.append(
+            str(sa.schema.CreateColumn(column).compile(dialect=connection.dialect))
+        )
+    in_place = new_table_name is None or new_table_name == table_name
+    dst_table_name = f"_temp_{uuid.uuid4().hex}" if in_place else new_table_name
+    old_names = ", ".join(f'"{old_name}"' for old_name, _, _ in columns)
+    new_names = ", ".join(f'"{new_name}"' for _, new_name, _ in columns)
+    op.execute(sa.text(f'CREATE TABLE "{dst_table_name}" ({", ".join(definitions)});'))
+    op.execute(
+        sa.text(
+            f'INSERT INTO "{dst_table_name}" ({new_names}) '
+            f'SELECT {old_names} FROM "{table_name}";'
+        )
+    )
+    if in_place:
+        if get_geometry_columns(connection, table_name):
+            drop_geo_table(op, table_name)
+        else:
+            op.execute(sa.text(f'DROP TABLE "{table_name}";'))
+        op.execute(sa.text(f'ALTER TABLE "{dst_table_name}" RENAME TO "{table_name}";'))
+
@@ -8,6 +8,8 @@ Create Date: 2024-02-04
 import sqlalchemy as sa
 from alembic import op
 
+from threedi_schema.migrations.utils import drop_table_columns
+
 # revision identifiers, used by Alembic.
 revision = '0221'
 down_revision = '0220'
@@ -16,8 +18,7 @@ depends_on = None
 
 
 def upgrade():
-    with op.batch_alter_table("v2_cross_section_location") as batch_op:
-        batch_op.drop_column("vegetation_drag_coeficients")
+    drop_table_columns(op, "v2_cross_section_location", ["vegetation_drag_coeficients"])
     op.execute(sa.text("SELECT RecoverGeometryColumn('v2_cross_section_location', 'the_geom', 4326, 'POINT', 'XY')"))
 
 
@@ -5,17 +5,19 @@ Revises:
 Create Date: 2024-03-04 10:06
 
 """
-import uuid
-
-from typing import Dict, List, Tuple
 from pathlib import Path
+from typing import Dict, List, Tuple
 
 import sqlalchemy as sa
 from alembic import op
 from sqlalchemy import Boolean, Column, Float, Integer, String
 from sqlalchemy.orm import declarative_base
 
-from threedi_schema.migrations.utils import drop_conflicting
+from threedi_schema.migrations.utils import (
+    drop_conflicting,
+    drop_table_columns,
+    rebuild_table,
+)
 
 # revision identifiers, used by Alembic.
 revision = "0222"
@@ -182,28 +184,19 @@ GLOBAL_SETTINGS_ID_TO_BOOL = [
 ]
 
 
-def rename_tables(table_sets: List[Tuple[str, str]]):
+def copy_renamed_tables(table_sets: List[Tuple[str, str]]):
+    # copy each table in a single pass, with its columns renamed, all columns except id
+    # made nullable and the new columns added, and remove the original table
     # no checks for existence are done, this will fail if a source table doesn't exist
     for src_name, dst_name in table_sets:
-        op.rename_table(src_name, dst_name)
-
-
-def rename_columns(table_name: str, columns: List[Tuple[str, str]]):
-    # no checks for existence are done, this will fail if table or any source column doesn't exist
-    with op.batch_alter_table(table_name) as batch_op:
-        for src_name, dst_name in columns:
-            batch_op.alter_column(src_name, new_column_name=dst_name)
-
-
-def make_all_columns_nullable(table_name, id_name: str = 'id'):
-    # no checks for existence are done, this will fail if table doesn't exist
-    connection = op.get_bind()
-    table = sa.Table(table_name, sa.MetaData(), autoload_with=connection)
-    with op.batch_alter_table(table_name) as batch_op:
-        for column in table.columns:
-            if column.name == id_name:
-                continue
-            batch_op.alter_column(column_name=column.name, nullable=True)
+        rebuild_table(
+            op,
+            src_name,
+            dst_name,
+            rename_columns=dict(RENAME_COLUMNS.get(dst_name, [])),
+            add_columns=[col for table, col in ADD_COLUMNS if table == dst_name],
+        )
+        op.drop_table(src_name)
 
 
 def create_new_tables(new_tables: Dict[str, sa.Column]):
@@ -213,13 +206,6 @@ def create_new_tables(new_tables: Dict[str, sa.Column]):
                         *columns)
 
 
-def add_columns_to_tables(table_columns: List[Tuple[str, Column]]):
-    # no checks for existence are done, this will fail if any column already exists
-    for dst_table, col in table_columns:
-        with op.batch_alter_table(dst_table) as batch_op:
-            batch_op.add_column(col)
-
-
 def move_multiple_values_to_empty_table(src_table: str, dst_table: str, columns: List[str]):
     # move values from one table to another
     # no checks for existence are done, this will fail if any table or column doesn't exist
@@ -236,9 +222,7 @@ def move_values_to_table(src_table: str, src_col: str, dst_table: str, dst_col:
 
 def remove_columns_from_table(table_name: str, columns: List[str]):
     # no checks for existence are done, this will fail if any table or column doesn't exist
-    with op.batch_alter_table(table_name) as batch_op:
-        for column in columns:
-            batch_op.drop_column(column)
+    drop_table_columns(op, table_name, columns)
 
 
 def set_use_from_settings_id():
@@ -267,12 +251,6 @@ def set_use_from_settings_id():
     op.execute(sql)
 
 
-def drop_columns(table, columns):
-    with op.batch_alter_table(table) as batch_op:
-        for column in columns:
-            batch_op.drop_column(column)
-
-
 def set_use_inteception():
     # Set use_interception based on interception and interception_file values
     op.execute(sa.text("""
@@ -349,20 +327,8 @@ def correct_raster_paths():
 
 def remove_columns_from_copied_tables(table_name: str, rem_columns: List[str]):
     # sqlite 3.27 doesn't support `ALTER TABLE ... DROP COLUMN`
-    # So we create a temp table, copy the columns we want to keep and remove the old table
-    # Retrieve columns
-    connection = op.get_bind()
-    all_columns = connection.execute(sa.text(f"PRAGMA table_info('{table_name}')")).fetchall()
-    col_names = [col[1] for col in all_columns if col[1] not in rem_columns]
-    col_types = [col[2] for col in all_columns if col[1] not in rem_columns]
-    cols = (['id INTEGER PRIMARY KEY NOT NULL'] +
-            [f'{cname} {ctype}' for cname, ctype in zip(col_names, col_types) if cname != 'id'])
-    # Create new table, insert data, drop original and rename to table_name
-    temp_name = f'_temp_222_{uuid.uuid4().hex}'
-    op.execute(sa.text(f"CREATE TABLE {temp_name} ({','.join(cols)});"))
-    op.execute(sa.text(f"INSERT INTO {temp_name} ({','.join(col_names)}) SELECT {','.join(col_names)} FROM {table_name}"))
-    op.execute(sa.text(f"DROP TABLE {table_name};"))
-    op.execute(sa.text(f"ALTER TABLE {temp_name} RENAME TO {table_name};"))
+    # So we copy the columns we want to keep to a new table that replaces the old table
+    rebuild_table(op, table_name, remove_columns=rem_columns)
 
 
 def set_flow_variable_values():
@@ -383,17 +349,10 @@ def upgrade():
     delete_all_but_first_row("v2_global_settings")
     # Remove existing tables (outside of the specs) that conflict with new table names
     drop_conflicting(op, list(ADD_TABLES.keys()) + [new_name for _, new_name in RENAME_TABLES])
-    rename_tables(RENAME_TABLES)
-    # rename columns in renamed tables
-    for table_name, columns in RENAME_COLUMNS.items():
-        rename_columns(table_name, columns)
-    # make all columns in renamed tables, except id, nullable
-    for _, table_name in RENAME_TABLES:
-        make_all_columns_nullable(table_name)
+    # rename tables and columns, make all columns except id nullable and add empty columns
+    copy_renamed_tables(RENAME_TABLES)
     # create new tables
     create_new_tables(ADD_TABLES)
-    # add empty columns to tables
-    add_columns_to_tables(ADD_COLUMNS)
     # copy data from model_settings to new tables and columns
     for dst_table, columns in COPY_FROM_GLOBAL.items():
         move_multiple_values_to_empty_table("model_settings", dst_table, columns)
@@ -404,15 +363,15 @@ def upgrade():
     set_use_inteception()
     # keep first row of settings tables that have no explicit mapping
     delete_all_but_matching_id("numerical_settings", "numerical_settings_id")
-    # drop unused id columns in model_settings
-    unused_cols = [settings_id for _, settings_id, _ in GLOBAL_SETTINGS_ID_TO_BOOL] + ["numerical_settings_id"]
-    drop_columns('model_settings', unused_cols)
     # remove relative path prefix from raster paths
     correct_raster_paths()
     # change flow_variable values to new naming scheme
     set_flow_variable_values()
-    # remove columns from tables that are copied
+    # remove columns from tables that are copied, including the unused id columns in model_settings
+    unused_cols = [settings_id for _, settings_id, _ in GLOBAL_SETTINGS_ID_TO_BOOL] + ["numerical_settings_id"]
     for table, columns in REMOVE_COLUMNS:
+        if table == "model_settings":
+            columns = columns + unused_cols
         remove_columns_from_copied_tables(table, columns)
 
 
@@ -15,7 +15,11 @@ from sqlalchemy import Boolean, Column, Float, Integer, String, Text
 from sqlalchemy.orm import declarative_base
 
 from threedi_schema.domain.custom_types import Geometry
-from threedi_schema.migrations.utils import drop_conflicting, drop_geo_table
+from threedi_schema.migrations.utils import (
+    drop_conflicting,
+    drop_geo_table,
+    drop_table_columns,
+)
 
 # revision identifiers, used by Alembic.
 revision = "0224"
@@ -93,12 +97,18 @@ def rename_tables(table_sets: List[Tuple[str, str]]):
 
 def add_columns_to_tables(table_columns: List[Tuple[str, Column]]):
     # no checks for existence are done, this will fail if any column already exists
+    # plain columns are grouped per table so that each table is altered only once
+    plain_columns: Dict[str, List[Column]] = {}
+    for dst_table, col in table_columns:
+        if not isinstance(col.type, Geometry):
+            plain_columns.setdefault(dst_table, []).append(col)
+    for dst_table, cols in plain_columns.items():
+        with op.batch_alter_table(dst_table) as batch_op:
+            for col in cols:
+                batch_op.add_column(col)
     for dst_table, col in table_columns:
         if isinstance(col.type, Geometry):
             add_geometry_column(dst_table, col)
-        else:
-            with op.batch_alter_table(dst_table) as batch_op:
-                batch_op.add_column(col)
 
 
 def make_all_columns_nullable(table_name, id_name: str = 'id'):
@@ -325,8 +335,7 @@ def rename_measure_operator(table_name: str):
 
 
 def remove_column_from_table(table_name: str, column: str):
-    with op.batch_alter_table(table_name) as batch_op:
-        batch_op.drop_column(column)
+    drop_table_columns(op, table_name, [column])
 
 
 def remove_tables(tables: List[str]):
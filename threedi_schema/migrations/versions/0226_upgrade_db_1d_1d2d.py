@@ -5,14 +5,18 @@ Revises:
 Create Date: 2024-08-30 07:52
 
 """
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
 import sqlalchemy as sa
 from alembic import op
 from sqlalchemy import Boolean, Column, Float, Integer, String, Text
 from sqlalchemy.orm import declarative_base
 
-from threedi_schema.migrations.utils import drop_conflicting, drop_geo_table
+from threedi_schema.migrations.utils import (
+    drop_conflicting,
+    drop_geo_table,
+    rebuild_table,
+)
 
 # revision identifiers, used by Alembic.
 revision = "0226"
@@ -51,8 +55,8 @@ RENAME_COLUMNS = {
 }
 
 RETYPE_COLUMNS = {
-    "potential_breach": [("channel_id", "INTEGER")],
-    "exchange_line": [("channel_id", "INTEGER")],
+    "potential_breach": {"channel_id": "INTEGER"},
+    "exchange_line": {"channel_id": "INTEGER"},
 }
 
 REMOVE_COLUMNS = {
@@ -65,13 +69,6 @@ class Schema225UpgradeException(Exception):
     pass
 
 
-def add_columns_to_tables(table_columns: List[Tuple[str, Column]]):
-    # no checks for existence are done, this will fail if any column already exists
-    for dst_table, col in table_columns:
-        with op.batch_alter_table(dst_table) as batch_op:
-            batch_op.add_column(col)
-
-
 def remove_tables(tables: List[str]):
     for table in tables:
         drop_geo_table(op, table)
@@ -84,49 +81,18 @@ def modify_table(old_table_name, new_table_name):
     # * columns in `REMOVE_COLUMNS[new_table_name]` are skipped
     # * columns in `RENAME_COLUMNS[new_table_name]` are renamed
     # * columns in `RETYPE_COLUMNS[new_table_name]` change type
+    # * columns in `NEW_COLUMNS` for `new_table_name` are added
     # * `the_geom` is renamed to `geom` and NOT NULL is enforced
-    connection = op.get_bind()
-    columns = connection.execute(sa.text(f"PRAGMA table_info('{old_table_name}')")).fetchall()
-    # get all column names and types
-    col_names = [col[1] for col in columns]
-    col_types = [col[2] for col in columns]
-    # get type of the geometry column
-    geom_type = None
-    for col in columns:
-        if col[1] == 'the_geom':
-            geom_type = col[2]
-            break
-    # create list of new columns and types for creating the new table
-    # create list of old columns to copy to new table
-    skip_cols = ['id', 'the_geom']
-    if new_table_name in REMOVE_COLUMNS:
-        skip_cols += REMOVE_COLUMNS[new_table_name]
-    old_col_names = []
-    new_col_names = []
-    new_col_types = []
-    for cname, ctype in zip(col_names, col_types):
-        if cname in skip_cols:
-            continue
-        old_col_names.append(cname)
-        if new_table_name in RENAME_COLUMNS and cname in RENAME_COLUMNS[new_table_name]:
-            new_col_names.append(RENAME_COLUMNS[new_table_name][cname])
-        else:
-            new_col_names.append(cname)
-        if new_table_name in RETYPE_COLUMNS and cname in RETYPE_COLUMNS[new_table_name]:
-            new_col_types.append(RETYPE_COLUMNS[new_table_name][cname])
-        else:
-            new_col_types.append(ctype)
-    # add to the end manually
-    old_col_names.append('the_geom')
-    new_col_names.append('geom')
-    new_col_types.append(f'{geom_type} NOT NULL')
-    # Create new table (temp), insert data, drop original and rename temp to table_name
-    new_col_str = ','.join(['id INTEGER PRIMARY KEY NOT NULL'] + [f'{cname} {ctype}' for cname, ctype in
-                                                                  zip(new_col_names, new_col_types)])
-    op.execute(sa.text(f"CREATE TABLE {new_table_name} ({new_col_str});"))
-    # Copy data
-    op.execute(sa.text(f"INSERT INTO {new_table_name} (id, {','.join(new_col_names)}) "
-                       f"SELECT id, {','.join(old_col_names)} FROM {old_table_name}"))
+    rebuild_table(
+        op,
+        old_table_name,
+        new_table_name,
+        rename_columns=RENAME_COLUMNS.get(new_table_name),
+        remove_columns=REMOVE_COLUMNS.get(new_table_name),
+        retype_columns=RETYPE_COLUMNS.get(new_table_name),
+        add_columns=[col for table, col in NEW_COLUMNS if table == new_table_name],
+        geometry=("the_geom", "geom", None),
+    )
 
 
 def fix_geometry_columns():
@@ -174,7 +140,6 @@ def upgrade():
     for old_table_name, new_table_name in RENAME_TABLES:
         modify_table(old_table_name, new_table_name)
         rem_tables.append(old_table_name)
-    add_columns_to_tables(NEW_COLUMNS)
     set_potential_breach_final_exchange_level()
     fix_geometry_columns()
     remove_tables(rem_tables)
@@ -9,6 +9,8 @@ Create Date: 2024-09-24 15:10
 import sqlalchemy as sa
 from alembic import op
 
+from threedi_schema.migrations.utils import drop_table_columns, rename_table_columns
+
 # revision identifiers, used by Alembic.
 revision = "0227"
 down_revision = "0226"
@@ -34,11 +36,9 @@ def fix_geometries(downgrade: bool=False):
 def upgrade():
     # remove measure variable from memory_control and table_control
     for table_name in TABLES:
-        with op.batch_alter_table(table_name) as batch_op:
-            batch_op.drop_column('measure_variable')
+        drop_table_columns(op, table_name, ['measure_variable'])
     # rename column
-    with op.batch_alter_table('control_measure_map') as batch_op:
-        batch_op.alter_column('control_measure_location_id', new_column_name='measure_location_id')
+    rename_table_columns(op, 'control_measure_map', [('control_measure_location_id', 'measure_location_id')])
     op.execute(sa.text(f"SELECT DiscardGeometryColumn('control_measure_location', 'geom')"))
     op.execute(sa.text(f"SELECT DiscardGeometryColumn('control_measure_map', 'geom')"))
     # rename tables
@@ -53,8 +53,7 @@ def downgrade():
         with op.batch_alter_table(table_name) as batch_op:
             batch_op.add_column(sa.Column("measure_variable", sa.Text, server_default="water_level"))
     # undo rename columns
-    with op.batch_alter_table('measure_map') as batch_op:
-        batch_op.alter_column('measure_location_id', new_column_name='control_measure_location_id')
+    rename_table_columns(op, 'measure_map', [('measure_location_id', 'control_measure_location_id')])
     # rename tables
     op.execute(sa.text(f"SELECT DiscardGeometryColumn('measure_location', 'geom')"))
     op.execute(sa.text(f"SELECT DiscardGeometryColumn('measure_map', 'geom')"))
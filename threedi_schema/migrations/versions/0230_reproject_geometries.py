@@ -12,7 +12,8 @@ from alembic import op
 
 from threedi_schema.application.errors import InvalidSRIDException
 from threedi_schema.application.schema import get_model_srid
-from threedi_schema.migrations.utils import get_crs_info
+from threedi_schema.application.upgrade_utils import report_progress
+from threedi_schema.migrations.utils import drop_table_columns, get_crs_info
 
 # revision identifiers, used by Alembic.
 revision = "0230"
@@ -125,13 +126,13 @@ def upgrade():
         # prepare spatialite databases
         prep_spatialite(srid)
         # transform all geometries
-        for table_name in GEOM_TABLES:
+        for i, table_name in enumerate(GEOM_TABLES):
+            report_progress(i / len(GEOM_TABLES), f"Reprojecting {table_name}")
             transform_column(table_name, srid)
     else:
         print('Model without geometries and epsg code, we need to think about this')
     # remove crs from model_settings
-    with op.batch_alter_table('model_settings') as batch_op:
-        batch_op.drop_column('epsg_code')
+    drop_table_columns(op, 'model_settings', ['epsg_code'])
 
 
 def downgrade():
@@ -8,6 +8,8 @@ Create Date: 2026-03-12
 import sqlalchemy as sa
 from alembic import op
 
+from threedi_schema.migrations.utils import drop_table_columns
+
 # revision identifiers, used by Alembic.
 revision = "0301"
 down_revision = "0300"
@@ -21,6 +23,5 @@ def upgrade():
 
 
 def downgrade():
-    with op.batch_alter_table("orifice") as batch_op:
-        batch_op.drop_column("discharge_capacity")
+    drop_table_columns(op, "orifice", ["discharge_capacity"])
 
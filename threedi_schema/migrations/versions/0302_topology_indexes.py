@@ -0,0 +1,50 @@
+"""add indexes to the columns that refer to connection nodes and other objects
+
+Revision ID: 0302
+Revises: 0301
+Create Date: 2026-10-19
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0302"
+down_revision = "0301"
+branch_labels = None
+depends_on = None
+
+# the names match the indexes of the models (Column(..., index=True))
+INDEXED_COLUMNS = {
+    "boundary_condition_1d": ["connection_node_id"],
+    "channel": ["connection_node_id_start", "connection_node_id_end"],
+    "cross_section_location": ["channel_id"],
+    "culvert": ["connection_node_id_start", "connection_node_id_end"],
+    "dry_weather_flow_map": ["connection_node_id"],
+    "exchange_line": ["channel_id"],
+    "lateral_1d": ["connection_node_id"],
+    "measure_location": ["connection_node_id"],
+    "measure_map": ["measure_location_id"],
+    "orifice": ["connection_node_id_start", "connection_node_id_end"],
+    "pipe": ["connection_node_id_start", "connection_node_id_end"],
+    "potential_breach": ["channel_id"],
+    "pump": ["connection_node_id"],
+    "pump_map": ["pump_id", "connection_node_id_end"],
+    "surface": ["surface_parameters_id"],
+    "surface_map": ["connection_node_id"],
+    "weir": ["connection_node_id_start", "connection_node_id_end"],
+    "windshielding_1d": ["channel_id"],
+}
+
+
+def upgrade():
+    for table, columns in INDEXED_COLUMNS.items():
+        for column in columns:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"
+            )
+
+
+def downgrade():
+    for table, columns in INDEXED_COLUMNS.items():
+        for column in columns:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}")
@@ -49,6 +49,7 @@ def index(ctx):
     schema = ctx.obj["db"].schema
     click.echo("Recovering indexes...")
     schema.set_spatial_indexes()
+    schema.set_indexes()
     click.echo("Done.")
 
 
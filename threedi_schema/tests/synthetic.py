@@ -0,0 +1,526 @@
+"""Generate large synthetic schematisations for scale tests and benchmarks.
+
+The schema is created by running the migrations on an empty database, so a
+schematisation can be generated at any revision: legacy (v2) spatialite files
+(e.g. 0200 and 0222), the last spatialite revision (0230) and geopackages.
+Afterwards the tables are filled by reflection: connection nodes on a jittered
+grid, lines between neighbouring nodes, cross section locations on channels and
+surfaces around nodes. The output only depends on the arguments, so a given
+`seed` always produces the same file.
+
+Usage::
+
+    python -m threedi_schema.tests.synthetic model.sqlite --revision 0222 \
+        --connection-nodes 1000000
+"""
+
+import argparse
+import math
+import random
+from array import array
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from threedi_schema.application.schema import (
+    _get_revision_number,
+    _upgrade_database,
+)
+from threedi_schema.application.threedi_database import ThreediDatabase
+from threedi_schema.application.upgrade_utils import (
+    LEGACY_TABLE_NAMES,
+    UNSAFE_PRAGMAS,
+)
+from threedi_schema.domain import constants
+from threedi_schema.domain.custom_types import CustomEnum
+from threedi_schema.domain.models import DECLARED_MODELS
+
+__all__ = ["generate_schematisation", "get_row_counts"]
+
+# Rows per connection node of a typical (large) schematisation
+ROW_COUNT_RATIOS = {
+    "connection_node": 1.0,
+    "pipe": 0.8,
+    "channel": 0.05,
+    "cross_section_location": 0.1,
+    "culvert": 0.02,
+    "weir": 0.005,
+    "orifice": 0.005,
+    "pump": 0.002,
+    "pump_map": 0.002,
+    "surface": 1.0,
+    "surface_map": 1.0,
+    "boundary_condition_1d": 0.0005,
+    "lateral_1d": 0.01,
+    "obstacle": 0.001,
+    "grid_refinement_line": 0.001,
+    "grid_refinement_area": 0.001,
+}
+
+# Legacy tables without an equivalent in DECLARED_MODELS, filled relative to
+# the number of rows in another table
+DERIVED_ROW_COUNTS = {
+    "v2_manhole": ("connection_node", 0.5),
+    "v2_cross_section_definition": ("cross_section_location", 1.0),
+}
+
+# Tables that get a single row, so that the schematisation can be migrated
+SETTINGS_TABLES = [
+    "v2_global_settings",
+    "v2_numerical_settings",
+    "model_settings",
+    "numerical_settings",
+    "physical_settings",
+    "simulation_template_settings",
+    "time_step_settings",
+    "initial_conditions",
+]
+
+# Foreign key columns and the table (as in DECLARED_MODELS) they refer to
+FOREIGN_KEYS = {
+    "connection_node_id": "connection_node",
+    "connection_node_id_start": "connection_node",
+    "connection_node_id_end": "connection_node",
+    "connection_node_start_id": "connection_node",
+    "connection_node_end_id": "connection_node",
+    "channel_id": "channel",
+    "cross_section_definition_id": "v2_cross_section_definition",
+    "definition_id": "v2_cross_section_definition",
+    "dry_weather_flow_id": "dry_weather_flow",
+    "impervious_surface_id": "surface",
+    "surface_id": "surface",
+}
+START_COLUMNS = ("connection_node_id_start", "connection_node_start_id")
+END_COLUMNS = ("connection_node_id_end", "connection_node_end_id")
+
+GEOMETRY_TYPES = {
+    0: "POINT",  # GEOMETRY
+    1: "POINT",
+    2: "LINESTRING",
+    3: "POLYGON",
+    4: "MULTIPOINT",
+    5: "MULTILINESTRING",
+    6: "MULTIPOLYGON",
+}
+
+# Node spacing in meters and the origin of the grid per CRS
+NODE_SPACING = 50.0
+PROJECTED_ORIGIN = (155000.0, 463000.0)  # Amersfoort in EPSG:28992
+GEOGRAPHIC_ORIGIN = (5.387, 52.155)  # Amersfoort in EPSG:4326
+BATCH_SIZE = 10000
+TIMESERIES = "0,1.0\n3600,1.5\n7200,1.0"
+# Legacy impervious surface classification, see migration 0223
+SURFACE_CLASSES = [
+    "gesloten verharding",
+    "open verharding",
+    "half verhard",
+    "onverhard",
+    "pand",
+]
+SURFACE_INCLINATIONS = ["hellend", "vlak", "uitgestrekt"]
+
+
+def get_row_counts(n_connection_nodes: int) -> Dict[str, int]:
+    """Row counts per table of a typical schematisation with the given size"""
+    return {
+        table: max(1, round(n_connection_nodes * ratio))
+        for table, ratio in ROW_COUNT_RATIOS.items()
+    }
+
+
+def _get_enum_values() -> Dict[tuple, list]:
+    """Valid values of the enum columns in DECLARED_MODELS per (table, column)"""
+    enum_values = {}
+    for model in DECLARED_MODELS:
+        for column in model.__table__.columns:
+            if isinstance(column.type, CustomEnum):
+                enum_values[(model.__tablename__, column.name)] = [
+                    e.value for e in column.type.enum_class
+                ]
+    return enum_values
+
+
+class GeometryColumn(NamedTuple):
+    name: str
+    geometry_type: str
+    srid: int
+
+
+class Column(NamedTuple):
+    name: str
+    affinity: str
+    notnull: bool
+    default: Optional[str]
+    primary_key: bool
+
+
+def _get_affinity(declared_type: str) -> str:
+    declared_type = declared_type.upper()
+    if "INT" in declared_type:
+        return "integer"
+    if "BOOL" in declared_type:
+        return "boolean"
+    if any(x in declared_type for x in ("REAL", "FLOA", "DOUB", "NUMERIC", "DEC")):
+        return "float"
+    if "DATE" in declared_type or "TIME" in declared_type:
+        return "date"
+    return "text"
+
+
+class SyntheticSchematisation:
+    """Fills the tables of an (empty) schematisation with synthetic data"""
+
+    def __init__(self, db, row_counts: Dict[str, int], seed=0, epsg_code=28992):
+        self.db = db
+        self.seed = seed
+        self.epsg_code = epsg_code
+        self.salt = (seed * 7919) & 0xFFFFFFFF
+        self.enum_values = _get_enum_values()
+        with db.engine.connect() as connection:
+            self.table_names = {
+                name
+                for (name,) in connection.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type='table'"
+                )
+            }
+            self.geometry_columns = self._get_geometry_columns(connection)
+        self.is_geopackage = "gpkg_geometry_columns" in self.table_names
+        self.row_counts = self._resolve_row_counts(row_counts)
+        self.n_nodes = self.get_count("connection_node")
+        self.cols = max(1, math.ceil(math.sqrt(self.n_nodes)))
+        self.channel_nodes = array("l")
+
+    def _get_geometry_columns(self, connection) -> Dict[str, GeometryColumn]:
+        if "gpkg_geometry_columns" in self.table_names:
+            query = (
+                "SELECT table_name, column_name, geometry_type_name, srs_id "
+                "FROM gpkg_geometry_columns"
+            )
+        elif "geometry_columns" in self.table_names:
+            query = (
+                "SELECT f_table_name, f_geometry_column, geometry_type, srid "
+                "FROM geometry_columns"
+            )
+        else:
+            return {}
+        geometry_columns = {}
+        for table, column, geometry_type, srid in connection.exec_driver_sql(query):
+            if isinstance(geometry_type, int):
+                geometry_type = GEOMETRY_TYPES.get(geometry_type % 1000, "POINT")
+            geometry_type = geometry_type.upper()
+            if geometry_type == "GEOMETRY":
+                geometry_type = "POINT"
+            geometry_columns[table.lower()] = GeometryColumn(
+                column, geometry_type, int(srid)
+            )
+        return geometry_columns
+
+    def resolve_table(self, name: str) -> Optional[str]:
+        """The name of a table (as in DECLARED_MODELS) at the current revision"""
+        if name in self.table_names:
+            return name
+        legacy_name = LEGACY_TABLE_NAMES.get(name)
+        if legacy_name in self.table_names:
+            return legacy_name
+        return None
+
+    def _resolve_row_counts(self, row_counts: Dict[str, int]) -> Dict[str, int]:
+        resolved = {}
+        for name, count in row_counts.items():
+            table = self.resolve_table(name)
+            if table is not None:
+                resolved[table] = max(resolved.get(table, 0), count)
+        for table, (source, ratio) in DERIVED_ROW_COUNTS.items():
+            source_count = resolved.get(self.resolve_table(source), 0)
+            if table in self.table_names and table not in resolved and source_count:
+                resolved[table] = max(1, round(source_count * ratio))
+        for table in SETTINGS_TABLES:
+            if table in self.table_names and table not in resolved:
+                resolved[table] = 1
+        return resolved
+
+    def get_count(self, name: str) -> int:
+        return self.row_counts.get(self.resolve_table(name), 0)
+
+    def _get_columns(self, connection, table: str) -> List[Column]:
+        return [
+            Column(name, _get_affinity(type_), bool(notnull), default, bool(pk))
+            for _, name, type_, notnull, default, pk in connection.exec_driver_sql(
+                f'PRAGMA table_info("{table}")'
+            )
+        ]
+
+    def _get_enum_values(self, table: str, column: str) -> Optional[list]:
+        names = [table] + [
+            name for name, legacy in LEGACY_TABLE_NAMES.items() if legacy == table
+        ]
+        for name in names:
+            if (name, column) in self.enum_values:
+                return self.enum_values[(name, column)]
+        return None
+
+    # coordinates
+
+    def node_xy(self, node_id: int):
+        """Location of a connection node in meters, relative to the origin"""
+        i = node_id - 1
+        h = ((node_id + self.salt) * 2654435761) & 0xFFFFFFFF
+        jitter_x = (h & 0xFFFF) / 0xFFFF - 0.5
+        jitter_y = (h >> 16) / 0xFFFF - 0.5
+        return (
+            (i % self.cols + 0.4 * jitter_x) * NODE_SPACING,
+            (i // self.cols + 0.4 * jitter_y) * NODE_SPACING,
+        )
+
+    def neighbour(self, node_id: int, rng) -> int:
+        """A random node next to node_id on the grid"""
+        i = node_id - 1
+        candidates = []
+        if i % self.cols > 0:
+            candidates.append(node_id - 1)
+        if i % self.cols < self.cols - 1 and node_id < self.n_nodes:
+            candidates.append(node_id + 1)
+        if node_id > self.cols:
+            candidates.append(node_id - self.cols)
+        if node_id + self.cols <= self.n_nodes:
+            candidates.append(node_id + self.cols)
+        return rng.choice(candidates) if candidates else node_id
+
+    def random_xy(self, rng):
+        extent = self.cols * NODE_SPACING
+        return rng.uniform(0, extent), rng.uniform(0, extent)
+
+    @staticmethod
+    def to_wkt_coords(points, srid: int) -> str:
+        if srid == 4326:
+            lon0, lat0 = GEOGRAPHIC_ORIGIN
+            scale_x = 111320.0 * math.cos(math.radians(lat0))
+            return ", ".join(
+                f"{lon0 + x / scale_x:.8f} {lat0 + y / 110574.0:.8f}" for x, y in points
+            )
+        x0, y0 = PROJECTED_ORIGIN
+        return ", ".join(f"{x0 + x:.3f} {y0 + y:.3f}" for x, y in points)
+
+    def get_wkt(self, table: str, geometry: GeometryColumn, values: dict, rng) -> str:
+        base_type = geometry.geometry_type.replace("MULTI", "")
+        start = next((values[c] for c in START_COLUMNS if c in values), None)
+        end = next((values[c] for c in END_COLUMNS if c in values), None)
+        node_id = values.get("connection_node_id")
+        if base_type == "LINESTRING":
+            if start and end:
+                (x1, y1), (x2, y2) = self.node_xy(start), self.node_xy(end)
+            else:
+                x1, y1 = self.random_xy(rng)
+                x2, y2 = x1 + rng.uniform(-50, 50), y1 + rng.uniform(-50, 50)
+            n_vertices = 5 if table == self.resolve_table("channel") else 2
+            points = [
+                (
+                    x1 + (x2 - x1) * k / (n_vertices - 1),
+                    y1 + (y2 - y1) * k / (n_vertices - 1),
+                )
+                for k in range(n_vertices)
+            ]
+            for k in range(1, n_vertices - 1):
+                points[k] = (
+                    points[k][0] + rng.uniform(-5, 5),
+                    points[k][1] + rng.uniform(-5, 5),
+                )
+            text = f"({self.to_wkt_coords(points, geometry.srid)})"
+        elif base_type == "POLYGON":
+            if self.n_nodes:
+                x, y = self.node_xy((values["id"] - 1) % self.n_nodes + 1)
+                x, y = x + rng.uniform(5, 15), y + rng.uniform(5, 15)
+            else:
+                x, y = self.random_xy(rng)
+            size = rng.uniform(5, 20)
+            points = [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+            text = f"(({self.to_wkt_coords(points + points[:1], geometry.srid)}))"
+        else:
+            channel_id = values.get("channel_id")
+            if node_id:
+                point = self.node_xy(node_id)
+            elif channel_id and len(self.channel_nodes) >= 2 * channel_id:
+                x1, y1 = self.node_xy(self.channel_nodes[2 * channel_id - 2])
+                x2, y2 = self.node_xy(self.channel_nodes[2 * channel_id - 1])
+                point = ((x1 + x2) / 2, (y1 + y2) / 2)
+            else:
+                point = self.random_xy(rng)
+            text = f"({self.to_wkt_coords([point], geometry.srid)})"
+        if geometry.geometry_type.startswith("MULTI"):
+            text = f"({text})"
+        return f"{geometry.geometry_type}{text}"
+
+    # values
+
+    def _get_value_function(self, table: str, column: Column):
+        """Function (row id, rng, values so far) -> value, or None to skip column"""
+        name = column.name
+        if name == "id" or column.primary_key:
+            return lambda row_id, rng, values: row_id
+        if name in FOREIGN_KEYS:
+            n_ref = self.get_count(FOREIGN_KEYS[name])
+            if not n_ref:
+                return (lambda *args: 1) if column.notnull else None
+            if name in START_COLUMNS:
+                return lambda row_id, rng, values: rng.randint(1, n_ref)
+            if name in END_COLUMNS:
+                return lambda row_id, rng, values: self.neighbour(
+                    next(values[c] for c in START_COLUMNS if c in values), rng
+                )
+            # cycle through the referenced rows, so that 1:1 relations are unique
+            return lambda row_id, rng, values: (row_id - 1) % n_ref + 1
+        if name == "epsg_code":
+            return lambda *args: self.epsg_code
+        if name == "use_0d_inflow":
+            # migrate the impervious surfaces
+            return lambda *args: 1
+        if name.startswith("use_"):
+            return lambda *args: 0
+        if name == "timeseries":
+            return lambda *args: TIMESERIES
+        if name in ("code", "display_name"):
+            return lambda row_id, rng, values: f"{table}-{row_id}"
+        if name == "surface_class":
+            return lambda row_id, rng, values: rng.choice(SURFACE_CLASSES)
+        if name == "surface_inclination":
+            return lambda row_id, rng, values: rng.choice(SURFACE_INCLINATIONS)
+        if name in ("shape", "cross_section_shape"):
+            shapes = [
+                constants.CrossSectionShape.RECTANGLE.value,
+                constants.CrossSectionShape.CIRCLE.value,
+            ]
+            return lambda row_id, rng, values: rng.choice(shapes)
+        if name in ("width", "cross_section_width"):
+            if column.affinity == "text":
+                return lambda row_id, rng, values: f"{rng.uniform(0.3, 5.0):.2f}"
+            return lambda row_id, rng, values: round(rng.uniform(0.3, 5.0), 2)
+        enum_values = self._get_enum_values(table, name)
+        if enum_values:
+            return lambda row_id, rng, values: rng.choice(enum_values)
+        if column.affinity == "float":
+            return lambda row_id, rng, values: round(rng.uniform(0.0, 10.0), 3)
+        if not column.notnull or column.default is not None:
+            return None
+        if column.affinity == "integer":
+            return lambda *args: 1
+        if column.affinity == "boolean":
+            return lambda *args: 0
+        if column.affinity == "date":
+            return lambda *args: "2020-01-01"
+        return lambda row_id, rng, values: f"{name}-{row_id}"
+
+    def fill_table(self, connection, table: str, n_rows: int):
+        # every table has its own random generator, so tables are independent
+        rng = random.Random(f"{self.seed}-{table}")
+        geometry = self.geometry_columns.get(table.lower())
+        functions = [
+            (column.name, function)
+            for column in self._get_columns(connection, table)
+            if geometry is None or column.name != geometry.name
+            for function in [self._get_value_function(table, column)]
+            if function is not None
+        ]
+        names = [name for name, _ in functions]
+        placeholders = ["?"] * len(names)
+        if geometry is not None:
+            names.append(geometry.name)
+            if self.is_geopackage:
+                placeholders.append(f"AsGPB(GeomFromText(?, {geometry.srid}))")
+            else:
+                placeholders.append(f"GeomFromText(?, {geometry.srid})")
+        column_list = ", ".join(f'"{name}"' for name in names)
+        sql = (
+            f'INSERT INTO "{table}" ({column_list}) '
+            f"VALUES ({', '.join(placeholders)})"
+        )
+        is_channel = table == self.resolve_table("channel")
+        batch = []
+        for row_id in range(1, n_rows + 1):
+            values = {"id": row_id}
+            for name, function in functions:
+                values[name] = function(row_id, rng, values)
+            row = [values[name] for name, _ in functions]
+            if is_channel:
+                self.channel_nodes.extend(
+                    [
+                        next((values[c] for c in START_COLUMNS if c in values), 0),
+                        next((values[c] for c in END_COLUMNS if c in values), 0),
+                    ]
+                )
+            if geometry is not None:
+                row.append(self.get_wkt(table, geometry, values, rng))
+            batch.append(tuple(row))
+            if len(batch) == BATCH_SIZE:
+                connection.exec_driver_sql(sql, batch)
+                batch = []
+        if batch:
+            connection.exec_driver_sql(sql, batch)
+
+    def fill(self):
+        # the channels go first, because cross section locations are placed on them
+        channel_table = self.resolve_table("channel")
+        tables = sorted(
+            self.row_counts, key=lambda table: (table != channel_table, table)
+        )
+        with self.db.engine.begin() as connection:
+            for table in tables:
+                self.fill_table(connection, table, self.row_counts[table])
+
+
+def generate_schematisation(
+    path,
+    revision="head",
+    row_counts: Optional[Dict[str, int]] = None,
+    seed: int = 0,
+    epsg_code: int = 28992,
+) -> Path:
+    """Write a synthetic schematisation at the given revision.
+
+    Args:
+        path: the file to create; it must not exist. For revisions after
+          LAST_SPTL_SCHEMA_VERSION a geopackage is written next to it.
+        revision: "head" or a numeric revision, e.g. "0222"
+        row_counts: number of rows per table, as in DECLARED_MODELS. Legacy
+          table names (e.g. "v2_manhole") are accepted as well. Defaults to
+          get_row_counts(1000).
+        seed: the random seed; the same seed produces the same file
+        epsg_code: the CRS of the model
+
+    Returns the path of the schematisation.
+    """
+    path = Path(path)
+    if path.exists():
+        raise FileExistsError(f"{path} already exists")
+    if row_counts is None:
+        row_counts = get_row_counts(1000)
+    rev_nr = _get_revision_number(revision)
+    db = ThreediDatabase(str(path))
+    if rev_nr < 230:
+        _upgrade_database(db, revision=f"{rev_nr:04d}")
+    else:
+        db.schema.upgrade(revision, backup=False, epsg_code_override=epsg_code)
+    db = ThreediDatabase(str(db.path), pragmas=UNSAFE_PRAGMAS)
+    SyntheticSchematisation(db, row_counts, seed=seed, epsg_code=epsg_code).fill()
+    db.engine.dispose()
+    return Path(db.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="The file to create")
+    parser.add_argument("-r", "--revision", default="head")
+    parser.add_argument("-n", "--connection-nodes", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("--epsg-code", type=int, default=28992)
+    args = parser.parse_args()
+    path = generate_schematisation(
+        args.path,
+        revision=args.revision,
+        row_counts=get_row_counts(args.connection_nodes),
+        seed=args.seed,
+        epsg_code=args.epsg_code,
+    )
+    print(f"Created {path}")
+
+
+if __name__ == "__main__":
+    main()
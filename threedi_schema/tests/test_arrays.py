@@ -0,0 +1,73 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from threedi_schema.domain.arrays import (  # NOQA
+    CSVParseError,
+    parse_csv_string,
+    parse_csv_strings,
+    parse_csv_table,
+    parse_csv_tables,
+)
+
+
+@pytest.mark.parametrize("value", ["1,2,3", " 1, 2 ,3\n", "1.0,2e0,3"])
+def test_parse_csv_string(value):
+    assert parse_csv_string(value).tolist() == [1.0, 2.0, 3.0]
+
+
+@pytest.mark.parametrize("value", ["0,1\n2,3", "0, 1\r\n2,3\n", "\n0,1\n 2 ,3"])
+def test_parse_csv_table(value):
+    assert parse_csv_table(value).tolist() == [[0.0, 1.0], [2.0, 3.0]]
+
+
+def test_parse_csv_table_memoised():
+    array = parse_csv_table("0,1\n2,3")
+    assert parse_csv_table("0,1\n2,3") is array
+    assert not array.flags.writeable
+
+
+@pytest.mark.parametrize("value", ["0,1\n2", "0,1\n2,3,4\n5", "0,x"])
+def test_parse_csv_table_error(value):
+    with pytest.raises(CSVParseError):
+        parse_csv_table(value)
+
+
+def test_parse_csv_strings():
+    result = parse_csv_strings(["1,2", None, "", "3"])
+    assert result.values.tolist() == [1.0, 2.0, 3.0]
+    assert result.offsets.tolist() == [0, 2, 2, 2, 3]
+    assert len(result) == 4
+    assert result[3].tolist() == [3.0]
+
+
+def test_parse_csv_tables():
+    result = parse_csv_tables(["0,1\n2,3", None, "4,5"])
+    assert result.values.tolist() == [[0.0, 1.0], [2.0, 3.0], [4.0, 5.0]]
+    assert result.offsets.tolist() == [0, 2, 2, 3]
+    assert result[0].tolist() == [[0.0, 1.0], [2.0, 3.0]]
+    assert result[1].shape == (0, 2)
+
+
+def test_parse_csv_tables_empty():
+    assert parse_csv_tables([None], ncols=2).values.shape == (0, 2)
+
+
+@pytest.mark.parametrize(
+    "values, index",
+    [
+        (["0,1", "2,3\n4"], 1),
+        (["0,1", None, "2,x"], 2),
+        (["0,1,2"], 0),
+    ],
+)
+def test_parse_csv_tables_error(values, index):
+    with pytest.raises(CSVParseError, match=f"row {index}: ") as e:
+        parse_csv_tables(values, ncols=2)
+    assert e.value.index == index
+
+
+def test_parse_csv_strings_error():
+    with pytest.raises(CSVParseError, match="row 1: ") as e:
+        parse_csv_strings(["1,2", "3,,4"])
+    assert e.value.index == 1
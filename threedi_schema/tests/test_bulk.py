@@ -0,0 +1,243 @@
+import pytest
+from sqlalchemy import text
+
+np = pytest.importorskip("numpy")
+
+from threedi_schema.application.bulk import (  # NOQA
+    load_batches,
+    read_table,
+    read_timeseries,
+)
+from threedi_schema.domain import constants, models  # NOQA
+from threedi_schema.domain.arrays import CSVParseError  # NOQA
+from threedi_schema.tests.test_gpkg_decode import linestring, point  # NOQA
+
+
+@pytest.fixture
+def lateral_1d(in_memory_sqlite):
+    def create(*timeseries):
+        with in_memory_sqlite.get_engine().begin() as connection:
+            connection.execute(
+                text(
+                    "CREATE TABLE lateral_1d (id INTEGER PRIMARY KEY, timeseries TEXT)"
+                )
+            )
+            for i, value in enumerate(timeseries):
+                connection.execute(
+                    text("INSERT INTO lateral_1d VALUES (:id, :timeseries)"),
+                    {"id": 10 * (i + 1), "timeseries": value},
+                )
+        return in_memory_sqlite
+
+    return create
+
+
+def test_read_timeseries(lateral_1d):
+    db = lateral_1d("0,1.0\n60,2.0", None, "0, 3.0\r\n30,4.0\n90 ,5.0\n")
+    result = read_timeseries(db, models.Lateral1D)
+    assert result.ids.tolist() == [10, 20, 30]
+    assert result.offsets.tolist() == [0, 2, 2, 5]
+    assert result.time.tolist() == [0, 60, 0, 30, 90]
+    assert result.value.tolist() == [1, 2, 3, 4, 5]
+    time, value = result[2]
+    assert time.tolist() == [0, 30, 90]
+    assert value.tolist() == [3, 4, 5]
+
+
+def test_read_timeseries_empty_table(lateral_1d):
+    result = read_timeseries(lateral_1d(), models.Lateral1D)
+    assert len(result) == 0
+    assert result.time.shape == (0,)
+
+
+@pytest.mark.parametrize(
+    "timeseries, message",
+    [
+        ("0,1\n60", "expected 2 values"),
+        ("0,1\n60,x", "could not convert"),
+        ("0,1,2", "expected 2 values"),
+        ("0,1\n0,2", "the times are not increasing"),
+    ],
+)
+def test_read_timeseries_error(lateral_1d, timeseries, message):
+    db = lateral_1d("0,1\n60,2", timeseries)
+    with pytest.raises(
+        CSVParseError, match=f"timeseries of lateral_1d with id 20: {message}"
+    ):
+        read_timeseries(db, models.Lateral1D)
+
+
+def test_read_timeseries_no_validation(lateral_1d):
+    db = lateral_1d("0,1\n0,2")
+    assert read_timeseries(db, models.Lateral1D, validate=False).time.tolist() == [
+        0,
+        0,
+    ]
+
+
+@pytest.fixture
+def channel(in_memory_sqlite):
+    columns = [column.name for column in models.Channel.__table__.columns]
+    with in_memory_sqlite.get_engine().begin() as connection:
+        connection.execute(text(f"CREATE TABLE channel ({', '.join(columns)})"))
+        connection.execute(
+            text(
+                "INSERT INTO channel (id, code, exchange_type, "
+                "calculation_point_distance, geom) VALUES (:id, :code, "
+                ":exchange_type, :calculation_point_distance, :geom)"
+            ),
+            [
+                {
+                    "id": i,
+                    "code": f"channel-{i}",
+                    "exchange_type": 101 if i % 2 else None,
+                    "calculation_point_distance": 10.0 if i % 2 else None,
+                    "geom": linestring((i, 0), (i, 1)),
+                }
+                for i in range(1, 6)
+            ],
+        )
+    return in_memory_sqlite
+
+
+def test_read_table(channel):
+    batches = list(read_table(channel, models.Channel, batch_size=2))
+    assert [len(batch["id"]) for batch in batches] == [2, 2, 1]
+    batch = batches[0]
+    assert batch.keys() == {column.name for column in models.Channel.__table__.columns}
+    assert batch["id"].tolist() == [1, 2]
+    assert batch["code"].tolist() == ["channel-1", "channel-2"]
+    assert batch["exchange_type"].tolist() == [
+        constants.CalculationType.STANDALONE.value,
+        None,
+    ]
+    assert batch["calculation_point_distance"][0] == 10.0
+    assert np.isnan(batch["calculation_point_distance"][1])
+    assert batch["geom"].x.tolist() == [1, 1, 2, 2]
+    assert batch["geom"].offsets[0].tolist() == [0, 2, 4]
+
+
+def test_read_table_empty(channel):
+    with channel.get_engine().begin() as connection:
+        connection.execute(text("DELETE FROM channel"))
+    assert list(read_table(channel, models.Channel)) == []
+
+
+def channel_batch(ids, **columns):
+    return {
+        "id": np.array(ids),
+        "code": [f"channel-{i}" for i in ids],
+        "exchange_type": np.ma.MaskedArray(
+            [101] * len(ids), mask=[i % 2 == 0 for i in ids]
+        ),
+        "geom": [linestring((i, 0), (i, 1)) for i in ids],
+        **columns,
+    }
+
+
+def test_load_batches(channel):
+    result = load_batches(
+        channel,
+        [
+            (models.Channel, channel_batch([6, 7])),
+            (models.Channel, channel_batch([])),
+            (models.Channel, channel_batch([8])),
+        ],
+    )
+    assert result == {"channel": 3}
+    (batch,) = read_table(channel, models.Channel)
+    assert batch["id"].tolist() == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert batch["code"][5:].tolist() == ["channel-6", "channel-7", "channel-8"]
+    assert batch["exchange_type"][5:].tolist() == [None, 101, None]
+    assert batch["geom"].x[-2:].tolist() == [8, 8]
+
+
+def test_bulk_load(channel):
+    assert channel.bulk_load([(models.Channel, channel_batch([6]))]) == {"channel": 1}
+
+
+@pytest.mark.parametrize(
+    "batch,message",
+    [
+        (channel_batch([6, 7], exchange_type=[101, 3]), "exchange_type: row 1: 3 is"),
+        (channel_batch([6], geom=[point(0, 0)]), "expected a LINESTRING, got a POINT"),
+        (channel_batch([6], geom=[b"XX"]), "channel.geom: not a GeoPackage"),
+        (channel_batch([6], unknown=[1]), "has no columns unknown"),
+        (channel_batch([6], code=["a", "b"]), "differ in length"),
+    ],
+)
+def test_load_batches_invalid(channel, batch, message):
+    with pytest.raises(ValueError, match=message):
+        load_batches(
+            channel, [(models.Channel, channel_batch([9])), (models.Channel, batch)]
+        )
+    # all batches are inserted in one transaction
+    (batch,) = read_table(channel, models.Channel)
+    assert len(batch["id"]) == 5
+
+
+def get_names(connection, type):
+    return {
+        row[0]
+        for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = :type"), {"type": type}
+        )
+    }
+
+
+def test_load_batches_invalid_keeps_spatial_index(channel):
+    # a geopackage R-tree index, without spatialite
+    with channel.get_engine().begin() as connection:
+        connection.execute(
+            text(
+                "CREATE VIRTUAL TABLE rtree_channel_geom "
+                "USING rtree(id, minx, maxx, miny, maxy)"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE TRIGGER rtree_channel_geom_insert AFTER INSERT ON channel "
+                "BEGIN INSERT INTO rtree_channel_geom VALUES (NEW.id, 0, 0, 0, 0); END"
+            )
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE gpkg_extensions (table_name TEXT, column_name TEXT, "
+                "extension_name TEXT)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO gpkg_extensions VALUES "
+                "('channel', 'geom', 'gpkg_rtree_index')"
+            )
+        )
+    with pytest.raises(ValueError, match="has no columns unknown"):
+        load_batches(
+            channel,
+            [
+                (models.Channel, channel_batch([9])),
+                (models.Channel, channel_batch([10], unknown=[1])),
+            ],
+        )
+    with channel.get_engine().connect() as connection:
+        assert "rtree_channel_geom" in get_names(connection, "table")
+        assert "rtree_channel_geom_insert" in get_names(connection, "trigger")
+        assert (
+            connection.execute(text("SELECT count(*) FROM gpkg_extensions")).scalar()
+            == 1
+        )
+        assert connection.execute(text("SELECT count(*) FROM channel")).scalar() == 5
+
+
+def test_load_batches_spatial_index(sqlite_latest):
+    batch = {
+        "id": np.arange(1, 4),
+        "geom": [point(i, i) for i in range(3)],
+    }
+    sqlite_latest.bulk_load([(models.ConnectionNode, batch)])
+    with sqlite_latest.get_engine().connect() as connection:
+        count = connection.execute(
+            text("SELECT count(*) FROM rtree_connection_node_geom")
+        ).scalar()
+    assert count == 3
@@ -0,0 +1,126 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from threedi_schema.application.changelog import (
+    Change,
+    compact_changelog,
+    get_changes,
+    get_last_sequence,
+    install_changelog,
+    remove_changelog,
+)
+from threedi_schema.application.errors import ChangelogIncompleteError
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(
+            text("CREATE TABLE pipe (id INTEGER PRIMARY KEY, code TEXT)")
+        )
+        connection.execute(
+            text("CREATE TABLE weir (id INTEGER PRIMARY KEY, code TEXT)")
+        )
+        connection.execute(text("INSERT INTO pipe VALUES (1, 'a'), (2, 'b')"))
+        install_changelog(connection, ["pipe", "weir", "missing"])
+        yield connection
+
+
+def test_get_changes(connection):
+    assert get_changes(connection) == []
+    assert get_last_sequence(connection) == 0
+    connection.execute(text("INSERT INTO weir VALUES (1, 'a')"))
+    connection.execute(text("UPDATE pipe SET code = 'c' WHERE id = 2"))
+    connection.execute(text("DELETE FROM pipe WHERE id = 1"))
+    assert get_changes(connection) == [
+        Change(1, "weir", 1, "insert"),
+        Change(2, "pipe", 2, "update"),
+        Change(3, "pipe", 1, "delete"),
+    ]
+    assert get_last_sequence(connection) == 3
+    assert get_changes(connection, since=2) == [Change(3, "pipe", 1, "delete")]
+    assert get_changes(connection, table_names=["weir"]) == [
+        Change(1, "weir", 1, "insert")
+    ]
+
+
+def test_update_id(connection):
+    connection.execute(text("UPDATE pipe SET id = 3 WHERE id = 2"))
+    assert get_changes(connection) == [
+        Change(1, "pipe", 2, "delete"),
+        Change(2, "pipe", 3, "insert"),
+    ]
+
+
+def test_install_again(connection):
+    connection.execute(text("DELETE FROM pipe WHERE id = 1"))
+    install_changelog(connection, ["pipe", "weir"])
+    assert get_changes(connection) == [Change(1, "pipe", 1, "delete")]
+
+
+@pytest.mark.parametrize(
+    "statements,expected",
+    [
+        (["UPDATE pipe SET code = 'c' WHERE id = 1"] * 2, "update"),
+        (
+            ["INSERT INTO pipe VALUES (3, 'c')", "UPDATE pipe SET code = 'd'"],
+            "insert",
+        ),
+        (["UPDATE pipe SET code = 'd'", "DELETE FROM pipe"], "delete"),
+        (["DELETE FROM pipe", "INSERT INTO pipe VALUES (1, 'a')"], "update"),
+    ],
+)
+def test_compact_changelog(connection, statements, expected):
+    for statement in statements:
+        connection.execute(text(statement))
+    last = get_changes(connection)[-1]
+    compact_changelog(connection)
+    changes = get_changes(connection)
+    assert Change(last.sequence, "pipe", last.row_id, expected) in changes
+    assert len(changes) == len({(c.table_name, c.row_id) for c in changes})
+
+
+def test_compact_changelog_until(connection):
+    connection.execute(text("UPDATE pipe SET code = 'c' WHERE id = 1"))
+    connection.execute(text("UPDATE pipe SET code = 'd' WHERE id = 2"))
+    compact_changelog(connection, until=1)
+    assert get_changes(connection) == [Change(2, "pipe", 2, "update")]
+    # sequence numbers are not reused
+    compact_changelog(connection, until=2)
+    connection.execute(text("DELETE FROM pipe WHERE id = 1"))
+    assert get_changes(connection) == [Change(3, "pipe", 1, "delete")]
+
+
+def test_coexists_with_other_triggers(connection):
+    connection.execute(text("CREATE TABLE other_log (id INTEGER)"))
+    connection.execute(
+        text(
+            "CREATE TRIGGER rtree_pipe_geom_insert AFTER INSERT ON pipe "
+            "BEGIN INSERT INTO other_log VALUES (NEW.id); END"
+        )
+    )
+    connection.execute(text("INSERT INTO pipe VALUES (3, 'c')"))
+    assert get_changes(connection) == [Change(1, "pipe", 3, "insert")]
+    assert connection.execute(text("SELECT id FROM other_log")).scalars().all() == [3]
+
+
+def test_table_recreated(connection):
+    # a migration that recreates a table drops its triggers
+    connection.execute(text("CREATE TABLE tmp (id INTEGER PRIMARY KEY, code TEXT)"))
+    connection.execute(text("INSERT INTO tmp SELECT * FROM pipe"))
+    connection.execute(text("DROP TABLE pipe"))
+    connection.execute(text("ALTER TABLE tmp RENAME TO pipe"))
+    with pytest.raises(ChangelogIncompleteError, match="pipe"):
+        get_changes(connection)
+    install_changelog(connection, ["pipe"])
+    assert get_changes(connection) == []
+
+
+def test_remove_changelog(connection):
+    remove_changelog(connection)
+    assert not connection.execute(
+        text("SELECT name FROM sqlite_master WHERE name LIKE 'threedi_%'")
+    ).fetchall()
+    with pytest.raises(ChangelogIncompleteError):
+        get_changes(connection)
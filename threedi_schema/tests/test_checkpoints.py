@@ -0,0 +1,111 @@
+from unittest import mock
+
+import pytest
+
+from threedi_schema.application import schema as schema_module
+from threedi_schema.application.checkpoints import (
+    file_sha256,
+    get_checkpoint_revisions,
+    UpgradeCheckpoints,
+)
+
+
+@pytest.fixture
+def work_file(tmp_path):
+    path = tmp_path / "work.sqlite"
+    path.write_bytes(b"some database content")
+    return path
+
+
+def test_get_checkpoint_revisions():
+    steps = ["0222", "0223", "0224", "0227", "0228", "0229"]
+    assert get_checkpoint_revisions(steps) == ["0223", "0224", "0228", "0229"]
+
+
+def test_get_checkpoint_revisions_empty():
+    assert get_checkpoint_revisions([]) == []
+
+
+def test_checkpoints_save_and_latest(tmp_path, work_file):
+    checkpoints = UpgradeCheckpoints(tmp_path / "checkpoints", "abc")
+    assert checkpoints.latest() is None
+    checkpoints.save(work_file, "0223")
+    checkpoint = checkpoints.save(work_file, "0228")
+    assert checkpoints.latest() == checkpoint
+    assert checkpoint.revision == "0228"
+    assert file_sha256(checkpoint.path) == file_sha256(work_file)
+    # only the latest checkpoint is kept
+    assert len(list((tmp_path / "checkpoints").glob("*.checkpoint"))) == 1
+
+
+def test_checkpoints_corrupt(tmp_path, work_file):
+    checkpoints = UpgradeCheckpoints(tmp_path, "abc")
+    checkpoint = checkpoints.save(work_file, "0223")
+    checkpoint.path.write_bytes(b"truncated")
+    assert checkpoints.latest() is None
+
+
+def test_checkpoints_other_source(tmp_path, work_file):
+    UpgradeCheckpoints(tmp_path, "abc").save(work_file, "0223")
+    assert UpgradeCheckpoints(tmp_path, "def").latest() is None
+
+
+def test_checkpoints_clear(tmp_path, work_file):
+    checkpoints = UpgradeCheckpoints(tmp_path, "abc")
+    checkpoints.save(work_file, "0223")
+    checkpoints.clear()
+    assert checkpoints.latest() is None
+    assert list(tmp_path.glob(f"{checkpoints.key}*")) == []
+
+
+def test_checkpoints_other_options(tmp_path, work_file):
+    options = {"pragmas": {"synchronous": "OFF"}}
+    UpgradeCheckpoints(tmp_path, "abc", options).save(work_file, "0228")
+    assert UpgradeCheckpoints(tmp_path, "abc", {"pragmas": None}).latest() is None
+    assert UpgradeCheckpoints(tmp_path, "abc", options).latest() is not None
+
+
+def test_upgrade_checkpoint_requires_backup(oldest_sqlite, tmp_path):
+    with pytest.raises(ValueError):
+        oldest_sqlite.schema.upgrade(
+            revision="0229", backup=False, checkpoint_dir=tmp_path
+        )
+
+
+def test_upgrade_resume_from_checkpoint(oldest_sqlite, tmp_path):
+    schema = oldest_sqlite.schema
+    checkpoint_dir = tmp_path / "checkpoints"
+    upgrade_database = schema_module._upgrade_database
+
+    def crash_after_0223(db, revision, **kwargs):
+        if int(revision) > 223:
+            raise RuntimeError("Out of memory")
+        upgrade_database(db, revision=revision, **kwargs)
+
+    with mock.patch.object(
+        schema_module, "_upgrade_database", side_effect=crash_after_0223
+    ):
+        with pytest.raises(RuntimeError):
+            schema.upgrade(revision="0229", checkpoint_dir=checkpoint_dir)
+    # the original file is untouched, the checkpoint is at 0223
+    assert schema.get_version() < 200
+    checkpoints = UpgradeCheckpoints.for_file(
+        checkpoint_dir,
+        oldest_sqlite.path,
+        {"pragmas": schema_module.UNSAFE_PRAGMAS},
+    )
+    assert checkpoints.latest().revision == "0223"
+
+    revisions = []
+
+    def record_revision(db, revision, **kwargs):
+        revisions.append(revision)
+        upgrade_database(db, revision=revision, **kwargs)
+
+    with mock.patch.object(
+        schema_module, "_upgrade_database", side_effect=record_revision
+    ):
+        schema.upgrade(revision="0229", checkpoint_dir=checkpoint_dir)
+    assert revisions == ["0224", "0225", "0226", "0228", "0229"]
+    assert schema.get_version() == 229
+    assert list(checkpoint_dir.iterdir()) == []
@@ -1,13 +1,26 @@
 import pytest
-from sqlalchemy import Column, create_engine, func, Integer
+from sqlalchemy import (
+    Column,
+    create_engine,
+    func,
+    insert,
+    Integer,
+    MetaData,
+    select,
+    Table,
+    type_coerce,
+)
 from sqlalchemy.event import listen
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from threedi_schema.application.threedi_database import load_spatialite
+from threedi_schema.domain import constants, models
 from threedi_schema.domain.custom_types import (
     clean_csv_string,
     clean_csv_table,
     Geometry,
+    IntegerEnum,
+    VarcharEnum,
 )
 
 
@@ -86,3 +99,74 @@ def test_geometry_type_from_text(from_text):
         session.commit()
     finally:
         session.close()
+
+
+def test_geometry_cache_key():
+    key = Geometry("POINT")._static_cache_key
+    assert key == Geometry("POINT")._static_cache_key
+    assert hash(key) == hash(Geometry("POINT")._static_cache_key)
+    assert key != Geometry("LINESTRING")._static_cache_key
+    assert key != Geometry("POINT", from_text="ST_GeomFromEWKT")._static_cache_key
+
+
+def test_geometry_statement_is_cacheable():
+    assert select(models.Channel)._generate_cache_key() is not None
+
+
+@pytest.fixture
+def enum_table():
+    engine = create_engine("sqlite://")
+    table = Table(
+        "enum_table",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("shape", IntegerEnum(constants.CrossSectionShape)),
+        Column("control", VarcharEnum(constants.ControlType)),
+    )
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(table),
+            [
+                {
+                    "shape": constants.CrossSectionShape.CIRCLE,
+                    "control": constants.ControlType.table,
+                },
+                {"shape": 99, "control": "unknown"},
+                {"shape": None, "control": None},
+            ],
+        )
+    with engine.connect() as connection:
+        yield connection, table
+
+
+def test_enum_round_trip(enum_table):
+    connection, table = enum_table
+    rows = connection.execute(
+        select(table.c.shape, table.c.control).order_by(table.c.id)
+    ).fetchall()
+    # values that are not in the enum are returned as is
+    assert rows == [
+        (constants.CrossSectionShape.CIRCLE, constants.ControlType.table),
+        (99, "unknown"),
+        (None, None),
+    ]
+
+
+def test_enum_bind(enum_table):
+    connection, table = enum_table
+    assert connection.execute(
+        select(table.c.id).where(table.c.shape == constants.CrossSectionShape.CIRCLE)
+    ).fetchall() == [(1,)]
+
+
+def test_enum_decode_many(enum_table):
+    connection, table = enum_table
+    raw = connection.execute(
+        select(type_coerce(table.c.shape, Integer)).order_by(table.c.id)
+    ).scalars()
+    assert table.c.shape.type.decode_many(raw) == [
+        constants.CrossSectionShape.CIRCLE,
+        99,
+        None,
+    ]
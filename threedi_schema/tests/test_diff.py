@@ -0,0 +1,171 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import event, text
+
+np = pytest.importorskip("numpy")
+
+from threedi_schema import ThreediDatabase  # NOQA
+from threedi_schema.application.diff import (  # NOQA
+    apply_patch,
+    diff_databases,
+    TableDiff,
+)
+from threedi_schema.domain import constants  # NOQA
+from threedi_schema.tests.test_gpkg_decode import point  # NOQA
+
+
+def create_database(path, rows, version="0302"):
+    db = ThreediDatabase(path)
+    with db.get_engine().begin() as connection:
+        connection.execute(
+            text(f"CREATE TABLE {constants.VERSION_TABLE_NAME} (version_num TEXT)")
+        )
+        connection.execute(
+            text(f"INSERT INTO {constants.VERSION_TABLE_NAME} VALUES ('{version}')")
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE connection_node "
+                "(id INTEGER PRIMARY KEY, code TEXT, bottom_level REAL, geom BLOB)"
+            )
+        )
+        connection.execute(
+            text("CREATE TABLE pipe (id INTEGER PRIMARY KEY, code TEXT)")
+        )
+        for row in rows:
+            connection.execute(
+                text("INSERT INTO connection_node VALUES (:id, :code, :level, :geom)"),
+                row,
+            )
+    return db
+
+
+def node(id, code="a", level=1.0, x=0.0, y=0.0):
+    return {"id": id, "code": code, "level": level, "geom": point(x, y)}
+
+
+@pytest.fixture
+def databases(tmp_path):
+    db = create_database(
+        tmp_path / "a.gpkg", [node(1), node(2), node(3), node(4), node(5)]
+    )
+    other = create_database(
+        tmp_path / "b.gpkg",
+        [
+            node(1),
+            node(2, code="b"),
+            node(3, x=0.001),
+            node(4, level=None, x=5.0),
+            node(6),
+        ],
+    )
+    return db, other
+
+
+def test_diff_databases(databases):
+    db, other = databases
+    assert diff_databases(db, other, tolerance=0.01) == [
+        TableDiff(
+            "connection_node",
+            added=[6],
+            removed=[5],
+            modified={
+                2: {"code": ("a", "b")},
+                4: {"bottom_level": (1.0, None), "geom": (point(0, 0), point(5, 0))},
+            },
+        )
+    ]
+    # without tolerance, node 3 was moved
+    assert 3 in diff_databases(db, other)[0].modified
+
+
+def test_diff_databases_equal(databases):
+    db, _ = databases
+    assert diff_databases(db, db) == []
+
+
+def test_diff_databases_column_order(databases, tmp_path):
+    db, _ = databases
+    other = ThreediDatabase(tmp_path / "c.gpkg")
+    with other.get_engine().begin() as connection:
+        connection.execute(
+            text(f"CREATE TABLE {constants.VERSION_TABLE_NAME} (version_num TEXT)")
+        )
+        connection.execute(
+            text(f"INSERT INTO {constants.VERSION_TABLE_NAME} VALUES ('0302')")
+        )
+        connection.execute(
+            text(
+                "CREATE TABLE connection_node "
+                "(geom BLOB, bottom_level REAL, code TEXT, id INTEGER PRIMARY KEY)"
+            )
+        )
+        connection.execute(
+            text("CREATE TABLE pipe (id INTEGER PRIMARY KEY, code TEXT)")
+        )
+        for row in [node(1), node(2), node(3), node(4), node(5, code="b")]:
+            connection.execute(
+                text(
+                    "INSERT INTO connection_node (id, code, bottom_level, geom) "
+                    "VALUES (:id, :code, :level, :geom)"
+                ),
+                row,
+            )
+    assert diff_databases(db, other) == [
+        TableDiff("connection_node", [], [], {5: {"code": ("a", "b")}})
+    ]
+
+
+def test_diff_databases_error(databases, monkeypatch):
+    db, other = databases
+
+    def fail(*args):
+        raise RuntimeError("failed")
+
+    def fail_detach(conn, cursor, statement, *args):
+        if statement.startswith("DETACH"):
+            raise sqlite3.OperationalError("database other is locked")
+
+    engine = db.get_engine()
+    event.listen(engine, "before_cursor_execute", fail_detach)
+    try:
+        # the failing DETACH does not hide the error
+        with monkeypatch.context() as m:
+            m.setattr("threedi_schema.application.diff._diff_rows", fail)
+            with pytest.raises(RuntimeError, match="failed"):
+                diff_databases(db, other, batch_size=1)
+    finally:
+        event.remove(engine, "before_cursor_execute", fail_detach)
+    assert len(diff_databases(db, other)) == 1
+
+
+def test_diff_databases_other_revision(databases, tmp_path):
+    db, _ = databases
+    other = create_database(tmp_path / "c.gpkg", [], version="0301")
+    with pytest.raises(ValueError, match="different revisions"):
+        diff_databases(db, other)
+
+
+def test_apply_patch(databases, tmp_path):
+    db, other = databases
+    patch_path = tmp_path / "patch.jsonl.gz"
+    diff_databases(db, other, patch_path=patch_path, batch_size=2)
+    apply_patch(db, patch_path)
+    assert diff_databases(db, other) == []
+
+
+def test_apply_patch_does_not_apply(databases, tmp_path):
+    db, other = databases
+    patch_path = tmp_path / "patch.jsonl.gz"
+    diff_databases(db, other, patch_path=patch_path)
+    with db.get_engine().begin() as connection:
+        connection.execute(text("DELETE FROM connection_node WHERE id = 5"))
+    with pytest.raises(ValueError, match="do not exist"):
+        apply_patch(db, patch_path)
+    # the patch is applied in one transaction
+    with db.get_engine().connect() as connection:
+        codes = connection.execute(
+            text("SELECT code FROM connection_node ORDER BY id")
+        ).scalars()
+        assert list(codes) == ["a", "a", "a", "a"]
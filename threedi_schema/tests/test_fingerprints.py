@@ -0,0 +1,125 @@
+from unittest import mock
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from threedi_schema.application import fingerprints
+from threedi_schema.application.fingerprints import (
+    get_fingerprints,
+    install_change_counters,
+    remove_change_counters,
+)
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(
+            text("CREATE TABLE pipe (id INTEGER PRIMARY KEY, code TEXT)")
+        )
+        connection.execute(
+            text("CREATE TABLE weir (id INTEGER PRIMARY KEY, code TEXT)")
+        )
+        connection.execute(text("INSERT INTO pipe VALUES (1, 'a'), (2, 'b')"))
+        yield connection
+
+
+def test_fingerprints(connection):
+    result = get_fingerprints(connection, ["pipe", "weir", "missing"])
+    assert result.keys() == {"pipe", "weir"}
+    assert result["pipe"] != result["weir"]
+    assert get_fingerprints(connection, ["pipe"]) == {"pipe": result["pipe"]}
+
+
+def test_fingerprint_independent_of_storage(connection):
+    before = get_fingerprints(connection, ["pipe"])
+    # rebuild the table with the columns in another order and rows inserted in
+    # another order
+    connection.execute(text("CREATE TABLE copy (code TEXT, id INTEGER PRIMARY KEY)"))
+    connection.execute(
+        text("INSERT INTO copy (id, code) SELECT id, code FROM pipe ORDER BY id DESC")
+    )
+    connection.execute(text("DROP TABLE pipe"))
+    connection.execute(text("ALTER TABLE copy RENAME TO pipe"))
+    assert get_fingerprints(connection, ["pipe"]) == before
+
+
+def test_fingerprint_changes(connection):
+    before = get_fingerprints(connection, ["pipe", "weir"])
+    connection.execute(text("UPDATE pipe SET code = 'c' WHERE id = 2"))
+    after = get_fingerprints(connection, ["pipe", "weir"])
+    assert after["pipe"] != before["pipe"]
+    assert after["weir"] == before["weir"]
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        "UPDATE pipe SET code = 'c' WHERE id = 2",
+        "INSERT INTO pipe VALUES (3, 'c')",
+        "DELETE FROM pipe WHERE id = 1",
+    ],
+)
+def test_change_counters(connection, statement):
+    install_change_counters(connection, ["pipe", "weir", "missing"])
+    before = get_fingerprints(connection, ["pipe", "weir"])
+    with mock.patch.object(
+        fingerprints,
+        "compute_fingerprint",
+        wraps=fingerprints.compute_fingerprint,
+    ) as compute_fingerprint:
+        assert get_fingerprints(connection, ["pipe", "weir"]) == before
+        assert not compute_fingerprint.called
+        connection.execute(text(statement))
+        after = get_fingerprints(connection, ["pipe", "weir"])
+        # only the changed table is hashed again
+        compute_fingerprint.assert_called_once_with(connection, "pipe")
+    assert after["pipe"] != before["pipe"]
+    assert after["weir"] == before["weir"]
+
+
+def test_change_counters_trigger_removed(connection):
+    install_change_counters(connection, ["pipe"])
+    before = get_fingerprints(connection, ["pipe"])
+    # e.g. a migration recreates the table without the triggers
+    connection.execute(text("DROP TRIGGER threedi_changes_pipe_update"))
+    connection.execute(text("UPDATE pipe SET code = 'c' WHERE id = 2"))
+    assert get_fingerprints(connection, ["pipe"]) != before
+
+
+def test_column_fingerprints(connection):
+    columns = {"pipe": ["id"]}
+    before = get_fingerprints(connection, ["pipe", "weir"], columns)
+    assert before["pipe"] != get_fingerprints(connection, ["pipe"])["pipe"]
+    connection.execute(text("UPDATE pipe SET code = 'c' WHERE id = 2"))
+    assert get_fingerprints(connection, ["pipe", "weir"], columns) == before
+    connection.execute(text("INSERT INTO pipe VALUES (3, 'c')"))
+    assert get_fingerprints(connection, ["pipe"], columns) != before
+
+
+def test_column_fingerprints_change_counters(connection):
+    install_change_counters(connection, ["pipe"])
+    columns = {"pipe": ["id"]}
+    before = get_fingerprints(connection, ["pipe"], columns)
+    # the fingerprint of all columns is stored separately
+    full = get_fingerprints(connection, ["pipe"])
+    with mock.patch.object(
+        fingerprints,
+        "compute_fingerprint",
+        wraps=fingerprints.compute_fingerprint,
+    ) as compute_fingerprint:
+        assert get_fingerprints(connection, ["pipe"], columns) == before
+        assert get_fingerprints(connection, ["pipe"]) == full
+        assert not compute_fingerprint.called
+        connection.execute(text("UPDATE pipe SET code = 'c' WHERE id = 2"))
+        assert get_fingerprints(connection, ["pipe"], columns) == before
+        compute_fingerprint.assert_called_once_with(connection, "pipe", columns=["id"])
+
+
+def test_remove_change_counters(connection):
+    install_change_counters(connection, ["pipe"])
+    remove_change_counters(connection)
+    assert not connection.execute(
+        text("SELECT name FROM sqlite_master WHERE name LIKE 'threedi_%'")
+    ).fetchall()
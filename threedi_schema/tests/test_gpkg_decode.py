@@ -0,0 +1,193 @@
+import struct
+from unittest import mock
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from threedi_schema.domain import gpkg  # NOQA
+from threedi_schema.domain.gpkg import (  # NOQA
+    decode_bounds,
+    decode_geometries,
+    decode_geometry_types,
+    geometries_equal,
+    GeometryDecodeError,
+)
+
+
+def gpkg_blob(wkb, envelope=b"", byte_order=1):
+    indicator = {0: 0, 32: 1, 48: 2, 64: 4}[len(envelope)]
+    return (
+        b"GP\x00"
+        + bytes([indicator << 1 | byte_order])
+        + b"\x00\x00\x00\x00"
+        + envelope
+        + wkb
+    )
+
+
+def point(x, y):
+    return gpkg_blob(struct.pack("<BIdd", 1, 1, x, y))
+
+
+def linestring(*coords, wkb_type=2):
+    values = [value for coord in coords for value in coord]
+    return gpkg_blob(
+        struct.pack(f"<BII{len(values)}d", 1, wkb_type, len(coords), *values)
+    )
+
+
+def polygon(*rings):
+    wkb = struct.pack("<BII", 1, 3, len(rings))
+    for ring in rings:
+        values = [value for coord in ring for value in coord]
+        wkb += struct.pack(f"<I{len(values)}d", len(ring), *values)
+    return gpkg_blob(wkb)
+
+
+def test_decode_points():
+    result = decode_geometries([point(1, 2), None, point(3, 4)], "POINT")
+    assert result.x.tolist()[::2] == [1, 3]
+    assert result.y.tolist()[::2] == [2, 4]
+    assert np.isnan(result.x[1])
+    assert len(result) == 3
+
+
+def test_decode_point_with_envelope_big_endian():
+    envelope = struct.pack(">4d", 5, 5, 6, 6)
+    blob = gpkg_blob(struct.pack(">BIdd", 0, 1, 5, 6), envelope, byte_order=0)
+    result = decode_geometries([blob], "POINT")
+    assert (result.x.tolist(), result.y.tolist()) == ([5], [6])
+
+
+def test_decode_linestrings():
+    blobs = [linestring((0, 1), (2, 3)), None, linestring((4, 5), (6, 7), (8, 9))]
+    result = decode_geometries(blobs, "LINESTRING")
+    assert result.x.tolist() == [0, 2, 4, 6, 8]
+    assert result.y.tolist() == [1, 3, 5, 7, 9]
+    assert [offsets.tolist() for offsets in result.offsets] == [[0, 2, 2, 5]]
+    assert len(result) == 3
+
+
+def test_decode_linestring_z():
+    blob = linestring((0, 1, 10), (2, 3, 20), wkb_type=1002)
+    result = decode_geometries([blob], "LINESTRING")
+    assert result.x.tolist() == [0, 2]
+    assert result.y.tolist() == [1, 3]
+
+
+def test_decode_polygons():
+    square = [(0, 0), (1, 0), (1, 1), (0, 0)]
+    hole = [(0.2, 0.2), (0.4, 0.2), (0.4, 0.4), (0.2, 0.2)]
+    result = decode_geometries([polygon(square, hole), polygon(square)], "POLYGON")
+    rings, coords = result.offsets
+    assert rings.tolist() == [0, 2, 3]
+    assert coords.tolist() == [0, 4, 8, 12]
+    assert result.x[4:8].tolist() == [0.2, 0.4, 0.4, 0.2]
+
+
+@pytest.mark.parametrize(
+    "blob, geometry_type",
+    [
+        (b"XX\x00\x01\x00\x00\x00\x00", "POINT"),
+        (point(1, 2)[:-4], "POINT"),
+        (point(1, 2), "LINESTRING"),
+        (point(1, 2), "MULTIPOINT"),
+    ],
+)
+def test_decode_error(blob, geometry_type):
+    with pytest.raises(GeometryDecodeError):
+        decode_geometries([blob], geometry_type)
+
+
+SQUARE = [(0, 0), (1, 0), (1, 1), (0, 0)]
+
+
+@pytest.mark.parametrize(
+    "blobs, geometry_type, decode_blobs",
+    [
+        ([point(1, 2), None, point(3, 4)], "POINT", "_decode_points"),
+        (
+            [linestring((0, 1), (2, 3)), None, linestring((4, 5), (6, 7), (8, 9))],
+            "LINESTRING",
+            "_decode_linestrings",
+        ),
+        ([polygon(SQUARE), None, polygon(SQUARE[::-1])], "POLYGON", "_decode_polygons"),
+    ],
+)
+def test_decode_batch(blobs, geometry_type, decode_blobs):
+    expected = getattr(gpkg, decode_blobs)(blobs)
+    with mock.patch.object(gpkg, decode_blobs) as decode_blobs:
+        result = decode_geometries(blobs, geometry_type)
+    # the batch is decoded at once, with the same result
+    assert not decode_blobs.called
+    assert result.x.tolist() == pytest.approx(expected[0].tolist(), nan_ok=True)
+    assert result.y.tolist() == pytest.approx(expected[1].tolist(), nan_ok=True)
+    assert [x.tolist() for x in result.offsets] == [x.tolist() for x in expected[2]]
+
+
+def test_decode_bounds():
+    envelope = struct.pack("<4d", 0, 2, 1, 3)
+    blobs = [
+        gpkg_blob(struct.pack("<BII4d", 1, 2, 2, 0, 1, 2, 3), envelope),
+        None,
+        point(5, 6),
+        linestring((0, 1), (2, 3)),
+    ]
+    with mock.patch.object(gpkg, "decode_geometries", wraps=decode_geometries) as m:
+        bounds = decode_bounds(blobs)
+    assert bounds.tolist()[0] == [0, 1, 2, 3]
+    assert bounds.tolist()[2:] == [[5, 6, 5, 6], [0, 1, 2, 3]]
+    assert np.isnan(bounds[1]).all()
+    # only the blobs without an envelope are decoded
+    assert m.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "geometry_type,a,b,expected",
+    [
+        (
+            "POINT",
+            [point(1, 2), None, None],
+            [point(1, 2.1), None, point(1, 2)],
+            [1, 1, 0],
+        ),
+        ("POINT", [point(1, 2)], [point(1, 2.5)], [0]),
+        (
+            "LINESTRING",
+            [linestring((0, 0), (1, 1)), linestring((0, 0), (1, 1)), None],
+            [linestring((0, 0.1), (1, 1)), linestring((0, 0), (1, 1), (2, 2)), None],
+            [1, 0, 1],
+        ),
+        (
+            "POLYGON",
+            [
+                polygon([(0, 0), (1, 0), (0, 1), (0, 0)]),
+                polygon([(0, 0), (1, 0), (0, 0)]),
+            ],
+            [
+                polygon([(0, 0), (1, 0.1), (0, 1), (0, 0)]),
+                polygon([(0, 0), (2, 0), (0, 0)]),
+            ],
+            [1, 0],
+        ),
+    ],
+)
+def test_geometries_equal(geometry_type, a, b, expected):
+    result = geometries_equal(
+        decode_geometries(a, geometry_type),
+        decode_geometries(b, geometry_type),
+        tolerance=0.2,
+    )
+    assert result.tolist() == [bool(value) for value in expected]
+
+
+def test_decode_geometry_types():
+    big_endian = gpkg_blob(struct.pack(">BIdd", 0, 1, 5, 6), byte_order=0)
+    blobs = [point(1, 2), None, linestring((0, 0), (1, 1), wkb_type=1002), big_endian]
+    assert decode_geometry_types(blobs).tolist() == [1, 0, 2, 1]
+
+
+def test_decode_geometry_types_invalid():
+    with pytest.raises(GeometryDecodeError, match="not a GeoPackage"):
+        decode_geometry_types([point(1, 2), b"XX" + point(1, 2)[2:]])
@@ -0,0 +1,63 @@
+import importlib
+
+import pytest
+from sqlalchemy import Column, create_engine, inspect, Integer
+from sqlalchemy.orm import declarative_base
+
+from threedi_schema.domain.models import DECLARED_MODELS
+from threedi_schema.infrastructure.indexes import ensure_indexes, get_missing_indexes
+
+Base = declarative_base()
+
+
+class Model(Base):
+    __tablename__ = "model"
+
+    id = Column(Integer, primary_key=True)
+    connection_node_id = Column(Integer, index=True)
+
+
+class NotCreated(Base):
+    __tablename__ = "not_created"
+
+    id = Column(Integer, primary_key=True)
+    connection_node_id = Column(Integer, index=True)
+
+
+@pytest.fixture()
+def engine():
+    engine = create_engine("sqlite:///:memory:")
+    Model.__table__.create(engine)
+    with engine.begin() as connection:
+        for index in Model.__table__.indexes:
+            index.drop(connection)
+    return engine
+
+
+def test_get_missing_indexes(engine):
+    (index,) = get_missing_indexes(engine, [Model, NotCreated])
+    assert index.name == "ix_model_connection_node_id"
+
+
+def test_ensure_indexes(engine):
+    ensure_indexes(engine, [Model, NotCreated])
+    assert get_missing_indexes(engine, [Model]) == []
+    assert [index["name"] for index in inspect(engine).get_indexes("model")] == [
+        "ix_model_connection_node_id"
+    ]
+
+
+def test_migration_matches_models():
+    migration = importlib.import_module(
+        "threedi_schema.migrations.versions.0302_topology_indexes"
+    )
+    declared = {
+        model.__tablename__: sorted(
+            column.name for column in model.__table__.columns if column.index
+        )
+        for model in DECLARED_MODELS
+    }
+    declared = {table: columns for table, columns in declared.items() if columns}
+    assert declared == {
+        table: sorted(columns) for table, columns in migration.INDEXED_COLUMNS.items()
+    }
@@ -0,0 +1,86 @@
+from unittest import mock
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from threedi_schema import MemoryBudgetExceededError, MemoryMonitor
+from threedi_schema.application import memory
+
+# a statement that takes many SQLite VM instructions
+LONG_QUERY = text(
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000) "
+    "SELECT sum(x) FROM c"
+)
+
+
+def test_check_within_budget():
+    monitor = MemoryMonitor(budget=1024**4)
+    assert monitor.check()
+    assert monitor.exceeded is None
+
+
+@mock.patch.object(memory, "get_rss", return_value=2 * 1024**3)
+def test_check_exceeds_budget(get_rss):
+    monitor = MemoryMonitor(budget=1024**3)
+    monitor.start(222)
+    assert not monitor.check()
+    assert monitor.exceeded == 2 * 1024**3
+    assert str(monitor.get_error()) == (
+        "The upgrade used 2048 MiB while upgrading from revision 0222, "
+        "which exceeds the memory budget of 1024 MiB"
+    )
+
+
+def test_check_without_budget():
+    monitor = MemoryMonitor()
+    assert monitor.check()
+
+
+def test_attach_interrupts_statement():
+    engine = create_engine("sqlite://")
+    monitor = MemoryMonitor(budget=1, check_interval=1000)
+    with engine.connect() as connection:
+        monitor.attach(connection)
+        with pytest.raises(OperationalError):
+            connection.execute(LONG_QUERY)
+        monitor.detach(connection)
+        assert connection.execute(LONG_QUERY).scalar() == 5000050000
+    assert monitor.exceeded is not None
+
+
+def test_on_version_apply_records_usage():
+    monitor = MemoryMonitor(trace_python=True)
+    monitor.start(221)
+    try:
+        monitor.on_version_apply(None, mock.Mock(up_revision_id="0222"), None, None)
+    finally:
+        monitor.stop()
+    (usage,) = monitor.usage
+    assert usage.revision == "0222"
+    assert usage.python_peak > 0
+    assert monitor.revision == "0222"
+
+
+@mock.patch.object(memory, "get_rss", return_value=2 * 1024**3)
+def test_on_version_apply_exceeds_budget(get_rss):
+    monitor = MemoryMonitor(budget=1024**3)
+    monitor.start(221)
+    with pytest.raises(MemoryBudgetExceededError, match="from revision 0221"):
+        monitor.on_version_apply(None, mock.Mock(up_revision_id="0222"), None, None)
+
+
+def test_upgrade_memory_usage(in_memory_sqlite):
+    monitor = MemoryMonitor()
+    in_memory_sqlite.schema.upgrade(
+        revision="0202", backup=False, memory_monitor=monitor
+    )
+    assert [usage.revision for usage in monitor.usage] == ["0200", "0201", "0202"]
+
+
+def test_upgrade_memory_budget(in_memory_sqlite):
+    monitor = MemoryMonitor(budget=1)
+    with pytest.raises(MemoryBudgetExceededError):
+        in_memory_sqlite.schema.upgrade(
+            revision="0202", backup=False, memory_monitor=monitor
+        )
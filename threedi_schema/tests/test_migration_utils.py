@@ -0,0 +1,170 @@
+from unittest import mock
+
+import pytest
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import Column, create_engine, inspect, Integer, String, Text, text
+
+from threedi_schema.migrations import utils
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE pipe "
+                "(id INTEGER PRIMARY KEY, code TEXT, a FLOAT, b FLOAT, c TEXT UNIQUE)"
+            )
+        )
+        # a trigger is lost when a table is copied by batch_alter_table
+        connection.execute(
+            text(
+                "CREATE TRIGGER pipe_trigger AFTER INSERT ON pipe "
+                "BEGIN UPDATE pipe SET a = 1 WHERE id = NEW.id; END"
+            )
+        )
+        connection.execute(text("INSERT INTO pipe (code, a, b) VALUES ('x', 2.0, 3.0)"))
+        yield connection
+
+
+@pytest.fixture
+def op(connection):
+    op = Operations(MigrationContext.configure(connection))
+    with mock.patch.object(
+        op, "batch_alter_table", wraps=op.batch_alter_table
+    ) as batch_alter_table:
+        op.batch_alter_table_mock = batch_alter_table
+        yield op
+
+
+def get_columns(connection, table="pipe"):
+    return [column["name"] for column in inspect(connection).get_columns(table)]
+
+
+def has_trigger(connection):
+    return bool(
+        connection.execute(
+            text("SELECT count(*) FROM sqlite_master WHERE name = 'pipe_trigger'")
+        ).scalar()
+    )
+
+
+def test_rename_table_columns_in_place(connection, op):
+    utils.rename_table_columns(op, "pipe", [("code", "name"), ("b", "d")])
+    assert get_columns(connection) == ["id", "name", "a", "d", "c"]
+    assert connection.execute(text("SELECT name, d FROM pipe")).fetchall() == [
+        ("x", 3.0)
+    ]
+    assert has_trigger(connection)
+    assert not op.batch_alter_table_mock.called
+
+
+def test_drop_table_columns_in_place(connection, op):
+    utils.drop_table_columns(op, "pipe", ["code"])
+    assert get_columns(connection) == ["id", "a", "b", "c"]
+    assert has_trigger(connection)
+    assert not op.batch_alter_table_mock.called
+
+
+def test_drop_table_columns_fallback(connection, op):
+    # a UNIQUE column cannot be dropped in place
+    utils.drop_table_columns(op, "pipe", ["code", "c"])
+    assert get_columns(connection) == ["id", "a", "b"]
+    op.batch_alter_table_mock.assert_called_once_with("pipe")
+
+
+def test_drop_table_columns_view(connection, op):
+    # like ThreediDatabase; SQLite then drops a column that a view refers to
+    connection.execute(text("PRAGMA legacy_alter_table=ON"))
+    connection.execute(text("CREATE VIEW pipe_view AS SELECT id, b FROM pipe"))
+    utils.drop_table_columns(op, "pipe", ["code", "b"])
+    assert get_columns(connection) == ["id", "a", "c"]
+    op.batch_alter_table_mock.assert_called_once_with("pipe")
+
+
+def test_drop_table_columns_geometry(connection, op):
+    connection.execute(
+        text(
+            "CREATE TABLE geometry_columns (f_table_name TEXT, f_geometry_column TEXT)"
+        )
+    )
+    connection.execute(text("INSERT INTO geometry_columns VALUES ('pipe', 'code')"))
+    utils.drop_table_columns(op, "pipe", ["code"])
+    assert get_columns(connection) == ["id", "a", "b", "c"]
+    op.batch_alter_table_mock.assert_called_once_with("pipe")
+
+
+@mock.patch.object(utils, "get_sqlite_version", return_value=(3, 24, 0))
+def test_old_sqlite_version(get_sqlite_version, connection, op):
+    utils.rename_table_columns(op, "pipe", [("code", "name")])
+    utils.drop_table_columns(op, "pipe", ["name"])
+    assert get_columns(connection) == ["id", "a", "b", "c"]
+    assert op.batch_alter_table_mock.call_count == 2
+
+
+def get_table_sql(connection, table):
+    return connection.execute(
+        text("SELECT sql FROM sqlite_master WHERE name = :table"), {"table": table}
+    ).scalar()
+
+
+def test_rebuild_table(connection, op):
+    connection.execute(
+        text(
+            "CREATE TABLE v2_pipe (id INTEGER PRIMARY KEY, the_geom POINT NOT NULL, "
+            "code TEXT NOT NULL, a FLOAT DEFAULT 1.5, b FLOAT, c INTEGER)"
+        )
+    )
+    connection.execute(text("INSERT INTO v2_pipe VALUES (3, 'p', 'x', 2.0, 3.0, 4)"))
+    utils.rebuild_table(
+        op,
+        "v2_pipe",
+        "new_pipe",
+        rename_columns={"code": "name"},
+        remove_columns=["b"],
+        retype_columns={"c": "TEXT"},
+        add_columns=[
+            Column("tags", Text),
+            Column("label", String(100)),
+            Column("kind", Integer, nullable=False, server_default="1"),
+        ],
+        geometry=("the_geom", "geom", None),
+    )
+    assert get_columns(connection, "v2_pipe") == [
+        "id",
+        "the_geom",
+        "code",
+        "a",
+        "b",
+        "c",
+    ]
+    assert get_columns(connection, "new_pipe") == [
+        "id",
+        "name",
+        "a",
+        "c",
+        "geom",
+        "tags",
+        "label",
+        "kind",
+    ]
+    assert get_table_sql(connection, "new_pipe") == (
+        'CREATE TABLE "new_pipe" ("id" INTEGER PRIMARY KEY NOT NULL, "name" TEXT, '
+        '"a" FLOAT, "c" TEXT, "geom" POINT NOT NULL, tags TEXT, '
+        "label VARCHAR(100), kind INTEGER DEFAULT '1' NOT NULL)"
+    )
+    assert connection.execute(text("SELECT * FROM new_pipe")).fetchall() == [
+        (3, "x", 2.0, "4", "p", None, None, 1)
+    ]
+    assert not op.batch_alter_table_mock.called
+
+
+def test_rebuild_table_in_place(connection, op):
+    utils.rebuild_table(op, "pipe", remove_columns=["b", "c"])
+    assert get_columns(connection) == ["id", "code", "a"]
+    assert connection.execute(text("SELECT * FROM pipe")).fetchall() == [(1, "x", 1.0)]
+    assert connection.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table'")
+    ).fetchall() == [("pipe",)]
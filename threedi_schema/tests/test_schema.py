@@ -1,3 +1,7 @@
+import os
+import sqlite3
+import time
+from contextlib import closing
 from pathlib import Path
 from unittest import mock
 
@@ -6,9 +10,15 @@ from sqlalchemy import Column, inspect, Integer, MetaData, String, Table, text
 
 from threedi_schema import ModelSchema
 from threedi_schema.application import errors
-from threedi_schema.application.schema import get_schema_version
+from threedi_schema.application.schema import (
+    _upgrade_database,
+    get_alembic_config,
+    get_schema_version,
+)
+from threedi_schema.application.upgrade_utils import UNSAFE_PRAGMAS
 from threedi_schema.domain import constants
 from threedi_schema.domain.models import DECLARED_MODELS
+from threedi_schema.infrastructure.indexes import get_missing_indexes
 from threedi_schema.infrastructure.spatial_index import get_missing_spatial_indexes
 
 
@@ -162,6 +172,7 @@ def run_upgrade_test(schema):
         sqlite_cols = get_columns_from_sqlite(session, table)
         assert set(schema_cols).issubset(set(sqlite_cols))
     assert get_missing_spatial_indexes(schema.db.engine, DECLARED_MODELS) == []
+    assert get_missing_indexes(schema.db.engine, DECLARED_MODELS) == []
 
 
 def test_upgrade_with_epsg_code_override(in_memory_sqlite):
@@ -255,6 +266,147 @@ def test_upgrade_with_backup(south_latest_sqlite):
     assert db is not south_latest_sqlite
 
 
+def test_upgrade_with_backup_pragmas(south_latest_sqlite):
+    """Upgrading with backup=True uses the (unsafe) PRAGMAs on the copy only"""
+    schema = ModelSchema(south_latest_sqlite)
+    with mock.patch(
+        "threedi_schema.application.schema._upgrade_database", side_effect=RuntimeError
+    ) as upgrade, mock.patch.object(schema, "get_version", return_value=199):
+        with pytest.raises(RuntimeError):
+            schema.upgrade(backup=True)
+
+    (db,), kwargs = upgrade.call_args
+    assert db.pragmas == UNSAFE_PRAGMAS
+    assert south_latest_sqlite.pragmas is None
+
+
+@pytest.mark.parametrize("revision", ["0229", "head"])
+def test_upgrade_with_unsafe_pragmas_sets_version(empty_sqlite_v4, revision):
+    """The version table is updated on the copy that has journal_mode=MEMORY and
+    synchronous=OFF, and ends up in the original file"""
+    schema = ModelSchema(empty_sqlite_v4)
+    schema.upgrade(
+        revision=revision,
+        backup=True,
+        pragmas=UNSAFE_PRAGMAS,
+        epsg_code_override=28992,
+    )
+    expected = get_schema_version() if revision == "head" else int(revision)
+    assert schema.get_version() == expected
+    # read the version table with a new connection with the default PRAGMAs
+    with closing(sqlite3.connect(schema.db.path)) as connection:
+        (version,) = connection.execute(
+            f"SELECT version_num FROM {constants.VERSION_TABLE_NAME}"
+        ).fetchone()
+    assert int(version) == expected
+
+
+@mock.patch("threedi_schema.application.schema.alembic_command")
+def test_upgrade_database_unsafe_deprecated(alembic_command, in_memory_sqlite):
+    with pytest.warns(DeprecationWarning, match="unsafe"):
+        _upgrade_database(in_memory_sqlite, revision="0230", unsafe=True)
+    alembic_command.upgrade.assert_called_once()
+    with pytest.warns(DeprecationWarning, match="unsafe"):
+        config = get_alembic_config(unsafe=False)
+    assert "unsafe" not in config.attributes
+
+
+def test_file_transaction_pragmas(south_latest_sqlite):
+    with south_latest_sqlite.file_transaction(pragmas=UNSAFE_PRAGMAS) as work_db:
+        with work_db.get_engine().connect() as connection:
+            journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            synchronous = connection.execute(text("PRAGMA synchronous")).scalar()
+    assert journal_mode.upper() == "MEMORY"
+    assert synchronous == 0  # OFF
+
+
+def test_file_transaction_work_dir(south_latest_sqlite, tmp_path):
+    work_dir = tmp_path / "work"
+    with south_latest_sqlite.file_transaction(work_dir=work_dir) as work_db:
+        assert Path(work_db.path).parent == work_dir
+        assert Path(work_db.path).name.startswith("work-")
+    assert list(work_dir.iterdir()) == []
+
+
+def test_file_transaction_work_dir_env(south_latest_sqlite, tmp_path, monkeypatch):
+    monkeypatch.setenv("THREEDI_SCHEMA_WORK_DIR", str(tmp_path))
+    with south_latest_sqlite.file_transaction() as work_db:
+        assert Path(work_db.path).parent == tmp_path
+
+
+def test_file_transaction_error_removes_copy(south_latest_sqlite, tmp_path):
+    work_dir = tmp_path / "work"
+    with pytest.raises(RuntimeError):
+        with south_latest_sqlite.file_transaction(work_dir=work_dir):
+            raise RuntimeError()
+    assert list(work_dir.iterdir()) == []
+
+
+def test_file_transaction_insufficient_space(south_latest_sqlite, tmp_path):
+    work_dir = tmp_path / "work"
+    with mock.patch("shutil.disk_usage", return_value=mock.Mock(free=0)), pytest.raises(
+        errors.InsufficientSpaceError, match="THREEDI_SCHEMA_WORK_DIR"
+    ):
+        with south_latest_sqlite.file_transaction(work_dir=work_dir):
+            pass
+    assert list(work_dir.iterdir()) == []
+
+
+def test_file_transaction_removes_stale_work_files(south_latest_sqlite, tmp_path):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    stale = [work_dir / "work-stale.sqlite", work_dir / "work-stale.sqlite-journal"]
+    recent = work_dir / "work-recent.sqlite"
+    for path in stale + [recent]:
+        path.touch()
+    day_ago = time.time() - 25 * 3600
+    for path in stale:
+        os.utime(path, (day_ago, day_ago))
+    with south_latest_sqlite.file_transaction(work_dir=work_dir):
+        pass
+    assert list(work_dir.iterdir()) == [recent]
+
+
+def test_memory_transaction(south_latest_sqlite):
+    with south_latest_sqlite.memory_transaction() as work_db:
+        assert work_db.has_table("south_migrationhistory")
+        with work_db.get_engine().begin() as connection:
+            connection.execute(text("CREATE TABLE in_memory (id INTEGER)"))
+    assert south_latest_sqlite.has_table("in_memory")
+
+
+def test_memory_transaction_error(south_latest_sqlite):
+    with pytest.raises(RuntimeError):
+        with south_latest_sqlite.memory_transaction() as work_db:
+            with work_db.get_engine().begin() as connection:
+                connection.execute(text("CREATE TABLE in_memory (id INTEGER)"))
+            raise RuntimeError()
+    assert not south_latest_sqlite.has_table("in_memory")
+
+
+@pytest.mark.parametrize("max_size, in_memory", [(1024**3, True), (0, False)])
+def test_upgrade_in_memory(south_latest_sqlite, max_size, in_memory):
+    """Upgrading in_memory uses an in-memory copy for small databases only"""
+    schema = ModelSchema(south_latest_sqlite)
+    with mock.patch(
+        "threedi_schema.application.schema._upgrade_database", side_effect=RuntimeError
+    ) as upgrade, mock.patch.object(
+        schema, "get_version", return_value=199
+    ), mock.patch(
+        "threedi_schema.application.schema.IN_MEMORY_MAX_SIZE", max_size
+    ):
+        with pytest.raises(RuntimeError):
+            schema.upgrade(in_memory=True)
+
+    (db,), kwargs = upgrade.call_args
+    assert (db.path == "") is in_memory
+
+
+def test_upgrade_in_memory_without_backup(south_latest_sqlite):
+    with pytest.raises(ValueError):
+        ModelSchema(south_latest_sqlite).upgrade(backup=False, in_memory=True)
+
+
 def test_upgrade_without_backup(south_latest_sqlite):
     """Upgrading with backup=True will proceed on the database itself"""
     schema = ModelSchema(south_latest_sqlite)
@@ -313,6 +465,48 @@ def test_set_spatial_indexes(in_memory_sqlite):
     assert check_result == 1
 
 
+def test_set_indexes(sqlite_latest):
+    with sqlite_latest.get_engine().begin() as connection:
+        connection.execute(text("DROP INDEX ix_pipe_connection_node_id_start"))
+    assert len(get_missing_indexes(sqlite_latest.engine, DECLARED_MODELS)) == 1
+    sqlite_latest.schema.set_indexes()
+    assert get_missing_indexes(sqlite_latest.engine, DECLARED_MODELS) == []
+
+
+def test_set_indexes_missing_migration(sqlite_latest):
+    with mock.patch.object(ModelSchema, "get_version", return_value=301):
+        with pytest.raises(errors.MigrationMissingError):
+            sqlite_latest.schema.set_indexes()
+
+
+def test_fingerprints(sqlite_latest):
+    fingerprints = sqlite_latest.schema.get_fingerprints()
+    assert "pipe" in fingerprints
+    sqlite_latest.schema.install_change_counters()
+    assert sqlite_latest.schema.get_fingerprints() == fingerprints
+    with sqlite_latest.get_engine().begin() as connection:
+        connection.execute(text("INSERT INTO pipe (id, code) VALUES (1, 'new')"))
+    changed = sqlite_latest.schema.get_fingerprints()
+    assert changed["pipe"] != fingerprints["pipe"]
+    assert changed["channel"] == fingerprints["channel"]
+
+
+def test_changelog(sqlite_latest):
+    sqlite_latest.schema.install_changelog()
+    with sqlite_latest.get_engine().begin() as connection:
+        connection.execute(text("INSERT INTO pipe (id, code) VALUES (1, 'new')"))
+        connection.execute(text("UPDATE pipe SET code = 'changed'"))
+    changes = sqlite_latest.schema.get_changes()
+    assert [(c.table_name, c.row_id, c.operation) for c in changes] == [
+        ("pipe", 1, "insert"),
+        ("pipe", 1, "update"),
+    ]
+    sqlite_latest.schema.compact_changelog()
+    assert sqlite_latest.schema.get_changes(since=changes[0].sequence) == [
+        changes[1]._replace(operation="insert")
+    ]
+
+
 def test_is_spatialite(in_memory_sqlite):
     schema = ModelSchema(in_memory_sqlite)
     schema.upgrade(
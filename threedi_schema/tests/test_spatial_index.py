@@ -7,6 +7,7 @@ from sqlalchemy.orm import declarative_base, sessionmaker
 from threedi_schema.application.threedi_database import load_spatialite
 from threedi_schema.infrastructure.spatial_index import (
     create_spatial_index,
+    drop_spatial_index,
     ensure_spatial_indexes,
     get_missing_spatial_indexes,
 )
@@ -52,6 +53,18 @@ def test_create_spatial_index_fail(engine):
                 create_spatial_index(connection, Model.__table__.columns["geom"])
 
 
+def test_drop_spatial_index(engine):
+    column = Model.__table__.columns["geom"]
+    with engine.connect() as connection:
+        with connection.begin():
+            assert not drop_spatial_index(connection, column)
+            create_spatial_index(connection, column)
+            assert drop_spatial_index(connection, column)
+            # the spatial index can be created again
+            create_spatial_index(connection, column)
+    assert get_missing_spatial_indexes(engine, [Model]) == []
+
+
 def test_ensure_spatial_index(engine):
     assert get_missing_spatial_indexes(engine, [Model]) == [Model]
     ensure_spatial_indexes(engine, [Model])
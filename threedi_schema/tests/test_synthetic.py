@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+
+from threedi_schema import ThreediDatabase
+from threedi_schema.tests.synthetic import generate_schematisation, get_row_counts
+
+ROW_COUNTS = {
+    "connection_node": 100,
+    "channel": 10,
+    "cross_section_location": 20,
+    "pipe": 50,
+    "surface": 30,
+    "surface_map": 30,
+}
+
+
+def get_count(path, table):
+    with sqlite3.connect(path) as connection:
+        return connection.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+
+def test_get_row_counts():
+    row_counts = get_row_counts(1000000)
+    assert row_counts["connection_node"] == 1000000
+    assert row_counts["surface"] == 1000000
+    assert row_counts["cross_section_location"] == 100000
+    assert min(get_row_counts(1).values()) == 1
+
+
+@pytest.mark.parametrize(
+    "revision, node_table, version",
+    [
+        ("0200", "v2_connection_nodes", 200),
+        ("0222", "v2_connection_nodes", 222),
+        ("0230", "connection_node", 230),
+        ("head", "connection_node", None),
+    ],
+)
+def test_generate_schematisation(tmp_path, revision, node_table, version):
+    path = generate_schematisation(
+        tmp_path / "model.sqlite", revision=revision, row_counts=ROW_COUNTS
+    )
+    db = ThreediDatabase(path)
+    if version is None:
+        assert path.suffix == ".gpkg"
+        assert db.schema.is_geopackage
+    else:
+        assert db.schema.get_version() == version
+    assert get_count(path, node_table) == 100
+
+
+def test_generate_schematisation_deterministic(tmp_path):
+    paths = [
+        generate_schematisation(
+            tmp_path / f"model_{i}.sqlite",
+            revision="0222",
+            row_counts=ROW_COUNTS,
+            seed=42,
+        )
+        for i in range(2)
+    ]
+    query = "SELECT id, AsText(the_geom) FROM v2_channel ORDER BY id"
+    results = []
+    for path in paths:
+        db = ThreediDatabase(path)
+        with db.engine.connect() as connection:
+            results.append(connection.exec_driver_sql(query).fetchall())
+    assert len(results[0]) == 10
+    assert results[0] == results[1]
+
+
+def test_generate_schematisation_legacy_settings(tmp_path):
+    path = generate_schematisation(
+        tmp_path / "model.sqlite",
+        revision="0222",
+        row_counts=ROW_COUNTS,
+        epsg_code=28992,
+    )
+    assert ThreediDatabase(path).schema.epsg_code == 28992
+
+
+def test_generate_schematisation_exists(tmp_path):
+    path = tmp_path / "model.sqlite"
+    path.touch()
+    with pytest.raises(FileExistsError):
+        generate_schematisation(path)
@@ -0,0 +1,148 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+np = pytest.importorskip("numpy")
+
+from threedi_schema.application import topology  # NOQA
+from threedi_schema.application.topology import (  # NOQA
+    build_topology,
+    get_topology,
+    Topology,
+)
+
+# node 5 is isolated; pipe 3 refers to a node that does not exist
+ROWS = {
+    "connection_node": [(1,), (2,), (3,), (4,), (5,), (6,)],
+    "channel": [(1, 1, 2)],
+    "pipe": [(1, 2, 3), (2, 3, None), (3, 3, 99)],
+    "culvert": [],
+    "weir": [(1, 6, 4)],
+    "orifice": [],
+    "pump": [(1, 3), (2, 6)],
+    "pump_map": [(1, 1, 4)],
+}
+
+
+def create_tables(connection):
+    for table, columns in topology.TOPOLOGY_COLUMNS.items():
+        connection.execute(text(f"CREATE TABLE {table} ({', '.join(columns)})"))
+        for row in ROWS[table]:
+            values = ", ".join(f":{column}" for column in columns)
+            connection.execute(
+                text(f"INSERT INTO {table} VALUES ({values})"),
+                dict(zip(columns, row)),
+            )
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        create_tables(connection)
+        yield connection
+
+
+@pytest.fixture
+def network(connection):
+    return build_topology(connection)
+
+
+def test_build_topology(network):
+    assert network.node_ids.tolist() == [1, 2, 3, 4, 5, 6]
+    assert network.n_edges == 4
+    assert network.degree().tolist() == [1, 2, 2, 2, 0, 1]
+    assert sorted(network.neighbours(3).tolist()) == [2, 4]
+    assert sorted(network.edges(4)) == [("pump", 1), ("weir", 1)]
+
+
+def test_dangling_ends(network):
+    assert network.dangling_ends().tolist() == [1, 6]
+    assert network.isolated_nodes().tolist() == [5]
+
+
+def test_connected_components(network):
+    components = network.connected_components()
+    assert components.tolist() == [0, 0, 0, 0, 1, 0]
+
+
+def test_connected_components_chain():
+    n = 1000
+    edges = [(1, i, i, i + 1) for i in range(n - 1)] + [(1, n, n + 10, n + 11)]
+    network = Topology.from_edges(np.arange(n + 20), np.array(edges))
+    components = network.connected_components()
+    assert len(np.unique(components[:n])) == 1
+    assert components[n + 10] == components[n + 11] != components[0]
+    # the chain, the pair and 18 isolated nodes
+    assert len(np.unique(components)) == 20
+
+
+def test_unknown_node(network):
+    with pytest.raises(KeyError):
+        network.neighbours(99)
+
+
+def test_save_load(network, tmp_path):
+    network.save(tmp_path / "topology.npz")
+    loaded = Topology.load(tmp_path / "topology.npz")
+    for name in Topology.ARRAYS:
+        assert getattr(loaded, name).tolist() == getattr(network, name).tolist()
+
+
+def test_key_changes(connection):
+    before = topology._get_key(connection)
+    # swapping the nodes of two rows changes the key
+    connection.execute(
+        text("UPDATE pipe SET connection_node_id_start = 3 WHERE id = 1")
+    )
+    connection.execute(
+        text("UPDATE pipe SET connection_node_id_start = 2 WHERE id = 2")
+    )
+    assert topology._get_key(connection) != before
+
+
+@pytest.fixture
+def db(in_memory_sqlite):
+    with in_memory_sqlite.get_engine().begin() as connection:
+        create_tables(connection)
+    topology._cache.clear()
+    return in_memory_sqlite
+
+
+def test_get_topology_cached(db, tmp_path):
+    network = get_topology(db, cache_dir=tmp_path)
+    assert get_topology(db) is network
+    topology._cache.clear()
+    assert get_topology(db, cache_dir=tmp_path).n_edges == network.n_edges
+    assert len(list(tmp_path.glob("topology-*.npz"))) == 1
+
+
+def test_get_topology_changed(db):
+    network = get_topology(db)
+    with db.get_engine().begin() as connection:
+        connection.execute(text("DELETE FROM weir"))
+    assert get_topology(db).n_edges == network.n_edges - 1
+
+
+def test_get_topology_cache_hit_faster_than_build(db):
+    n = 50000
+    with db.get_engine().begin() as connection:
+        connection.execute(
+            text("INSERT INTO connection_node VALUES (:id)"),
+            [{"id": i} for i in range(7, n)],
+        )
+        connection.execute(
+            text("INSERT INTO pipe VALUES (:id, :start, :end)"),
+            [{"id": i, "start": i, "end": i + 1} for i in range(4, n - 1)],
+        )
+    # builds the topology and stores the fingerprints
+    network = get_topology(db)
+    start = time.perf_counter()
+    assert get_topology(db) is network
+    hit = time.perf_counter() - start
+    with db.get_engine().connect() as connection:
+        start = time.perf_counter()
+        build_topology(connection)
+        build = time.perf_counter() - start
+    assert hit < build
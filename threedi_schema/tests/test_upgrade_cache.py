@@ -0,0 +1,84 @@
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from threedi_schema import ThreediDatabase, UpgradeCache
+from threedi_schema.application import schema as schema_module
+
+data_dir = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "model.sqlite"
+    path.write_bytes(b"some database content")
+    return path
+
+
+def test_get_key(tmp_path, source_file):
+    cache = UpgradeCache(tmp_path / "cache")
+    key = cache.get_key(source_file, 300)
+    assert key == cache.get_key(source_file, 300)
+    assert key != cache.get_key(source_file, 301)
+    assert key != cache.get_key(source_file, 300, epsg_code_override=28992)
+    assert key != cache.get_key(source_file, 300, pragmas={"synchronous": "OFF"})
+    source_file.write_bytes(b"other database content")
+    assert key != cache.get_key(source_file, 300)
+
+
+def test_get_miss(tmp_path):
+    assert UpgradeCache(tmp_path / "cache").get("abc") is None
+
+
+def test_put_and_get(tmp_path, source_file):
+    cache = UpgradeCache(tmp_path / "cache")
+    entry = cache.put("abc", source_file)
+    assert entry.suffix == ".sqlite"
+    assert cache.get("abc") == entry
+    assert entry.read_bytes() == source_file.read_bytes()
+
+
+def test_evict_least_recently_used(tmp_path, source_file):
+    size = source_file.stat().st_size
+    cache = UpgradeCache(tmp_path / "cache", max_size=2 * size)
+    first = cache.put("first", source_file)
+    second = cache.put("second", source_file)
+    os.utime(first, (1, 1))
+    os.utime(second, (2, 2))
+    # using an entry makes it the most recently used
+    cache.get("first")
+    cache.put("third", source_file)
+    assert cache.get("second") is None
+    assert cache.get("first") == first
+    assert cache.get("third") is not None
+
+
+def test_upgrade_with_cache(tmp_path):
+    cache = UpgradeCache(tmp_path / "cache")
+    paths = []
+    for name in ["a", "b"]:
+        (tmp_path / name).mkdir()
+        path = tmp_path / name / "empty_v4.sqlite"
+        shutil.copyfile(data_dir / "empty_v4.sqlite", path)
+        paths.append(path)
+
+    db = ThreediDatabase(paths[0])
+    db.schema.upgrade(backup=False, epsg_code_override=28992, cache=cache)
+    with mock.patch.object(schema_module, "_upgrade_database") as upgrade_database:
+        db = ThreediDatabase(paths[1])
+        db.schema.upgrade(backup=False, epsg_code_override=28992, cache=cache)
+    assert not upgrade_database.called
+    assert db.path.suffix == ".gpkg"
+    assert not paths[1].exists()
+    assert db.schema.get_version() == schema_module.get_schema_version()
+
+
+def test_upgrade_with_cache_keep_spatialite(empty_sqlite_v4):
+    cache = mock.Mock(spec=UpgradeCache)
+    with mock.patch.object(schema_module.ModelSchema, "_upgrade"):
+        empty_sqlite_v4.schema.upgrade(backup=False, keep_spatialite=True, cache=cache)
+    assert not cache.get.called
+    assert not cache.put.called
@@ -33,6 +33,90 @@ def test_progress_handler_zero_steps():
     assert progress_func.call_args_list == expected_calls
 
 
+def test_progress_handler_weighted():
+    progress_func = MagicMock()
+    mock_record = MagicMock(spec=logging.LogRecord, levelno=logging.INFO)
+    mock_record.getMessage.return_value = "Running upgrade"
+    handler = upgrade_utils.ProgressHandler(
+        progress_func, total_steps=3, weights=[1, 3, 4]
+    )
+    for _ in range(3):
+        handler.handle(mock_record)
+    assert progress_func.call_args_list == [
+        call(0.0, "Running upgrade"),
+        call(12.5, "Running upgrade"),
+        call(50.0, "Running upgrade"),
+    ]
+
+
+def test_progress_handler_substep():
+    progress_func = MagicMock()
+    handler = upgrade_utils.ProgressHandler(
+        progress_func, total_steps=2, weights=[2, 2]
+    )
+    step_record = logging.makeLogRecord({"msg": "Running upgrade"})
+    handler.handle(step_record)
+    for fraction in [0.5, 0.25, 1.0]:
+        handler.handle(
+            logging.makeLogRecord({"msg": "sub step", "substep_progress": fraction})
+        )
+    handler.handle(step_record)
+    # sub-step progress that does not increase the progress is not reported
+    assert progress_func.call_args_list == [
+        call(0.0, "Running upgrade"),
+        call(25.0, "sub step"),
+        call(50.0, "sub step"),
+        call(50.0, "Running upgrade"),
+    ]
+
+
+def test_progress_handler_upgrade_step():
+    progress_func = MagicMock()
+    handler = upgrade_utils.ProgressHandler(progress_func, total_steps=2)
+    handler.handle(logging.makeLogRecord({"msg": "Running upgrade"}))
+    handler.handle(
+        logging.makeLogRecord(
+            {
+                "msg": "Converting",
+                "upgrade_step": upgrade_utils.CONVERT_TO_GEOPACKAGE_STEP,
+            }
+        )
+    )
+    assert progress_func.call_args_list == [
+        call(0.0, "Running upgrade"),
+        call(50.0, "Converting"),
+    ]
+
+
+def test_get_upgrade_step_weights():
+    row_counts = {"v2_pipe": 1000, "pipe": 10, "v2_channel": 100}
+    weights = upgrade_utils.get_upgrade_step_weights(["0228", "0300"], row_counts)
+    cost = upgrade_utils.STEP_COSTS["0228"]
+    # the current name takes precedence over the legacy name
+    assert weights[0] == pytest.approx(cost.base_seconds + 110 * cost.seconds_per_row)
+    assert weights[1] == upgrade_utils.StepCost().base_seconds
+
+
+def test_get_step_tables():
+    tables = upgrade_utils.get_step_tables()
+    assert "connection_node" in tables
+    assert "v2_connection_nodes" in tables
+
+
+def test_get_upgrade_steps():
+    steps = upgrade_utils.get_upgrade_steps(
+        config=get_alembic_config(), current_revision=221, target_revision="0226"
+    )
+    assert steps == ["0222", "0223", "0224", "0225", "0226"]
+
+
+def test_get_upgrade_steps_empty():
+    steps = upgrade_utils.get_upgrade_steps(
+        config=get_alembic_config(), current_revision=None, target_revision="0202"
+    )
+    assert steps == ["0200", "0201", "0202"]
+
+
 @pytest.mark.parametrize(
     "target_revision, nsteps_expected", [("0226", 5), ("0200", 0), (None, 0)]
 )
@@ -80,3 +164,73 @@ def test_upgrade_with_progress_func_latest(oldest_sqlite):
     # ensure that the reported upgrade is increasing
     # non-increasing progress indicates multiple initializations
     assert all(x < y for x, y in zip(progress, progress[1:]))
+
+
+def test_upgrade_with_progress_func_removes_handler(oldest_sqlite):
+    schema = oldest_sqlite.schema
+    schema.upgrade(revision="0201", backup=False, progress_func=MagicMock())
+    logger = logging.getLogger("alembic.runtime.migration")
+    assert not any(
+        isinstance(handler, upgrade_utils.ProgressHandler)
+        for handler in logger.handlers
+    )
+
+
+def test_teardown_logging_restores_level():
+    logger = logging.getLogger(upgrade_utils.PROGRESS_LOGGER_NAME)
+    logger.setLevel(logging.WARNING)
+    try:
+        handler = upgrade_utils.setup_logging(MagicMock(), n_steps=1)
+        assert logger.level == logging.INFO
+        upgrade_utils.teardown_logging(handler)
+        assert logger.level == logging.WARNING
+        assert handler not in logger.handlers
+    finally:
+        logger.setLevel(logging.NOTSET)
+
+
+def test_get_upgrade_plan():
+    row_counts = {"v2_pipe": 800, "v2_connection_nodes": 200}
+    steps = ["0228", "0229", "0230", upgrade_utils.CONVERT_TO_GEOPACKAGE_STEP, "0300"]
+    plan = upgrade_utils.get_upgrade_plan(
+        steps,
+        row_counts,
+        file_size=1000,
+        current_revision=227,
+        target_revision=300,
+        backup=True,
+    )
+    assert plan.steps == steps
+    assert plan.estimated_seconds == pytest.approx(
+        sum(upgrade_utils.get_upgrade_step_weights(steps, row_counts))
+    )
+    # the geopackage conversion needs a work copy and the new geopackage
+    assert plan.temp_space_bytes == 2000
+    assert plan.converts_to_geopackage
+    assert plan.reprojects
+
+
+def test_get_upgrade_plan_no_backup():
+    row_counts = {"v2_pipe": 800, "v2_connection_nodes": 200}
+    plan = upgrade_utils.get_upgrade_plan(
+        ["0228", "0229"],
+        row_counts,
+        file_size=1000,
+        current_revision=227,
+        target_revision=229,
+        backup=False,
+    )
+    # all rows are copied in 0228
+    assert plan.temp_space_bytes == 1000
+    assert not plan.converts_to_geopackage
+    assert not plan.reprojects
+
+
+def test_plan_upgrade(oldest_sqlite):
+    plan = oldest_sqlite.schema.plan_upgrade()
+    assert plan.current_revision == oldest_sqlite.schema.get_version()
+    assert plan.steps[0] == "0200"
+    assert plan.converts_to_geopackage
+    assert plan.reprojects
+    assert plan.estimated_seconds > 0
+    assert plan.temp_space_bytes >= Path(oldest_sqlite.path).stat().st_size